@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import hmac
+import os
+import secrets
+import time
+import orjson
+from datetime import datetime
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+
+# Signed session tokens issued at sign-in. A token is "v1.<claims>.<signature>"
+# with an HMAC-SHA256 signature over the claims, so checking one is a hash and
+# a dict lookup rather than a bcrypt verify against the database.
+SESSION_SECRET = os.getenv("NEPTUNE_SESSION_SECRET")
+if not SESSION_SECRET:
+    print("NEPTUNE_SESSION_SECRET not set; sessions will not survive a restart or span workers")
+    SESSION_SECRET = secrets.token_urlsafe(32)
+SESSION_HOURS = float(os.getenv("NEPTUNE_SESSION_HOURS", "12"))
+# "required" rejects requests without a token. "optional" lets them through and
+# exists only for deployments whose clients have not moved to tokens yet; set
+# NEPTUNE_AUTH=optional explicitly for that. A token that is presented is
+# always enforced.
+AUTH_MODE = os.getenv("NEPTUNE_AUTH", "required")
+PUBLIC_PATHS = {
+    "/hospitals/hospitals-add/",
+    "/hospitals/hospitals-signin/",
+    "/workers/workers-signin/",
+}
+VERIFIED_CACHE_SIZE = 10_000
+
+verified_tokens = {}
+# Revocations (sign-out, password changes) live in this process only: they are
+# lost on restart and not seen by other workers, where the token stays valid
+# until it expires. Keep NEPTUNE_SESSION_HOURS short when running several
+# workers, and rotate NEPTUNE_SESSION_SECRET to end every session at once.
+revoked_sessions = {}
+revoked_before = {}
+
+class AuthError(ValueError):
+    pass
+
+def b64encode(raw: bytes):
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+def b64decode(text: str):
+    return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+
+def sign(payload: str):
+    return b64encode(hmac.new(SESSION_SECRET.encode(), payload.encode(), hashlib.sha256).digest())
+
+def issue_token(kind: str, subject: str, hospital_id: str):
+    now = time.time()
+    claims = {
+        "sid": secrets.token_hex(8),
+        "kind": kind,
+        "sub": subject,
+        "hid": hospital_id,
+        "iat": now,
+        "exp": now + SESSION_HOURS * 3600,
+    }
+    payload = "v1." + b64encode(orjson.dumps(claims))
+    return {
+        "access_token": f"{payload}.{sign(payload)}",
+        "token_type": "bearer",
+        "expires_at": datetime.fromtimestamp(claims["exp"]),
+    }
+
+def decode_token(token: str):
+    payload, _, signature = token.rpartition(".")
+    if not payload.startswith("v1.") or not hmac.compare_digest(signature, sign(payload)):
+        raise AuthError("Invalid session token")
+    try:
+        return orjson.loads(b64decode(payload[3:]))
+    except ValueError:
+        raise AuthError("Invalid session token")
+
+def verify_token(token: str):
+    claims = verified_tokens.get(token)
+    if claims is None:
+        claims = decode_token(token)
+        if len(verified_tokens) >= VERIFIED_CACHE_SIZE:
+            verified_tokens.pop(next(iter(verified_tokens)))
+        verified_tokens[token] = claims
+    if claims["exp"] < time.time():
+        verified_tokens.pop(token, None)
+        raise AuthError("Session expired")
+    if claims["sid"] in revoked_sessions:
+        raise AuthError("Session revoked")
+    cutoff = max(revoked_before.get(claims["sub"], 0), revoked_before.get(claims["hid"], 0))
+    if claims["iat"] <= cutoff:
+        raise AuthError("Session revoked")
+    return claims
+
+def revoke_token(token: str):
+    claims = decode_token(token)
+    now = time.time()
+    for sid, expires in list(revoked_sessions.items()):
+        if expires < now:
+            revoked_sessions.pop(sid)
+    revoked_sessions[claims["sid"]] = claims["exp"]
+    verified_tokens.pop(token, None)
+
+def revoke_subject(subject: str):
+    # ends every session issued so far for a hospital or worker, e.g. after a
+    # password change; a hospital id also covers its workers' sessions
+    revoked_before[subject] = time.time()
+
+def end_session(request: Request):
+    token = request_token(request)
+    if not token:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    try:
+        revoke_token(token)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+
+def request_token(request: Request):
+    header = request.headers.get("authorization", "")
+    if header[:7].lower() == "bearer ":
+        return header[7:].strip()
+    # EventSource cannot set headers, so the event stream may pass it in the URL
+    if request.url.path.startswith("/events/"):
+        return request.query_params.get("access_token")
+    return None
+
+async def tenant_scope(request: Request):
+    if request.url.path in PUBLIC_PATHS:
+        return None
+    token = request_token(request)
+    if not token:
+        if AUTH_MODE == "required":
+            raise HTTPException(status_code=401, detail="Not authenticated")
+        return None
+    try:
+        claims = verify_token(token)
+    except AuthError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    hospital_id = request.path_params.get("hospital_id") or request.query_params.get("hospital_id")
+    if hospital_id and hospital_id != claims["hid"]:
+        raise HTTPException(status_code=403, detail="Token is not valid for this hospital")
+    request.state.session = claims
+    return claims
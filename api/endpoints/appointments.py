@@ -1,34 +1,28 @@
 from fastapi import APIRouter
 from fastapi.exceptions import HTTPException
-from api.schemas.appointments import AppointmentsEdit, AppointmentsIn, AppointmentsOut
+from api.schemas.appointments import (
+    AppointmentsEdit, AppointmentsIn, AppointmentsOut,
+    AvailabilityIn, AvailabilityOut
+)
 from database.actions.appointment import(
-    add_appointment, fetch_appointments, 
+    add_appointment, fetch_appointments, fetch_appointments_between,
     search_appointments, edit_appointment,
-    delete_appointment, get_specific_appointment
+    delete_appointment, get_specific_appointment,
+    SlotError, MAX_SLOT_RANGE_DAYS, fetch_free_slots,
+    MAX_CALENDAR_RANGE_DAYS, fetch_appointment_calendar,
+    set_consultant_availability, fetch_consultant_availability
 )
+from api.responses import FastJSONResponse
 from database.actions.hospital import get_specific_hospital
 
 from fastapi.responses import FileResponse
 from datetime import datetime, timedelta
+import asyncio
 import csv
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, 
-    Paragraph, Spacer, Image,
-)
-from reportlab.lib.pagesizes import A4, A5
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import os
+from api.exports import MAX_EXPORT_DAYS, parse_day, export_path, build_appointments_pdf
 
 router = APIRouter()
 
-EXPORT_DIR = "exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-logo_path = os.path.join(BASE_DIR, "logo.png")
-
 router = APIRouter()
 
 def raise_exception(status_code, detail):
@@ -50,18 +44,13 @@ async def search_all_appointments(hospital_id: str, search_term: str):
 
 @router.get("/appointments-export-pdf")
 async def export_appointments_pdf(hospital_id: str, start_date: str, end_date: str):
-    apps = await fetch_appointments(hospital_id, "all", "desc")
-
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = parse_day(start_date)
+    end = parse_day(end_date)
 
-    if end - start > timedelta(days=90):
-        return
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
+        raise HTTPException(status_code=413, detail="Date range too large")
 
-    required_apps = [
-        app for app in apps
-        if start <= app.date_added <= end
-    ]
+    required_apps = await fetch_appointments_between(hospital_id, start, end)
 
     if not required_apps:
         raise_exception(404, "Appointments not found")
@@ -72,122 +61,9 @@ async def export_appointments_pdf(hospital_id: str, start_date: str, end_date: s
         raise HTTPException(status_code=404, detail="hospital not found")
     
     filename = f"{hospital.hospital_name}_{start_date}_to_{end_date}_appointments_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    path = os.path.join(EXPORT_DIR, filename)
-
-    doc = SimpleDocTemplate(
-        path,
-        pagesize=A4,
-        rightMargin=36,
-        leftMargin=36,
-        topMargin=50,
-        bottomMargin=36
-    )
-
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Title'],
-        alignment=1,
-        fontSize=18,
-        textColor=colors.HexColor("#2F4F4F"),
-        spaceAfter=12
-    )
-
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=14,
-        spaceAfter=14,
-    )
-
-    table_cell_style = ParagraphStyle(
-        'TableCell',
-        parent=styles['Normal'],
-        fontSize=10,
-    )
-
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        alignment=1,
-        fontSize=10,
-        textColor=colors.HexColor("#555555"),
-    )
-
-    elements = []
-
-    hospital_info = f"""
-    <b>{hospital.hospital_name}</b><br/>
-    {hospital.hospital_email} | {hospital.hospital_contact}<br/>
-    Date: {datetime.today().strftime("%B %d, %Y")}
-    """
-
-    elements.append(Paragraph(hospital_info, header_style))
-    elements.append(Spacer(1, 25))
-
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=90, height=90)
-        logo.hAlign = 'CENTER'
-        elements.append(logo)
-        elements.append(Spacer(1, 8))
-
-    report_title = f"{start_date} to {end_date} Appointments Report"
-    elements.append(Paragraph(report_title, title_style))
-    elements.append(Spacer(1, 14))
-
+    path = export_path(filename)
 
-    data = [
-        ["Patient", "About", "Start On", "Time", "Date Added"]
-    ]
-
-    for a in apps:
-        data.append([
-            Paragraph(a.patient.patient_name or "", table_cell_style),
-            Paragraph(a.appointment_desc or "", table_cell_style),
-            Paragraph(str(a.date_requested), table_cell_style),
-            Paragraph(str(a.time_requested), table_cell_style),
-            Paragraph(str(r.date_added).split(" ")[0], table_cell_style)
-        ])
-
-    col_widths = [3.5*cm, 3.5*cm, 3*cm, 3*cm, 3*cm]
-
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    table_style = TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#2F8F46")),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 11),
-
-        ('GRID', (0,0), (-1,-1), 0.4, colors.grey),
-        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey]),
-        ('LEFTPADDING', (0,0), (-1,-1), 4),
-        ('RIGHTPADDING', (0,0), (-1,-1), 4),
-    ])
-
-    table.setStyle(table_style)
-    elements.append(table)
-    elements.append(Spacer(1, 35))
-
-
-    signature_section = """
-    <br/><br/>
-    _____________________________<br/>
-    <b>Authorized Signature</b><br/>
-    Generated by <b>NeptuneHMS Admin</b>
-    """
-
-    elements.append(Paragraph(signature_section, styles["Normal"]))
-    elements.append(Spacer(1, 40))
-
-
-    footer_text = "This report was generated electronically and does not require a physical signature."
-    elements.append(Paragraph(footer_text, footer_style))
-
-    doc.build(elements)
+    await asyncio.to_thread(build_appointments_pdf, path, hospital, apps, start_date, end_date)
 
     return FileResponse(
         path,
@@ -201,19 +77,14 @@ async def export_appointments_csv(
     start_date: str,
     end_date: str
 ):
-    apps = await fetch_appointments(hospital_id, "all", "desc")
-
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = parse_day(start_date)
+    end = parse_day(end_date)
 
     # DoS / abuse guard
-    if end - start > timedelta(days=90):
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
         raise HTTPException(status_code=413, detail="Date range too large")
 
-    required_apps = [
-        app for app in apps
-        if start <= app.date_added <= end
-    ]
+    required_apps = await fetch_appointments_between(hospital_id, start, end)
 
     if not required_apps:
         raise_exception(404, "Appointments not found")
@@ -228,7 +99,7 @@ async def export_appointments_csv(
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     )
 
-    path = os.path.join(EXPORT_DIR, filename)
+    path = export_path(filename)
 
     with open(path, mode="w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
@@ -263,16 +134,63 @@ async def fetch_specific_appointment(hospital_id: str, appointment_id: str):
         raise_exception(404, "appointment not found")
     return appointment
 
+@router.get("/appointments-free-slots/")
+async def fetch_appointment_free_slots(
+    hospital_id: str,
+    start_date: str,
+    end_date: str = None,
+    consultant_id: str = None
+):
+    start = parse_day(start_date).date()
+    end = parse_day(end_date).date() if end_date else start
+    if end < start or end - start >= timedelta(days=MAX_SLOT_RANGE_DAYS):
+        raise_exception(400, f"Date range must cover 1 to {MAX_SLOT_RANGE_DAYS} days")
+    slots = await fetch_free_slots(hospital_id, start, end, consultant_id)
+    return FastJSONResponse(slots)
+
+@router.get("/appointments-calendar/")
+async def fetch_calendar(
+    hospital_id: str,
+    start_date: str,
+    end_date: str = None,
+    consultant_id: str = None
+):
+    start = parse_day(start_date).date()
+    end = parse_day(end_date).date() if end_date else start
+    if end < start or end - start >= timedelta(days=MAX_CALENDAR_RANGE_DAYS):
+        raise_exception(400, f"Date range must cover 1 to {MAX_CALENDAR_RANGE_DAYS} days")
+    calendar = await fetch_appointment_calendar(hospital_id, start, end, consultant_id)
+    return FastJSONResponse(calendar)
+
+@router.get("/appointments-availability/", response_model=list[AvailabilityOut])
+async def fetch_availability(hospital_id: str, consultant_id: str):
+    return await fetch_consultant_availability(hospital_id, consultant_id)
+
+@router.put("/appointments-availability/", response_model=list[AvailabilityOut])
+async def set_availability(hospital_id: str, consultant_id: str, windows: list[AvailabilityIn]):
+    for window in windows:
+        if window.start_time >= window.end_time:
+            raise_exception(400, "start_time must be before end_time")
+    return await set_consultant_availability(
+        hospital_id, consultant_id, [window.model_dump() for window in windows]
+    )
+
 @router.post("/appointments-add/", response_model=AppointmentsOut)
 async def add_appointments(hospital_id: str, appointment: AppointmentsIn):
-    appointment = await add_appointment(hospital_id, appointment.model_dump())
+    try:
+        appointment = await add_appointment(hospital_id, appointment.model_dump())
+    except SlotError as e:
+        raise_exception(409, str(e))
     if not appointment:
         raise_exception(400, "failed to add appointment")
     return appointment
 
 @router.put("/appointments-edit/", response_model=AppointmentsOut)
 async def format_appointment(hospital_id: str, appointment_id: str, data: AppointmentsEdit):
-    appointment = await edit_appointment(hospital_id, appointment_id, data.model_dump())
+    try:
+        appointment = await edit_appointment(hospital_id, appointment_id, data.model_dump())
+    except SlotError as e:
+        raise_exception(409, str(e))
     if not appointment:
         raise_exception(400, "failed to edit appointment")
     return appointment
@@ -1,10 +1,13 @@
 from fastapi import APIRouter
 from fastapi.exceptions import HTTPException
+from datetime import timedelta
 from database.actions.billing import(
-    show_total_billings, show_total_patient_billings,
-    show_total_patient_billings_today, search_billings
+    fetch_billing_rows, fetch_patient_billing_rows,
+    search_billing_rows, fetch_billing_rows_between
 )
+from api.exports import MAX_EXPORT_DAYS, parse_day
 from api.schemas.billings import BillingOut
+from api.responses import FastJSONResponse
 
 router = APIRouter()
 
@@ -13,28 +16,39 @@ def raise_exception(status_code, detail):
 
 @router.get("/billings/show-all/", response_model=list[BillingOut])
 async def show_all_billings(hospital_id: str):
-    billings = await show_total_billings(hospital_id)
+    billings = await fetch_billing_rows(hospital_id)
     if not billings:
         raise_exception(404, "Billings not found")
-    return billings
+    return FastJSONResponse(billings)
 
 @router.get("/billings/search/", response_model=list[BillingOut])
 async def show_all_billings(hospital_id: str, search_term):
-    billings = await search_billings(hospital_id, search_term)
+    billings = await search_billing_rows(hospital_id, search_term)
     if not billings:
         raise_exception(404, "Billings not found")
-    return billings
+    return FastJSONResponse(billings)
 
 @router.get("/billings/show-patient/", response_model=list[BillingOut])
 async def show_all_patient_billings(hospital_id: str, patient_id: str):
-    billings = await show_total_patient_billings(hospital_id, patient_id)
+    billings = await fetch_patient_billing_rows(hospital_id, patient_id)
     if not billings:
         raise_exception(404, "Billings not found")
-    return billings
+    return FastJSONResponse(billings)
 
 @router.get("/billings/show-patient-today/", response_model=list[BillingOut])
 async def show_all_patient_billings_today(hospital_id: str, patient_id: str):
-    billings = await show_total_patient_billings_today(hospital_id, patient_id)
+    billings = await fetch_patient_billing_rows(hospital_id, patient_id, today_only=True)
     if not billings:
         raise_exception(404, "Billings not found")
-    return billings
\ No newline at end of file
+    return FastJSONResponse(billings)
+
+@router.get("/billings/show-between/", response_model=list[BillingOut])
+async def show_billings_between(hospital_id: str, start_date: str, end_date: str, patient_id: str = None):
+    start = parse_day(start_date)
+    end = parse_day(end_date)
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
+        raise_exception(413, "Date range too large")
+    billings = await fetch_billing_rows_between(hospital_id, start, end, patient_id)
+    if not billings:
+        raise_exception(404, "Billings not found")
+    return FastJSONResponse(billings)
@@ -2,64 +2,65 @@ from fastapi import APIRouter
 from fastapi.exceptions import HTTPException
 from api.schemas.diagnoses import DiagnosesEdit, DiagnosesIn, DiagnosesOut
 from database.actions.diagnosis import(
-    add_diagnosis, fetch_diagnosis, edit_diagnosis,
-    search_diagnosis, delete_diagnosis, get_specific_diagnosis
+    add_diagnosis, fetch_diagnosis, fetch_diagnosis_between, edit_diagnosis,
+    search_diagnosis, delete_diagnosis, get_specific_diagnosis,
+    fetch_diagnosis_rows, search_diagnosis_rows
 )
+from api.responses import FastJSONResponse
 from database.actions.hospital import get_specific_hospital
 
 from fastapi.responses import FileResponse
 from datetime import datetime, timedelta
+import asyncio
 import csv
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, 
-    Paragraph, Spacer, Image,
-)
-from reportlab.lib.pagesizes import A4, A5
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import os
+from api.exports import MAX_EXPORT_DAYS, parse_day, export_path, build_diagnosis_pdf
 
 router = APIRouter()
 
-EXPORT_DIR = "exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-logo_path = os.path.join(BASE_DIR, "logo.png")
 router = APIRouter()
 
 def raise_exception(status_code, detail):
     raise HTTPException(status_code=status_code, detail=detail)
 
 @router.get("/diagnosis-fetch/", response_model=list[DiagnosesOut])
-async def fetch_all_diagnosis_data(hospital_id: str, sort_term: str, sort_dir: str):
-    diagnosiss = await fetch_diagnosis(hospital_id, sort_term, sort_dir)
+async def fetch_all_diagnosis_data(hospital_id: str, sort_term: str, sort_dir: str, view: str = "detail", fields: str = None):
+    if view == "detail" and not fields:
+        diagnosiss = await fetch_diagnosis(hospital_id, sort_term, sort_dir)
+        if not diagnosiss:
+            raise_exception(404, "diagnosiss not found")
+        return diagnosiss
+    try:
+        diagnosiss = await fetch_diagnosis_rows(hospital_id, sort_term, sort_dir, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not diagnosiss:
         raise_exception(404, "diagnosiss not found")
-    return diagnosiss
+    return FastJSONResponse(diagnosiss)
 
 @router.get("/diagnosis-search/", response_model=list[DiagnosesOut])
-async def search_all_diagnosiss(hospital_id: str, search_term: str):
-    diagnosiss = await search_diagnosis(hospital_id, search_term)
+async def search_all_diagnosiss(hospital_id: str, search_term: str, view: str = "detail", fields: str = None):
+    if view == "detail" and not fields:
+        diagnosiss = await search_diagnosis(hospital_id, search_term)
+        if not diagnosiss:
+            raise_exception(404, "diagnosiss not found")
+        return diagnosiss
+    try:
+        diagnosiss = await search_diagnosis_rows(hospital_id, search_term, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not diagnosiss:
         raise_exception(404, "diagnosiss not found")
-    return diagnosiss
+    return FastJSONResponse(diagnosiss)
 
 @router.get("/diagnosis-export-pdf")
 async def export_diagnosis_pdf(hospital_id: str, start_date: str, end_date: str):
-    diags = await fetch_diagnosis(hospital_id, "all", "desc")
-
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = parse_day(start_date)
+    end = parse_day(end_date)
 
-    if end - start > timedelta(days=90):
-        return
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
+        raise HTTPException(status_code=413, detail="Date range too large")
 
-    required_diags = [
-        diag for diag in diags
-        if start <= diag.date_added <= end
-    ]
+    required_diags = await fetch_diagnosis_between(hospital_id, start, end)
 
     if not required_diags:
         raise_exception(404, "Diagnosis not found")
@@ -70,122 +71,9 @@ async def export_diagnosis_pdf(hospital_id: str, start_date: str, end_date: str)
         raise HTTPException(status_code=404, detail="hospital not found")
     
     filename = f"{hospital.hospital_name}_{start_date}_to_{end_date}_diagnosis_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-    path = os.path.join(EXPORT_DIR, filename)
-
-    doc = SimpleDocTemplate(
-        path,
-        pagesize=A4,
-        rightMargin=36,
-        leftMargin=36,
-        topMargin=50,
-        bottomMargin=36
-    )
-
-    styles = getSampleStyleSheet()
-
-    title_style = ParagraphStyle(
-        'TitleStyle',
-        parent=styles['Title'],
-        alignment=1,
-        fontSize=18,
-        textColor=colors.HexColor("#2F4F4F"),
-        spaceAfter=12
-    )
-
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Normal'],
-        fontSize=11,
-        leading=14,
-        spaceAfter=14,
-    )
-
-    table_cell_style = ParagraphStyle(
-        'TableCell',
-        parent=styles['Normal'],
-        fontSize=10,
-    )
-
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        alignment=1,
-        fontSize=10,
-        textColor=colors.HexColor("#555555"),
-    )
-
-    elements = []
+    path = export_path(filename)
 
-    hospital_info = f"""
-    <b>{hospital.hospital_name}</b><br/>
-    {hospital.hospital_email} | {hospital.hospital_contact}<br/>
-    Date: {datetime.today().strftime("%B %d, %Y")}
-    """
-
-    elements.append(Paragraph(hospital_info, header_style))
-    elements.append(Spacer(1, 25))
-
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=90, height=90)
-        logo.hAlign = 'CENTER'
-        elements.append(logo)
-        elements.append(Spacer(1, 8))
-
-    report_title = f"{start_date} to {end_date} Diagnoses Report"
-    elements.append(Paragraph(report_title, title_style))
-    elements.append(Spacer(1, 14))
-
-
-    data = [
-        ["Patient", "Symptoms", "Findings", "Suggested Diag", "Date Added"]
-    ]
-
-    for d in diags:
-        data.append([
-            Paragraph(d.patient.patient_name or "", table_cell_style),
-            Paragraph(d.symptoms or "", table_cell_style),
-            Paragraph(d.findings, table_cell_style),
-            Paragraph(d.suggested_diagnosis, table_cell_style),
-            Paragraph(str(d.date_added).split(" ")[0], table_cell_style)
-        ])
-
-    col_widths = [3.5*cm, 3.5*cm, 3*cm, 3*cm, 3*cm]
-
-    table = Table(data, colWidths=col_widths, repeatRows=1)
-    table_style = TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#2F8F46")),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-        ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0,0), (-1,0), 11),
-
-        ('GRID', (0,0), (-1,-1), 0.4, colors.grey),
-        ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey]),
-        ('LEFTPADDING', (0,0), (-1,-1), 4),
-        ('RIGHTPADDING', (0,0), (-1,-1), 4),
-    ])
-
-    table.setStyle(table_style)
-    elements.append(table)
-    elements.append(Spacer(1, 35))
-
-
-    signature_section = """
-    <br/><br/>
-    _____________________________<br/>
-    <b>Authorized Signature</b><br/>
-    Generated by <b>NeptuneHMS Admin</b>
-    """
-
-    elements.append(Paragraph(signature_section, styles["Normal"]))
-    elements.append(Spacer(1, 40))
-
-
-    footer_text = "This report was generated electronically and does not require a physical signature."
-    elements.append(Paragraph(footer_text, footer_style))
-
-    doc.build(elements)
+    await asyncio.to_thread(build_diagnosis_pdf, path, hospital, diags, start_date, end_date)
 
     return FileResponse(
         path,
@@ -199,18 +87,13 @@ async def export_diagnosis_csv(
     start_date: str,
     end_date: str
 ):
-    diags = await fetch_diagnosis(hospital_id, "all", "desc")
-
-    start = datetime.strptime(start_date, "%Y-%m-%d")
-    end = datetime.strptime(end_date, "%Y-%m-%d")
+    start = parse_day(start_date)
+    end = parse_day(end_date)
 
-    if end - start > timedelta(days=90):
+    if end - start > timedelta(days=MAX_EXPORT_DAYS):
         raise HTTPException(status_code=413, detail="Date range too large")
 
-    required_diags = [
-        d for d in diags
-        if start <= d.date_added <= end
-    ]
+    required_diags = await fetch_diagnosis_between(hospital_id, start, end)
 
     if not required_diags:
         raise_exception(404, "Diagnosis not found")
@@ -225,7 +108,7 @@ async def export_diagnosis_csv(
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     )
 
-    path = os.path.join(EXPORT_DIR, filename)
+    path = export_path(filename)
 
     with open(path, mode="w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
@@ -1,52 +1,53 @@
 from fastapi import APIRouter
 from fastapi.exceptions import HTTPException
-from api.schemas.drugs import DrugsEdit, DrugsIn, DrugsOut
+from api.schemas.drugs import DrugsEdit, DrugsIn, DrugsOut, DrugAlertsOut, DrugRestockIn
 from database.actions.drugs import(
-    add_drugs, edit_drug, search_drugs, 
-    fetch_drugs, delete_drug, get_specific_drug,
-    sale_drug
+    add_drugs, edit_drug,
+    delete_drug, get_specific_drug,
+    sale_drug, fetch_drug_rows, search_drug_rows,
+    drug_filter_conditions, export_drugs, fetch_drug_alert_rows,
+    restock_drug
 )
+from api.responses import FastJSONResponse
 from database.actions.hospital import get_specific_hospital
 
 from fastapi.responses import FileResponse
-from datetime import datetime, timedelta
+from datetime import datetime
+import asyncio
 import csv
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, 
-    Paragraph, Spacer, Image,
-)
-from reportlab.lib.pagesizes import A4, A5
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import os
+from api.exports import export_path, build_drugs_pdf
 
 router = APIRouter()
 
-EXPORT_DIR = "exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-logo_path = os.path.join(BASE_DIR, "logo.png")
-
 router = APIRouter()
 
 def raise_exception(status_code, detail):
     raise HTTPException(status_code=status_code, detail=detail)
 
 @router.get("/drugs-fetch/", response_model=list[DrugsOut])
-async def fetch_all_drug_data(hospital_id: str, sort_term: str, sort_dir: str):
-    drugs = await fetch_drugs(hospital_id, sort_term, sort_dir)
+async def fetch_all_drug_data(hospital_id: str, sort_term: str, sort_dir: str, view: str = "detail", fields: str = None):
+    try:
+        drugs = await fetch_drug_rows(hospital_id, sort_term, sort_dir, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not drugs:
         raise_exception(404, "drugs not found")
-    return drugs
+    return FastJSONResponse(drugs)
 
 @router.get("/drugs-search/", response_model=list[DrugsOut])
-async def search_all_drugs(hospital_id: str, search_term: str):
-    drugs = await search_drugs(hospital_id, search_term)
+async def search_all_drugs(hospital_id: str, search_term: str, view: str = "detail", fields: str = None):
+    try:
+        drugs = await search_drug_rows(hospital_id, search_term, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not drugs:
         raise_exception(404, "drugs not found")
-    return drugs
+    return FastJSONResponse(drugs)
+
+@router.get("/alerts", response_model=list[DrugAlertsOut])
+async def fetch_drug_alerts(hospital_id: str, alert_type: str = None):
+    alerts = await fetch_drug_alert_rows(hospital_id, alert_type)
+    return FastJSONResponse(alerts)
 
 @router.get("/drugs-specific/", response_model=DrugsOut)
 async def fetch_specific_drug(hospital_id: str, drug_id: str):
@@ -60,51 +61,13 @@ async def export_drug_pdf(
     hospital_id: str,
     filter: str
 ):
-    drugs = await fetch_drugs(hospital_id, "all", "desc")
-    if not drugs:
-        raise_exception(404, "Drugs not found")
-
-    today = datetime.today().date()
-
-    if filter == "total":
-        pass
-
-    elif filter == "new":
-        thirty_days_ago = today - timedelta(days=30)
-        drugs = [
-            d for d in drugs
-            if thirty_days_ago <= d.date_added.date() <= today
-        ]
-
-    elif filter == "expired":
-        drugs = [
-            d for d in drugs
-            if d.drug_expiry and d.drug_expiry.date() <= today
-        ]
-
-    elif filter == "safe":
-        drugs = [
-            d for d in drugs
-            if d.drug_expiry and d.drug_expiry.date() > today
-        ]
-
-    elif filter == "available":
-        drugs = [d for d in drugs if d.drug_quantity > 0]
-
-    elif filter == "depleted":
-        drugs = [d for d in drugs if d.drug_quantity <= 0]
-
-    elif filter == "sellable":
-        drugs = [
-            d for d in drugs
-            if d.drug_quantity > 0
-            and d.drug_expiry
-            and d.drug_expiry.date() > today
-        ]
-
-    else:
+    try:
+        conditions = drug_filter_conditions(filter)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid filter")
 
+    drugs = await export_drugs(hospital_id, conditions)
+
     if not drugs:
         raise_exception(404, "No drugs matched the filter")
 
@@ -117,71 +80,9 @@ async def export_drug_pdf(
         f"{filter.lower()}_drugs_"
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     )
-    path = os.path.join(EXPORT_DIR, filename)
-
-    doc = SimpleDocTemplate(
-        path,
-        pagesize=A4,
-        rightMargin=36,
-        leftMargin=36,
-        topMargin=50,
-        bottomMargin=36
-    )
-
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(Paragraph(
-        f"<b>{hospital.hospital_name}</b><br/>"
-        f"{hospital.hospital_email} | {hospital.hospital_contact}<br/>"
-        f"Date: {today.strftime('%B %d, %Y')}",
-        styles["Normal"]
-    ))
-
-    elements.append(Spacer(1, 20))
-
-    if os.path.exists(logo_path):
-        elements.append(Image(logo_path, width=90, height=90))
-        elements.append(Spacer(1, 8))
-
-    elements.append(Paragraph(
-        f"{filter.capitalize()} Drugs Report",
-        styles["Title"]
-    ))
+    path = export_path(filename)
 
-    data = [[
-        "Drug", "Category", "Quantity",
-        "Price", "Expiry", "Date Added"
-    ]]
-
-    for d in drugs:
-        data.append([
-            d.drug_name or "",
-            d.drug_category or "",
-            str(d.drug_quantity),
-            f"Ksh. {d.drug_price}",
-            d.drug_expiry.strftime("%Y-%m-%d") if d.drug_expiry else "",
-            d.date_added.strftime("%Y-%m-%d")
-        ])
-
-    table = Table(
-        data,
-        colWidths=[3.5*cm, 3.5*cm, 3*cm, 2.5*cm, 3*cm, 3*cm],
-        repeatRows=1
-    )
-
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#2F8F46")),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('GRID', (0,0), (-1,-1), 0.4, colors.grey),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
-    ]))
-
-    elements.append(Spacer(1, 15))
-    elements.append(table)
-
-    doc.build(elements)
+    await asyncio.to_thread(build_drugs_pdf, path, hospital, drugs, filter)
 
     return FileResponse(
         path,
@@ -194,51 +95,13 @@ async def export_drug_csv(
     hospital_id: str,
     filter: str
 ):
-    drugs = await fetch_drugs(hospital_id, "all", "desc")
-    if not drugs:
-        raise_exception(404, "Drugs not found")
-
-    today = datetime.today().date()
-
-    if filter == "total":
-        pass
-
-    elif filter == "new":
-        thirty_days_ago = today - timedelta(days=30)
-        drugs = [
-            d for d in drugs
-            if thirty_days_ago <= d.date_added.date() <= today
-        ]
-
-    elif filter == "expired":
-        drugs = [
-            d for d in drugs
-            if d.drug_expiry and d.drug_expiry.date() <= today
-        ]
-
-    elif filter == "safe":
-        drugs = [
-            d for d in drugs
-            if d.drug_expiry and d.drug_expiry.date() > today
-        ]
-
-    elif filter == "available":
-        drugs = [d for d in drugs if d.drug_quantity > 0]
-
-    elif filter == "depleted":
-        drugs = [d for d in drugs if d.drug_quantity <= 0]
-
-    elif filter == "sellable":
-        drugs = [
-            d for d in drugs
-            if d.drug_quantity > 0
-            and d.drug_expiry
-            and d.drug_expiry.date() > today
-        ]
-
-    else:
+    try:
+        conditions = drug_filter_conditions(filter)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid filter")
 
+    drugs = await export_drugs(hospital_id, conditions)
+
     if not drugs:
         raise_exception(404, "No drugs matched the filter")
 
@@ -251,7 +114,7 @@ async def export_drug_csv(
         f"{filter.lower()}_drugs_"
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     )
-    path = os.path.join(EXPORT_DIR, filename)
+    path = export_path(filename)
 
     with open(path, mode="w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
@@ -291,19 +154,26 @@ async def add_drug(hospital_id: str, drug: DrugsIn):
 
 @router.put("/drugs-edit/", response_model=DrugsOut)
 async def format_drug(hospital_id: str, drug_id: str, data: DrugsEdit):
+    if data.drug_quantity is not None or data.drug_expiry is not None:
+        raise_exception(400, "stock and expiry are tracked per lot; add stock through /drugs/drugs-restock/")
     drug = await edit_drug(hospital_id, drug_id, data.model_dump())
     if not drug:
         raise_exception(400, "failed to edit drug")
     return drug
 
+@router.post("/drugs-restock/", response_model=DrugsOut)
+async def restock_drugs(hospital_id: str, drug_id: str, lot: DrugRestockIn):
+    drug = await restock_drug(hospital_id, drug_id, lot.model_dump())
+    if not drug:
+        raise_exception(404, "drug not found")
+    return drug
+
 @router.put("/drugs/drug-sale")
 async def sale_drugs(hospital_id: str, drug_id: str, drug_qty: int):
-    try:
-        drug = await sale_drug(hospital_id, drug_id, drug_qty)
-        if not drug:
-            raise_exception(400, "Failed to sale drug")
-    except Exception as e:
-        raise_exception(500, f"An error occurred: {e}")
+    sale = await sale_drug(hospital_id, drug_id, drug_qty)
+    if sale.get("status") != "success":
+        raise_exception(400, sale.get("message", "Failed to sale drug"))
+    return sale
 
 @router.delete("/drugs-delete/")
 async def remove_drug(hospital_id: str, drug_id: str):
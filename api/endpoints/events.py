@@ -0,0 +1,49 @@
+import asyncio
+import orjson
+from fastapi import APIRouter, Header
+from fastapi.exceptions import HTTPException
+from fastapi.responses import StreamingResponse
+from database.actions.hospital import get_specific_hospital
+from database.events import hub
+
+KEEPALIVE_SECONDS = 15
+
+router = APIRouter()
+
+def raise_exception(status_code, detail):
+    raise HTTPException(status_code=status_code, detail=detail)
+
+def sse_frame(event: dict):
+    return b"id: %s\nevent: %s\ndata: %s\n\n" % (
+        event["id"].encode(), event["type"].encode(), orjson.dumps(event)
+    )
+
+async def event_stream(hospital_id: str, last_seq: int):
+    async with hub.subscribe(hospital_id) as queue:
+        # a reconnecting screen picks up whatever it missed from the replay buffer
+        for event in hub.replay(hospital_id, last_seq):
+            last_seq = event["seq"]
+            yield sse_frame(event)
+        yield b"retry: 3000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), KEEPALIVE_SECONDS)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            if event["seq"] > last_seq:
+                yield sse_frame(event)
+
+@router.get("/events-stream/")
+async def stream_hospital_events(hospital_id: str, last_event_id: str = Header(None)):
+    hospital = await get_specific_hospital(hospital_id)
+    if not hospital:
+        raise_exception(404, "hospital not found")
+    # without a Last-Event-ID the screen gets the replay buffer; with one, the
+    # events after it (or none, if it was issued by another boot or worker)
+    last_seq = hub.position(last_event_id) if last_event_id else 0
+    return StreamingResponse(
+        event_stream(hospital_id, last_seq),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,30 +1,42 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.exceptions import HTTPException
 from api.schemas.hospitals import (
     HospitalsEdit, HospitalsIn, HospitalsOut,
-    Signin, PasswordChange
+    Signin, PasswordChange, HospitalSession
 )
 from database.actions.hospital import(
     add_hospital, fetch_hospitals, search_hospitals,
     edit_hospital, get_specific_hospital, signin,
     change_password, delete_hospital, renew_hospital_plan
 )
+from database.actions.stats import fetch_hospital_stats
+from api.responses import FastJSONResponse
+from api.auth import issue_token, revoke_subject, end_session
+from api.signin_guard import signin_guard, signin_account, client_address, guard_signin
 
 router = APIRouter()
 
 def raise_exception(status_code, detail):
     raise HTTPException(status_code=status_code, detail=detail)
 
+def session_hospital(request: Request):
+    # a signed-in hospital only ever sees itself; without a session there is
+    # no tenant to list, even while tokens are optional
+    claims = getattr(request.state, "session", None)
+    if not claims:
+        raise_exception(401, "Not authenticated")
+    return claims["hid"]
+
 @router.get("/hospitals-fetch/", response_model=list[HospitalsOut])
-async def fetch_all_hospital_data(sort_term: str, sort_dir: str):
-    hospitals = await fetch_hospitals(sort_term, sort_dir)
+async def fetch_all_hospital_data(request: Request, sort_term: str, sort_dir: str):
+    hospitals = await fetch_hospitals(session_hospital(request), sort_term, sort_dir)
     if not hospitals:
         raise_exception(404, "hospitals not found")
     return hospitals
 
 @router.get("/hospitals-search/", response_model=list[HospitalsOut])
-async def search_all_hospitals(search_by: str, search_term: str):
-    hospitals = await search_hospitals(search_by, search_term)
+async def search_all_hospitals(request: Request, search_by: str, search_term: str):
+    hospitals = await search_hospitals(session_hospital(request), search_by, search_term)
     if not hospitals:
         raise_exception(404, "hospitals not found")
     return hospitals
@@ -36,6 +48,13 @@ async def fetch_specific_hospital(hospital_id: str):
         raise_exception(404, "hospital not found")
     return hospital
 
+@router.get("/{hospital_id}/stats")
+async def fetch_dashboard_stats(hospital_id: str):
+    stats = await fetch_hospital_stats(hospital_id)
+    if not stats:
+        raise_exception(404, "hospital not found")
+    return FastJSONResponse(stats)
+
 @router.post("/hospitals-add/", response_model=HospitalsOut)
 async def add_hospitals(hospital: HospitalsIn):
     hospital = await add_hospital(hospital.model_dump())
@@ -43,12 +62,24 @@ async def add_hospitals(hospital: HospitalsIn):
         raise_exception(400, "failed to add hospital")
     return hospital
 
-@router.post("/hospitals-signin/", response_model=HospitalsOut)
-async def hospital_login(hospital_detail: Signin):
+@router.post("/hospitals-signin/", response_model=HospitalSession)
+async def hospital_login(request: Request, hospital_detail: Signin):
+    account = signin_account(hospital_detail.hospital_email)
+    address = client_address(request)
+    guard_signin(account, address)
     hospital = await signin(hospital_detail.model_dump())
     if not hospital:
         raise_exception(404, "hospital not found")
-    return hospital
+    signin_guard.succeeded(account, address)
+    session = issue_token("hospital", hospital.hospital_id, hospital.hospital_id)
+    return HospitalSession(
+        **{field: getattr(hospital, field) for field in HospitalsOut.model_fields}, **session
+    )
+
+@router.post("/hospitals-signout/")
+async def hospital_logout(request: Request):
+    end_session(request)
+    return {"message": "signed out"}
 
 @router.put("/hospitals-edit/", response_model=HospitalsOut)
 async def format_hospital(hospital_id: str, data: HospitalsEdit):
@@ -62,6 +93,7 @@ async def change_hospital_password(hospital_id: str, password_detail: PasswordCh
     hospital = await change_password(hospital_id, password_detail.model_dump())
     if not hospital:
         raise_exception(400, "failed to change password")
+    revoke_subject(hospital_id)
     return hospital
 
 @router.put("/renew-activation/")
@@ -73,6 +105,7 @@ async def renew_plan(hospital_id: str, activation_key: str):
 async def remove_hospital(hospital_id: str):
     try:
         await delete_hospital(hospital_id)
+        revoke_subject(hospital_id)
         return {'message': 'hospital deleted successfully'}
     except Exception as e:
         raise HTTPException(500, f"An error occurred: {e}")
\ No newline at end of file
@@ -3,50 +3,100 @@ from fastapi.exceptions import HTTPException
 from api.schemas.patients import PatientsIn, PatientsOut, PatientsEdit
 from database.actions.patients import(
     add_patients, edit_patients, delete_patient,
-    get_specific_patient, search_patients, 
-    fetch_patients
+    get_specific_patient,
+    fetch_patient_rows, search_patient_rows,
+    cohort_conditions, named_cohort, fetch_patient_cohort,
+    export_patient_cohort, count_patient_cohorts
 )
+from database.actions.timeline import fetch_patient_timeline, timeline_types
+from api.responses import FastJSONResponse
 from database.actions.hospital import get_specific_hospital
 
 from fastapi.responses import FileResponse
-from datetime import datetime, timedelta
+from datetime import datetime
+import asyncio
 import csv
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, 
-    Paragraph, Spacer, Image,
-)
-from reportlab.lib.pagesizes import A4, A5
-from reportlab.lib import colors
-from reportlab.lib.units import cm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-import os
+from api.exports import export_path, build_patients_pdf
 
 router = APIRouter()
 
-EXPORT_DIR = "exports"
-os.makedirs(EXPORT_DIR, exist_ok=True)
-
-BASE_DIR = os.path.dirname(os.path.abspath(__file__)) 
-logo_path = os.path.join(BASE_DIR, "logo.png")
-
 router = APIRouter()
 
 def raise_exception(status_code, detail):
     raise HTTPException(status_code=status_code, detail=detail)
 
 @router.get("/patients-fetch/", response_model=list[PatientsOut])
-async def fetch_all_patient_data(hospital_id: str, sort_term: str, sort_dir: str):
-    patients = await fetch_patients(hospital_id, sort_term, sort_dir)
+async def fetch_all_patient_data(hospital_id: str, sort_term: str, sort_dir: str, view: str = "detail", fields: str = None):
+    try:
+        patients = await fetch_patient_rows(hospital_id, sort_term, sort_dir, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not patients:
         raise_exception(404, "patients not found")
-    return patients
+    return FastJSONResponse(patients)
 
 @router.get("/patients-search/", response_model=list[PatientsOut])
-async def search_all_patients(hospital_id: str, search_by: str, search_term: str):
-    patients = await search_patients(hospital_id, search_by, search_term)
+async def search_all_patients(hospital_id: str, search_by: str, search_term: str, view: str = "detail", fields: str = None):
+    try:
+        patients = await search_patient_rows(hospital_id, search_by, search_term, view, fields)
+    except ValueError as e:
+        raise_exception(400, str(e))
     if not patients:
         raise_exception(404, "patients not found")
-    return patients
+    return FastJSONResponse(patients)
+
+@router.get("/patients-cohort/")
+async def fetch_patient_cohort_data(
+    hospital_id: str,
+    age_min: int = None,
+    age_max: int = None,
+    gender: str = None,
+    new_within_days: int = None,
+    blood_type: str = None,
+    chronic_condition: str = None,
+    sort_term: str = "date",
+    sort_dir: str = "desc",
+    page: int = 1,
+    page_size: int = 50,
+    view: str = "summary",
+    fields: str = None
+):
+    if page < 1 or not 1 <= page_size <= 500:
+        raise_exception(400, "page must be >= 1 and page_size between 1 and 500")
+    conditions = cohort_conditions(
+        age_min, age_max, gender, new_within_days, blood_type, chronic_condition
+    )
+    try:
+        cohort = await fetch_patient_cohort(
+            hospital_id, conditions, sort_term, sort_dir, page, page_size, view, fields
+        )
+    except ValueError as e:
+        raise_exception(400, str(e))
+    return FastJSONResponse(cohort)
+
+@router.get("/patients-cohort-counts/")
+async def fetch_patient_cohort_counts(hospital_id: str):
+    counts = await count_patient_cohorts(hospital_id)
+    return FastJSONResponse(counts)
+
+@router.get("/{patient_id}/timeline")
+async def fetch_patient_timeline_data(
+    hospital_id: str,
+    patient_id: str,
+    types: str = None,
+    page: int = 1,
+    page_size: int = 50
+):
+    if page < 1 or not 1 <= page_size <= 200:
+        raise_exception(400, "page must be >= 1 and page_size between 1 and 200")
+    try:
+        record_types = timeline_types(types)
+    except ValueError as e:
+        raise_exception(400, str(e))
+    timeline = await fetch_patient_timeline(hospital_id, patient_id, record_types, page, page_size)
+    if not timeline:
+        raise_exception(404, "patient not found")
+    return FastJSONResponse(timeline)
 
 @router.get("/patients-specific/", response_model=PatientsOut)
 async def fetch_specific_patient(hospital_id: str, patient_id: str):
@@ -60,52 +110,13 @@ async def export_patient_pdf(
     hospital_id: str,
     filter: str
 ):
-    patients = await fetch_patients(hospital_id, "all", "desc")
-    if not patients:
-        raise_exception(404, "Patients not found")
-
-    today = datetime.today().date()
-
-    def calculate_age(dob):
-        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-
-    if filter == "all":
-        pass
-
-    elif filter == "new":
-        thirty_days_ago = today - timedelta(days=30)
-        patients = [
-            p for p in patients
-            if thirty_days_ago <= p.date_added.date() <= today
-        ]
-
-    elif filter == "adults":
-        patients = [
-            p for p in patients
-            if calculate_age(p.patient_dob) >= 18
-        ]
-
-    elif filter == "children":
-        patients = [
-            p for p in patients
-            if calculate_age(p.patient_dob) < 18
-        ]
-
-    elif filter == "male":
-        patients = [
-            p for p in patients
-            if p.patient_gender and p.patient_gender.lower() == "male"
-        ]
-
-    elif filter == "female":
-        patients = [
-            p for p in patients
-            if p.patient_gender and p.patient_gender.lower() == "female"
-        ]
-
-    else:
+    try:
+        conditions = named_cohort(filter)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid filter")
 
+    patients = await export_patient_cohort(hospital_id, conditions)
+
     if not patients:
         raise_exception(404, "No patients matched the filter")
 
@@ -118,71 +129,9 @@ async def export_patient_pdf(
         f"{filter.lower()}_patients_"
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
     )
-    path = os.path.join(EXPORT_DIR, filename)
+    path = export_path(filename)
 
-    doc = SimpleDocTemplate(
-        path,
-        pagesize=A4,
-        rightMargin=36,
-        leftMargin=36,
-        topMargin=50,
-        bottomMargin=36
-    )
-
-    styles = getSampleStyleSheet()
-    elements = []
-
-    elements.append(Paragraph(
-        f"<b>{hospital.hospital_name}</b><br/>"
-        f"{hospital.hospital_email} | {hospital.hospital_contact}<br/>"
-        f"Date: {today.strftime('%B %d, %Y')}",
-        styles["Normal"]
-    ))
-
-    elements.append(Spacer(1, 12))
-
-    if os.path.exists(logo_path):
-        logo = Image(logo_path, width=90, height=90)
-        logo.hAlign = "CENTER"
-        elements.append(logo)
-        elements.append(Spacer(1, 20))
-    else:
-        print("Failed to load:", logo_path)
-
-    elements.append(Paragraph(
-        f"{filter.capitalize()} Patients Report",
-        styles["Title"]
-    ))
-
-    elements.append(Spacer(1, 15))
-
-    data = [[
-        "Patient", "Email", "Phone",
-        "ID No.", "Gender", "D.O.B", "Date Added"
-    ]]
-
-    for p in patients:
-        data.append([
-            p.patient_name or "",
-            p.patient_email or "",
-            p.patient_phone or "",
-            p.patient_id_number or "",
-            p.patient_gender or "",
-            p.patient_dob.strftime("%Y-%m-%d"),
-            p.date_added.strftime("%Y-%m-%d")
-        ])
-
-    table = Table(data, repeatRows=1)
-    table.setStyle(TableStyle([
-        ('GRID', (0,0), (-1,-1), 0.4, colors.grey),
-        ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#2F8F46")),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.white),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-    ]))
-
-    elements.append(table)
-
-    doc.build(elements)
+    await asyncio.to_thread(build_patients_pdf, path, hospital, patients, filter)
 
     return FileResponse(
         path,
@@ -196,37 +145,13 @@ async def export_patient_csv(
     hospital_id: str,
     filter: str
 ):
-    patients = await fetch_patients(hospital_id, "all", "desc")
-    if not patients:
-        raise_exception(404, "Patients not found")
-
-    today = datetime.today().date()
-
-    def calculate_age(dob):
-        return today.year - dob.year - ((today.month, today.day) < (dob.month, dob.day))
-
-    if filter == "new":
-        thirty_days_ago = today - timedelta(days=30)
-        patients = [
-            p for p in patients
-            if thirty_days_ago <= p.date_added.date() <= today
-        ]
-
-    elif filter == "adults":
-        patients = [p for p in patients if calculate_age(p.patient_dob) >= 18]
-
-    elif filter == "children":
-        patients = [p for p in patients if calculate_age(p.patient_dob) < 18]
-
-    elif filter == "male":
-        patients = [p for p in patients if p.patient_gender and p.patient_gender.lower() == "male"]
-
-    elif filter == "female":
-        patients = [p for p in patients if p.patient_gender and p.patient_gender.lower() == "female"]
-
-    elif filter != "all":
+    try:
+        conditions = named_cohort(filter)
+    except ValueError:
         raise HTTPException(status_code=400, detail="Invalid filter")
 
+    patients = await export_patient_cohort(hospital_id, conditions)
+
     if not patients:
         raise_exception(404, "No patients matched the filter")
 
@@ -239,7 +164,7 @@ async def export_patient_csv(
         f"{filter.lower()}_patients_"
         f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
     )
-    path = os.path.join(EXPORT_DIR, filename)
+    path = export_path(filename)
 
     with open(path, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f)
@@ -84,7 +84,9 @@ async def add_prescriptions(hospital_id: str, prescription: PrescriptionsIn):
 @router.delete("/prescriptions-delete/")
 async def remove_prescription(hospital_id: str, prescription_id: str):
     try:
-        await delete_prescription(hospital_id, prescription_id)
-        return {'message': 'prescription deleted successfully'}
+        deleted = await delete_prescription(hospital_id, prescription_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+    if not deleted:
+        raise_exception(404, "prescription not found")
+    return {'message': 'prescription deleted successfully'}
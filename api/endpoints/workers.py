@@ -1,14 +1,16 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from fastapi.exceptions import HTTPException
 from api.schemas.workers import (
     WorkersEdit, WorkersIn, WorkersOut,
-    Signin, PasswordChange
+    Signin, PasswordChange, WorkerSession
 )
 from database.actions.workers import(
     add_worker, fetch_workers, search_workers,
     edit_workers, signin, change_password,
     delete_worker, get_specific_worker
 )
+from api.auth import issue_token, revoke_subject, end_session
+from api.signin_guard import signin_guard, signin_account, client_address, guard_signin
 
 router = APIRouter()
 
@@ -43,12 +45,24 @@ async def add_workers(hospital_id: str, worker: WorkersIn):
         raise_exception(400, "failed to add worker")
     return worker
 
-@router.post("/workers-signin/", response_model=WorkersOut)
-async def worker_login(hospital_id: str, worker_detail: Signin):
+@router.post("/workers-signin/", response_model=WorkerSession)
+async def worker_login(request: Request, hospital_id: str, worker_detail: Signin):
+    account = signin_account(worker_detail.worker_email, hospital_id)
+    address = client_address(request)
+    guard_signin(account, address)
     worker = await signin(hospital_id, worker_detail.model_dump())
     if not worker:
         raise_exception(404, "worker not found")
-    return worker
+    signin_guard.succeeded(account, address)
+    session = issue_token("worker", worker.worker_id, worker.hospital_id)
+    return WorkerSession(
+        **{field: getattr(worker, field) for field in WorkersOut.model_fields}, **session
+    )
+
+@router.post("/workers-signout/")
+async def worker_logout(request: Request):
+    end_session(request)
+    return {"message": "signed out"}
 
 @router.put("/workers-edit/", response_model=WorkersOut)
 async def format_worker(hospital_id: str, worker_id: str, data: WorkersEdit):
@@ -62,12 +76,14 @@ async def change_worker_password(hospital_id: str, worker_id: str, password_deta
     worker = await change_password(hospital_id, worker_id, password_detail.model_dump())
     if not worker:
         raise_exception(400, "failed to change password")
+    revoke_subject(worker_id)
     return worker
     
 @router.delete("/workers-delete/")
 async def remove_worker(hospital_id: str, worker_id: str):
     try:
         await delete_worker(hospital_id, worker_id)
+        revoke_subject(worker_id)
         return {'message': 'worker deleted successfully'}
     except Exception as e:
         raise HTTPException(500, f"An error occurred: {e}")
@@ -0,0 +1,300 @@
+import os
+from datetime import datetime
+from functools import lru_cache
+from xml.sax.saxutils import escape
+from fastapi import HTTPException
+
+EXPORT_DIR = "exports"
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "endpoints", "logo.png")
+
+# widest start/end window accepted by the date-range exports; the window is
+# filtered in SQL against (hospital_id, date_added), so a year is cheap
+MAX_EXPORT_DAYS = 366
+
+# rows per LongTable; kept even so ROWBACKGROUNDS alternate cleanly across chunks
+CHUNK_ROWS = 500
+
+def parse_day(value: str):
+    # query string dates; a malformed one is the client's error, not a 500
+    try:
+        return datetime.strptime(value, "%Y-%m-%d")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Dates must be YYYY-MM-DD")
+
+def export_path(filename: str):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    return os.path.join(EXPORT_DIR, filename)
+
+def day(value):
+    return str(value).split(" ")[0] if value else ""
+
+# reportlab is only imported once a PDF export is actually requested, keeping
+# it off the worker's import path. Styles, the table style and the decoded
+# logo are built on first use and then shared by every report in the process.
+
+@lru_cache(maxsize=None)
+def report_styles():
+    from reportlab.lib import colors
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.platypus import TableStyle
+
+    styles = getSampleStyleSheet()
+    return {
+        "normal": styles["Normal"],
+        "title": ParagraphStyle(
+            'TitleStyle',
+            parent=styles['Title'],
+            alignment=1,
+            fontSize=18,
+            textColor=colors.HexColor("#2F4F4F"),
+            spaceAfter=12
+        ),
+        "header": ParagraphStyle(
+            'HeaderStyle',
+            parent=styles['Normal'],
+            fontSize=11,
+            leading=14,
+            spaceAfter=14,
+        ),
+        "cell": ParagraphStyle(
+            'TableCell',
+            parent=styles['Normal'],
+            fontSize=10,
+        ),
+        "footer": ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            alignment=1,
+            fontSize=10,
+            textColor=colors.HexColor("#555555"),
+        ),
+        "table": TableStyle([
+            ('BACKGROUND', (0,0), (-1,0), colors.HexColor("#2F8F46")),
+            ('TEXTCOLOR', (0,0), (-1,0), colors.white),
+            ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+            ('VALIGN', (0,0), (-1,-1), 'MIDDLE'),
+            ('FONTNAME', (0,0), (-1,0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0,0), (-1,0), 11),
+
+            ('GRID', (0,0), (-1,-1), 0.4, colors.grey),
+            ('ROWBACKGROUNDS', (0,1), (-1,-1), [colors.whitesmoke, colors.lightgrey]),
+            ('LEFTPADDING', (0,0), (-1,-1), 4),
+            ('RIGHTPADDING', (0,0), (-1,-1), 4),
+        ]),
+    }
+
+@lru_cache(maxsize=None)
+def logo_image():
+    from reportlab.lib.utils import ImageReader
+
+    if not os.path.exists(LOGO_PATH):
+        print("Failed to load:", LOGO_PATH)
+        return None
+    image = ImageReader(LOGO_PATH)
+    # decode once; ImageReader keeps the pixel data for later drawImage calls
+    image.getRGBData()
+    return image
+
+@lru_cache(maxsize=None)
+def flowable_types():
+    from reportlab.platypus import Flowable
+
+    class Logo(Flowable):
+        def __init__(self, image, size):
+            Flowable.__init__(self)
+            self.image = image
+            self.width = self.height = size
+            self.hAlign = "CENTER"
+
+        def draw(self):
+            self.canv.drawImage(self.image, 0, 0, self.width, self.height, mask="auto")
+
+    class FlowableStream(list):
+        # doc.build() drains its list from the front; keep only a couple of
+        # flowables buffered and pull the next ones from the generator on demand
+        def __init__(self, source):
+            super().__init__()
+            self.source = iter(source)
+
+        def __len__(self):
+            while list.__len__(self) < 2:
+                try:
+                    self.append(next(self.source))
+                except StopIteration:
+                    break
+            return list.__len__(self)
+
+    return Logo, FlowableStream
+
+def table_chunks(headers, columns, col_widths, wrap):
+    from reportlab.platypus import LongTable, Paragraph
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    styles = report_styles()
+    cell = styles["cell"]
+    # cells that fit on one line stay plain strings; only longer text pays
+    # for a Paragraph and its line breaking
+    room = [width - 8 if index in wrap else None for index, width in enumerate(col_widths)]
+
+    def render(index, value):
+        text = str(value)
+        if room[index] is None or stringWidth(text, cell.fontName, cell.fontSize) <= room[index]:
+            return text
+        return Paragraph(escape(text), cell)
+
+    total = len(columns[0]) if columns else 0
+    for start in range(0, total, CHUNK_ROWS):
+        stop = min(start + CHUNK_ROWS, total)
+        data = [headers]
+        for row in zip(*(column[start:stop] for column in columns)):
+            data.append([render(index, value) for index, value in enumerate(row)])
+        table = LongTable(data, colWidths=col_widths, repeatRows=1, splitInRow=1)
+        table.setStyle(styles["table"])
+        yield table
+
+def report_flowables(hospital, title, headers, columns, col_widths, wrap):
+    from reportlab.platypus import Paragraph, Spacer
+
+    Logo, _ = flowable_types()
+    styles = report_styles()
+
+    hospital_info = f"""
+    <b>{escape(hospital.hospital_name or "")}</b><br/>
+    {escape(hospital.hospital_email or "")} | {escape(hospital.hospital_contact or "")}<br/>
+    Date: {datetime.today().strftime("%B %d, %Y")}
+    """
+    yield Paragraph(hospital_info, styles["header"])
+    yield Spacer(1, 25)
+
+    logo = logo_image()
+    if logo:
+        yield Logo(logo, 90)
+        yield Spacer(1, 8)
+
+    yield Paragraph(escape(title), styles["title"])
+    yield Spacer(1, 14)
+
+    yield from table_chunks(headers, columns, col_widths, wrap)
+    yield Spacer(1, 35)
+
+    signature_section = """
+    <br/><br/>
+    _____________________________<br/>
+    <b>Authorized Signature</b><br/>
+    Generated by <b>NeptuneHMS Admin</b>
+    """
+    yield Paragraph(signature_section, styles["normal"])
+    yield Spacer(1, 40)
+
+    footer_text = "This report was generated electronically and does not require a physical signature."
+    yield Paragraph(footer_text, styles["footer"])
+
+def build_report(path, hospital, title, headers, columns, col_widths, wrap=()):
+    from reportlab.platypus import SimpleDocTemplate
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.units import cm
+
+    _, FlowableStream = flowable_types()
+    doc = SimpleDocTemplate(
+        path,
+        pagesize=A4,
+        rightMargin=36,
+        leftMargin=36,
+        topMargin=50,
+        bottomMargin=36
+    )
+    col_widths = [width * cm for width in col_widths]
+    doc.build(FlowableStream(report_flowables(hospital, title, headers, columns, col_widths, set(wrap))))
+
+def build_patients_pdf(path, hospital, patients, filter):
+    build_report(
+        path, hospital, f"{filter.capitalize()} Patients Report",
+        ["Patient", "Email", "Phone", "ID No.", "Gender", "D.O.B", "Date Added"],
+        [
+            [p.patient_name or "" for p in patients],
+            [p.patient_email or "" for p in patients],
+            [p.patient_phone or "" for p in patients],
+            [p.patient_id_number or "" for p in patients],
+            [p.patient_gender or "" for p in patients],
+            [day(p.patient_dob) for p in patients],
+            [day(p.date_added) for p in patients],
+        ],
+        [3.2, 4, 2.6, 2.2, 1.7, 2.2, 2.2],
+        wrap=(0, 1),
+    )
+
+def build_drugs_pdf(path, hospital, drugs, filter):
+    build_report(
+        path, hospital, f"{filter.capitalize()} Drugs Report",
+        ["Drug", "Category", "Quantity", "Price", "Expiry", "Date Added"],
+        [
+            [d.drug_name or "" for d in drugs],
+            [d.drug_category or "" for d in drugs],
+            [d.drug_quantity for d in drugs],
+            [f"Ksh. {d.drug_price}" for d in drugs],
+            [day(d.drug_expiry) for d in drugs],
+            [day(d.date_added) for d in drugs],
+        ],
+        [3.5, 3.5, 3, 2.5, 3, 3],
+        wrap=(0, 1),
+    )
+
+def build_appointments_pdf(path, hospital, apps, start_date, end_date):
+    build_report(
+        path, hospital, f"{start_date} to {end_date} Appointments Report",
+        ["Patient", "About", "Start On", "Time", "Date Added"],
+        [
+            [a.patient.patient_name if a.patient else "" for a in apps],
+            [a.appointment_desc or "" for a in apps],
+            [str(a.date_requested) for a in apps],
+            [str(a.time_requested) for a in apps],
+            [day(a.date_added) for a in apps],
+        ],
+        [3.5, 3.5, 3, 3, 3],
+        wrap=(0, 1),
+    )
+
+def build_diagnosis_pdf(path, hospital, diags, start_date, end_date):
+    build_report(
+        path, hospital, f"{start_date} to {end_date} Diagnoses Report",
+        ["Patient", "Symptoms", "Findings", "Suggested Diag", "Date Added"],
+        [
+            [d.patient.patient_name if d.patient else "" for d in diags],
+            [d.symptoms or "" for d in diags],
+            [d.findings or "" for d in diags],
+            [d.suggested_diagnosis or "" for d in diags],
+            [day(d.date_added) for d in diags],
+        ],
+        [3.5, 3.5, 3, 3, 3],
+        wrap=(0, 1, 2, 3),
+    )
+
+def build_lab_requests_pdf(path, hospital, reqs, start_date, end_date):
+    build_report(
+        path, hospital, f"{start_date} to {end_date} Lab Requests Report",
+        ["Patient", "Test", "Requested By", "Price", "Date Added"],
+        [
+            [r.patient.patient_name if r.patient else "" for r in reqs],
+            [r.test.test_name if r.test else "" for r in reqs],
+            [r.doctor.worker_name if r.doctor else "" for r in reqs],
+            [r.test.test_price if r.test else "" for r in reqs],
+            [day(r.date_added) for r in reqs],
+        ],
+        [3.5, 3.5, 3, 3, 3],
+        wrap=(0, 1, 2),
+    )
+
+def build_lab_results_pdf(path, hospital, res, start_date, end_date):
+    build_report(
+        path, hospital, f"{start_date} to {end_date} Lab Results Report",
+        ["Patient", "Observations", "Conclusion", "Lab Tech", "Date Added"],
+        [
+            [r.patient.patient_name if r.patient else "" for r in res],
+            [r.observations or "" for r in res],
+            [r.conclusion or "" for r in res],
+            [r.tech.worker_name if r.tech else "" for r in res],
+            [day(r.date_added) for r in res],
+        ],
+        [3.5, 3.5, 3, 3, 3],
+        wrap=(0, 1, 2, 3),
+    )
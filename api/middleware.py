@@ -0,0 +1,61 @@
+from datetime import datetime
+from uuid import UUID
+from starlette.datastructures import QueryParams
+from starlette.requests import Request
+from starlette.responses import JSONResponse
+from api.auth import AUTH_MODE, request_token, verify_token, AuthError
+from database.actions.hospital import fetch_hospital_expiry
+from database.ids import NATIVE_UUID
+
+# an expired hospital can still sign in, look itself up and renew
+UNGATED_PATHS = {
+    "/hospitals/hospitals-add/",
+    "/hospitals/hospitals-signin/",
+    "/hospitals/hospitals-specific/",
+    "/hospitals/renew-activation/",
+    "/docs",
+    "/redoc",
+    "/openapi.json",
+}
+
+def request_tenant(scope):
+    # (hospital_id, verified). A token names its hospital; a bad token or, with
+    # auth required, a missing one is left for tenant_scope to reject.
+    token = request_token(Request(scope))
+    if token:
+        try:
+            return verify_token(token)["hid"], True
+        except AuthError:
+            return None, False
+    if AUTH_MODE == "required":
+        return None, False
+    hospital_id = QueryParams(scope["query_string"]).get("hospital_id")
+    if hospital_id and NATIVE_UUID:
+        try:
+            UUID(hospital_id)
+        except ValueError:
+            # a malformed id names no hospital, and GUID will not bind it;
+            # the route rejects it
+            return None, False
+    return hospital_id, False
+
+
+class TenantGate:
+    # Rejects requests for hospitals whose subscription has lapsed. Expiry dates
+    # come from a per-process TTL cache, so the hot path never touches the DB.
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNGATED_PATHS:
+            return await self.app(scope, receive, send)
+        hospital_id, verified = request_tenant(scope)
+        if hospital_id:
+            expiry = await fetch_hospital_expiry(hospital_id, verified)
+            if expiry is not None and expiry < datetime.now():
+                response = JSONResponse(
+                    {"detail": "Subscription expired", "expiry_date": expiry.isoformat()},
+                    status_code=402,
+                )
+                return await response(scope, receive, send)
+        return await self.app(scope, receive, send)
@@ -0,0 +1,139 @@
+import os
+import time
+from sqlalchemy import update, case
+from sqlalchemy.dialects import postgresql, sqlite
+from starlette.responses import JSONResponse
+from config import async_session, engine
+from database.models import RateLimitBucket
+from api.middleware import request_tenant
+
+# (tokens per second, burst) per route class and tenant
+RATE_LIMITS = {
+    "read": (20, 60),
+    "write": (5, 20),
+    "export": (0.2, 3),
+    "auth": (1, 10),
+}
+# PDF/CSV builds are CPU bound and hold the worker; cap how many run at once
+EXPORT_LIMIT_PER_TENANT = 1
+EXPORT_LIMIT_TOTAL = 3
+RATE_LIMIT_STORE = os.getenv("NEPTUNE_RATE_LIMIT_STORE", "memory")
+MAX_BUCKETS = 50_000
+AUTH_PATHS = {
+    "/hospitals/hospitals-signin/",
+    "/hospitals/hospitals-signout/",
+    "/hospitals/hospitals-change-password/",
+    "/workers/workers-signin/",
+    "/workers/workers-signout/",
+    "/workers/workers-change-password/",
+}
+UNLIMITED_PATHS = {"/docs", "/redoc", "/openapi.json"}
+
+def route_class(method: str, path: str):
+    if path in AUTH_PATHS:
+        return "auth"
+    if "-export-" in path:
+        return "export"
+    if method in ("GET", "HEAD", "OPTIONS"):
+        return "read"
+    return "write"
+
+
+class MemoryBuckets:
+    def __init__(self):
+        self.buckets = {}
+
+    async def take(self, key: str, rate: float, burst: float):
+        # returns 0 when a token was taken, otherwise seconds until the next one
+        now = time.monotonic()
+        tokens, last = self.buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - last) * rate)
+        if tokens < 1:
+            self.buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        if key not in self.buckets and len(self.buckets) >= MAX_BUCKETS:
+            self.prune(now)
+        self.buckets[key] = (tokens - 1, now)
+        return 0
+
+    def prune(self, now: float):
+        # a bucket idle long enough to have refilled is the same as no bucket
+        for key, (tokens, last) in list(self.buckets.items()):
+            if now - last > 600:
+                del self.buckets[key]
+
+
+class DatabaseBuckets:
+    # The refill and the take happen in one conditional UPDATE, so concurrent
+    # workers cannot both spend the last token.
+    def __init__(self):
+        dialect = engine.dialect.name
+        self.insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+    async def take(self, key: str, rate: float, burst: float):
+        now = time.time()
+        refilled = RateLimitBucket.tokens + (now - RateLimitBucket.updated_at) * rate
+        refilled = case((refilled > burst, burst), else_=refilled)
+        async with async_session.begin() as session:
+            result = await session.execute(
+                update(RateLimitBucket)
+                .where((RateLimitBucket.bucket_key == key) & (refilled >= 1))
+                .values(tokens=refilled - 1, updated_at=now)
+            )
+            if result.rowcount:
+                return 0
+            result = await session.execute(
+                self.insert(RateLimitBucket)
+                .values(bucket_key=key, tokens=burst - 1, updated_at=now)
+                .on_conflict_do_nothing(index_elements=["bucket_key"])
+            )
+            if result.rowcount:
+                return 0
+        return 1 / rate
+
+
+class RateLimiter:
+    # Token buckets per (route class, hospital) plus a cap on concurrent
+    # exports, so one tenant's polling or report runs cannot starve the rest.
+    # Only a verified token names the hospital; anything else, including a
+    # hospital_id query parameter on its own, is keyed by client address.
+    def __init__(self, app, store: str = RATE_LIMIT_STORE):
+        self.app = app
+        self.buckets = DatabaseBuckets() if store == "db" else MemoryBuckets()
+        self.exports = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] in UNLIMITED_PATHS:
+            return await self.app(scope, receive, send)
+        kind = route_class(scope["method"], scope["path"])
+        hospital_id, verified = request_tenant(scope)
+        tenant = hospital_id if verified else (scope.get("client") or ("unknown",))[0]
+        rate, burst = RATE_LIMITS[kind]
+        try:
+            wait = await self.buckets.take(f"{kind}:{tenant}", rate, burst)
+        except Exception as e:
+            # a store outage should not take the API down with it
+            print("Rate limit store failed: ", e)
+            wait = 0
+        if wait:
+            return await self.reject(scope, receive, send, "Too many requests", wait)
+        if kind != "export":
+            return await self.app(scope, receive, send)
+
+        running = self.exports.get(tenant, 0)
+        if running >= EXPORT_LIMIT_PER_TENANT or sum(self.exports.values()) >= EXPORT_LIMIT_TOTAL:
+            return await self.reject(scope, receive, send, "An export is already running", 5)
+        self.exports[tenant] = running + 1
+        try:
+            return await self.app(scope, receive, send)
+        finally:
+            self.exports[tenant] -= 1
+            if not self.exports[tenant]:
+                del self.exports[tenant]
+
+    async def reject(self, scope, receive, send, detail: str, retry_after: float):
+        response = JSONResponse(
+            {"detail": detail}, status_code=429,
+            headers={"Retry-After": str(max(1, round(retry_after)))},
+        )
+        await response(scope, receive, send)
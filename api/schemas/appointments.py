@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import date, time
 from typing import Optional
 from api.schemas.workers import WorkersOut
@@ -43,3 +43,23 @@ class AppointmentsOut(BaseModel):
 
     class Config:
         orm_mode = True
+
+class AvailabilityIn(BaseModel):
+    weekday: int = Field(ge=0, le=6)
+    start_time: time
+    end_time: time
+    slot_minutes: int = Field(default=30, ge=5, le=480)
+
+    class Config:
+        orm_mode = True
+
+class AvailabilityOut(BaseModel):
+    availability_id: Optional[str] = None
+    consultant_id: Optional[str] = None
+    weekday: Optional[int] = None
+    start_time: Optional[time] = None
+    end_time: Optional[time] = None
+    slot_minutes: Optional[int] = None
+
+    class Config:
+        orm_mode = True
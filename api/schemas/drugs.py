@@ -1,5 +1,5 @@
-from pydantic import BaseModel
-from datetime import date
+from pydantic import BaseModel, Field
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -10,6 +10,7 @@ class DrugsIn(BaseModel):
     drug_quantity: Optional[int] = None
     drug_price: Optional[float] = None
     drug_expiry: Optional[date] = None
+    reorder_level: Optional[int] = None
 
     class Config:
         form_attributes = True
@@ -21,6 +22,7 @@ class DrugsEdit(BaseModel):
     drug_quantity: Optional[int] = None
     drug_price: Optional[float] = None
     drug_expiry: Optional[date] = None
+    reorder_level: Optional[int] = None
 
     class Config:
         form_attributes = True
@@ -34,8 +36,31 @@ class DrugsOut(BaseModel):
     drug_quantity: Optional[int] = None
     drug_price: Optional[float] = None
     drug_expiry: Optional[date] = None
+    reorder_level: Optional[int] = None
     
     date_added: Optional[date]
 
     class Config:
         form_attributes = True
+
+class DrugAlertsOut(BaseModel):
+    alert_id: Optional[str] = None
+    hospital_id: Optional[str] = None
+    drug_id: Optional[str] = None
+    alert_type: Optional[str] = None
+    drug_name: Optional[str] = None
+    drug_quantity: Optional[int] = None
+    reorder_level: Optional[int] = None
+    drug_expiry: Optional[date] = None
+    created_at: Optional[datetime] = None
+
+    class Config:
+        form_attributes = True
+
+class DrugRestockIn(BaseModel):
+    lot_number: Optional[str] = None
+    lot_quantity: int = Field(gt=0)
+    lot_expiry: date
+
+    class Config:
+        form_attributes = True
@@ -43,4 +43,9 @@ class HospitalsOut(BaseModel):
     expiry_date: datetime
 
     class Config:
-        form_attributes = True
\ No newline at end of file
+        form_attributes = True
+
+class HospitalSession(HospitalsOut):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: datetime
\ No newline at end of file
@@ -40,6 +40,7 @@ class LaboratoryRequestsIn(BaseModel):
 class LaboratoryRequestsOut(BaseModel):
     hospital_id: Optional[str] = None
     request_id: Optional[str] = None
+    request_status: Optional[str] = None
     
     test: Optional[LaboratoryTestsOut] = None
     patient: Optional[PatientsOut] = None
@@ -50,6 +51,7 @@ class LaboratoryRequestsOut(BaseModel):
 
 class LaboratoryResultsIn(BaseModel):
     patient_id: Optional[str] = None
+    request_id: Optional[str] = None
     observations: Optional[str] = None
     conclusion: Optional[str] = None
 
@@ -66,6 +68,7 @@ class LaboratoryResultsEdit(BaseModel):
 class LaboratoryResultsOut(BaseModel):
     hospital_id: Optional[str] = None
     result_id: Optional[str] = None
+    request_id: Optional[str] = None
 
     observations: Optional[str] = None
     conclusion: Optional[str] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, EmailStr
-from datetime import date
+from datetime import date, datetime
 from typing import Optional
 
 
@@ -48,4 +48,9 @@ class WorkersOut(BaseModel):
     date_added: Optional[date] = None
 
     class Config:
-        form_attributes = True
\ No newline at end of file
+        form_attributes = True
+
+class WorkerSession(WorkersOut):
+    access_token: str
+    token_type: str = "bearer"
+    expires_at: datetime
\ No newline at end of file
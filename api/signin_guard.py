@@ -0,0 +1,80 @@
+import time
+from collections import deque
+from fastapi import Request
+from fastapi.exceptions import HTTPException
+
+# Failed sign-ins are counted per account and per client address over a
+# sliding window. Past the free attempts each further failure doubles the
+# wait, and a blocked attempt is refused before any password hashing.
+WINDOW_SECONDS = 15 * 60
+ACCOUNT_FREE_ATTEMPTS = 5
+ADDRESS_FREE_ATTEMPTS = 20
+BASE_BACKOFF_SECONDS = 1
+MAX_BACKOFF_SECONDS = 15 * 60
+MAX_TRACKED_KEYS = 100_000
+
+
+class SigninGuard:
+    def __init__(self):
+        self.failures = {}
+
+    def recent(self, key: str, now: float):
+        attempts = self.failures.get(key)
+        if attempts is None:
+            return ()
+        while attempts and attempts[0] <= now - WINDOW_SECONDS:
+            attempts.popleft()
+        if not attempts:
+            del self.failures[key]
+        return attempts
+
+    def wait_for(self, key: str, free_attempts: int, now: float):
+        attempts = self.recent(key, now)
+        excess = len(attempts) - free_attempts
+        if excess < 0:
+            return 0
+        backoff = min(MAX_BACKOFF_SECONDS, BASE_BACKOFF_SECONDS * 2 ** excess)
+        return max(0, attempts[-1] + backoff - now)
+
+    def attempt(self, account: str, address: str):
+        # returns seconds to wait, or 0 after counting this attempt as a
+        # failure until succeeded() says otherwise; counting up front stops a
+        # concurrent burst from slipping through before the first result
+        now = time.monotonic()
+        keys = ((f"account:{account}", ACCOUNT_FREE_ATTEMPTS), (f"address:{address}", ADDRESS_FREE_ATTEMPTS))
+        wait = max(self.wait_for(key, free, now) for key, free in keys)
+        if wait:
+            return wait
+        if len(self.failures) >= MAX_TRACKED_KEYS:
+            self.prune(now)
+        for key, _ in keys:
+            self.failures.setdefault(key, deque(maxlen=64)).append(now)
+        return 0
+
+    def succeeded(self, account: str, address: str):
+        self.failures.pop(f"account:{account}", None)
+        attempts = self.failures.get(f"address:{address}")
+        if attempts:
+            attempts.pop()
+
+    def prune(self, now: float):
+        for key in list(self.failures):
+            self.recent(key, now)
+
+
+signin_guard = SigninGuard()
+
+def signin_account(email: str, hospital_id: str = None):
+    email = (email or "").strip().lower()
+    return f"{hospital_id}:{email}" if hospital_id else email
+
+def client_address(request: Request):
+    return request.client.host if request.client else "unknown"
+
+def guard_signin(account: str, address: str):
+    wait = signin_guard.attempt(account, address)
+    if wait:
+        raise HTTPException(
+            status_code=429, detail="Too many sign-in attempts",
+            headers={"Retry-After": str(max(1, round(wait)))},
+        )
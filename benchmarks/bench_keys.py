@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from uuid import uuid4
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from database.ids import uuid7
+
+# key layouts to compare: (label, column type per dialect, key factory)
+VARIANTS = {
+    "sqlite": [
+        ("text uuid4", "VARCHAR", lambda: str(uuid4())),
+        ("text uuid7", "VARCHAR", lambda: str(uuid7())),
+        ("blob uuid4", "BLOB", lambda: uuid4().bytes),
+        ("blob uuid7", "BLOB", lambda: uuid7().bytes),
+    ],
+    "postgresql": [
+        ("varchar uuid4", "VARCHAR", lambda: str(uuid4())),
+        ("varchar uuid7", "VARCHAR", lambda: str(uuid7())),
+        ("uuid uuid4", "UUID", lambda: uuid4()),
+        ("uuid uuid7", "UUID", lambda: uuid7()),
+    ],
+}
+
+async def index_bytes(conn, dialect: str, table: str):
+    if dialect == "postgresql":
+        result = await conn.execute(text(f"SELECT pg_indexes_size('{table}')"))
+        return result.scalar()
+    result = await conn.execute(text(
+        "SELECT sum(pgsize) FROM dbstat WHERE name IN "
+        "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :table)"
+    ), {"table": table})
+    return result.scalar()
+
+async def run_variant(engine, dialect: str, index: int, column_type: str, make_key, rows: int, batch: int, seed: int):
+    # mirrors a model table: key, an indexed foreign key into earlier rows, payload
+    table = f"bench_keys_{index}"
+    rng = random.Random(seed)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP TABLE IF EXISTS {table}"))
+        await conn.execute(text(
+            f"CREATE TABLE {table} (id {column_type} PRIMARY KEY, parent_id {column_type}, payload VARCHAR)"
+        ))
+        await conn.execute(text(f"CREATE INDEX ix_{table}_parent ON {table} (parent_id)"))
+
+    keys = []
+    started = time.perf_counter()
+    for offset in range(0, rows, batch):
+        chunk = []
+        for _ in range(min(batch, rows - offset)):
+            key = make_key()
+            chunk.append({
+                "id": key,
+                "parent_id": keys[rng.randrange(len(keys))] if keys else None,
+                "payload": "x" * 40,
+            })
+            keys.append(key)
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(f"INSERT INTO {table} (id, parent_id, payload) VALUES (:id, :parent_id, :payload)"),
+                chunk,
+            )
+    elapsed = time.perf_counter() - started
+
+    async with engine.begin() as conn:
+        size = await index_bytes(conn, dialect, table)
+        await conn.execute(text(f"DROP TABLE {table}"))
+    return rows / elapsed, size
+
+async def run(url: str, rows: int, batch: int, seed: int):
+    engine = create_async_engine(url)
+    dialect = engine.dialect.name
+    print(f"{rows:,} rows on {dialect}")
+    print(f"{'keys':<16}{'rows/s':>12}{'index MB':>12}")
+    try:
+        for index, (label, column_type, make_key) in enumerate(VARIANTS[dialect]):
+            rate, size = await run_variant(engine, dialect, index, column_type, make_key, rows, batch, seed)
+            print(f"{label:<16}{rate:>12,.0f}{size / 2 ** 20:>12.1f}")
+    finally:
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare insert rate and index size of key layouts")
+    parser.add_argument("--url", help="database to test on; defaults to a scratch SQLite file")
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--batch", type=int, default=1_000)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if args.url:
+        asyncio.run(run(args.url, args.rows, args.batch, args.seed))
+        return
+    with tempfile.TemporaryDirectory() as scratch:
+        url = "sqlite+aiosqlite:///" + os.path.join(scratch, "keys.db")
+        asyncio.run(run(url, args.rows, args.batch, args.seed))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import argparse
+import json
+import random
+import time
+from datetime import datetime, date
+
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from api.responses import FastJSONResponse
+from api.schemas.billings import BillingOut
+from api.schemas.patients import PatientsOut
+from database.models import Billing, Patient
+
+def make_patient(rng: random.Random, index: int):
+    return Patient(
+        patient_id=f"patient-{index}", hospital_id="hospital-1",
+        patient_name=f"Patient {index}", patient_email=f"patient{index}@example.com",
+        patient_phone=f"07{rng.randrange(10 ** 8):08d}", patient_id_number=str(index),
+        patient_gender=rng.choice(["Male", "Female"]), patient_address="Nairobi",
+        patient_dob=date(1990, 1, 1), patient_weight=70.0, patient_avg_pulse=72.0,
+        patient_bp=120.0, patient_chronic_condition="Null", patient_allergy="Null",
+        patient_blood_type="O+", date_added=datetime(2024, 1, 1),
+    )
+
+def patient_row(patient: Patient):
+    row = {column: getattr(patient, column) for column in PatientsOut.model_fields}
+    row["date_added"] = patient.date_added.date()
+    return row
+
+def make_billings(rows: int, seed: int):
+    rng = random.Random(seed)
+    patients = [make_patient(rng, index) for index in range(max(1, rows // 10))]
+    billings = []
+    for index in range(rows):
+        patient = rng.choice(patients)
+        billings.append(Billing(
+            billing_id=f"billing-{index}", hospital_id="hospital-1",
+            patient_id=patient.patient_id, patient=patient, source="POS",
+            item="Paracetamol 500mg", total=round(rng.random() * 1000, 2),
+            created_at=datetime(2024, 1, 1),
+        ))
+    return billings
+
+def orm_path(billings):
+    validated = TypeAdapter(list[BillingOut]).validate_python(billings, from_attributes=True)
+    return json.dumps(jsonable_encoder(validated)).encode("utf-8")
+
+def row_path(rows):
+    return FastJSONResponse(rows).body
+
+def timed(label: str, fn, repeat: int):
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    print(f"{label:<34}{best * 1000:>10.1f} ms")
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare ORM+pydantic and row+orjson list serialization")
+    parser.add_argument("--rows", type=int, default=50_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    billings = make_billings(args.rows, args.seed)
+    rows = []
+    for billing in billings:
+        rows.append({
+            "billing_id": billing.billing_id, "hospital_id": billing.hospital_id,
+            "patient_id": billing.patient_id, "item": billing.item,
+            "source": billing.source, "total": billing.total,
+            "created_at": billing.created_at.date(), "patient": patient_row(billing.patient),
+        })
+
+    old = orm_path(billings)
+    new = row_path(rows)
+    assert json.loads(old) == json.loads(new), "fast path output differs from BillingOut"
+
+    print(f"{args.rows:,} billing rows")
+    before = timed("ORM + BillingOut + json", lambda: orm_path(billings), args.repeat)
+    after = timed("Row dicts + FastJSONResponse", lambda: row_path(rows), args.repeat)
+    print(f"{'speedup':<34}{before / after:>10.1f} x")
+
+if __name__ == "__main__":
+    main()
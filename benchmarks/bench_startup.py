@@ -0,0 +1,55 @@
+import argparse
+import subprocess
+import sys
+
+# modules that should only load when an export is requested
+LAZY_MODULES = ("reportlab", "pandas", "pyarrow")
+
+def import_profile(target: str, cwd: str = None):
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {target}"],
+        capture_output=True, text=True, check=True, cwd=cwd,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        label, cumulative_us, name = line.split("|", 2)
+        self_us = label.split(":", 1)[1].strip()
+        if not self_us.isdigit():
+            continue
+        modules.append((name.strip(), int(self_us), int(cumulative_us)))
+    return modules
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure and budget the import cost of the API")
+    parser.add_argument("--target", default="main")
+    parser.add_argument("--budget-ms", type=float, default=1200)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    best, profile = None, None
+    for _ in range(args.runs):
+        modules = import_profile(args.target)
+        total = next(cumulative for name, _, cumulative in modules if name == args.target)
+        if best is None or total < best:
+            best, profile = total, modules
+
+    print(f"import {args.target}: {best / 1000:.1f} ms (budget {args.budget_ms:.0f} ms)")
+    print("slowest modules by self time:")
+    for name, self_us, _ in sorted(profile, key=lambda m: m[1], reverse=True)[:args.top]:
+        print(f"  {self_us / 1000:>8.1f} ms  {name}")
+
+    failures = []
+    loaded = sorted({name for name, _, _ in profile if name.split(".")[0] in LAZY_MODULES})
+    if loaded:
+        failures.append(f"eagerly imported: {', '.join(loaded)}")
+    if best / 1000 > args.budget_ms:
+        failures.append(f"over budget by {best / 1000 - args.budget_ms:.1f} ms")
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import argparse
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from fastapi import FastAPI
+
+from api.auth import issue_token
+from api.middleware import TenantGate
+from database.actions.hospital import expiry_cache
+
+def make_app():
+    app = FastAPI()
+
+    @app.get("/ping/")
+    async def ping(hospital_id: str):
+        return {"hospital_id": hospital_id}
+
+    return app
+
+def make_scope(hospital_id: str):
+    token = issue_token("hospital", hospital_id, hospital_id)["access_token"]
+    return {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "GET", "scheme": "http", "path": "/ping/", "raw_path": b"/ping/",
+        "root_path": "", "query_string": f"hospital_id={hospital_id}".encode(),
+        "headers": [(b"host", b"bench"), (b"authorization", f"Bearer {token}".encode())], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+
+async def drive(app, scope, requests: int):
+    statuses = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    started = time.perf_counter()
+    for _ in range(requests):
+        await app(scope, receive, send)
+    elapsed = time.perf_counter() - started
+    return elapsed / requests, statuses[-1]
+
+async def run(requests: int, repeat: int):
+    app = make_app()
+    gated = TenantGate(app)
+    # warm entries, as on a worker that has already seen these tenants
+    expiry_cache.set("active", datetime.now() + timedelta(days=30))
+    expiry_cache.set("expired", datetime.now() - timedelta(days=1))
+
+    cases = [
+        ("FastAPI route, no gate", app, "active"),
+        ("FastAPI route, gated (active)", gated, "active"),
+        ("gated (expired, rejected)", gated, "expired"),
+    ]
+    results = {}
+    for label, target, hospital_id in cases:
+        scope = make_scope(hospital_id)
+        await drive(target, scope, 200)
+        best = min([await drive(target, scope, requests) for _ in range(repeat)])
+        results[label] = best[0]
+        print(f"{label:<34}{best[0] * 1e6:>10.1f} us/request   status {best[1]}")
+    overhead = results["FastAPI route, gated (active)"] - results["FastAPI route, no gate"]
+    print(f"{'gate overhead':<34}{overhead * 1e6:>10.1f} us/request")
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the per-request cost of the tenant expiry gate")
+    parser.add_argument("--requests", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.repeat))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import select, func
+
+from config import engine, async_session, LOCAL_MODE
+from database.models import Base, Hospital, Patient
+from database.actions.patients import new_patient
+from database.write_queue import WriteQueue
+
+async def insert_patients(queue: WriteQueue, hospital_id: str, count: int, concurrency: int):
+    # `concurrency` handlers each adding patients one request at a time
+    async def handler(worker: int):
+        for i in range(worker, count, concurrency):
+            await queue.add(lambda: new_patient(hospital_id, {"patient_name": f"bench {i}"}))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(handler(worker) for worker in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    await queue.stop()
+    return elapsed
+
+async def run(count: int, concurrency: int):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    async with async_session.begin() as session:
+        hospital = Hospital(
+            hospital_name="write queue bench", hospital_email="bench@write-queue.local", hospital_password="-",
+        )
+        session.add(hospital)
+    print(f"{count:,} patient inserts from {concurrency} concurrent handlers")
+    print(f"{'writes':<30}{'inserts/s':>12}")
+    try:
+        for label, coalesce in (("one transaction per insert", False), ("coalesced writer", True)):
+            elapsed = await insert_patients(WriteQueue(coalesce), hospital.hospital_id, count, concurrency)
+            print(f"{label:<30}{count / elapsed:>12,.0f}")
+        async with async_session() as session:
+            stored = await session.scalar(
+                select(func.count()).select_from(Patient).where(Patient.hospital_id == hospital.hospital_id)
+            )
+        print(f"rows stored: {stored:,} of {2 * count:,}")
+    finally:
+        async with async_session.begin() as session:
+            await session.delete(await session.get(Hospital, hospital.hospital_id))
+            await session.execute(Patient.__table__.delete().where(Patient.hospital_id == hospital.hospital_id))
+        await engine.dispose()
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-request commits with the coalescing SQLite writer")
+    parser.add_argument("--count", type=int, default=5_000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    args = parser.parse_args()
+    if not LOCAL_MODE:
+        parser.error("run with NEPTUNE_LOCAL_DB=<scratch sqlite file>")
+    asyncio.run(run(args.count, args.concurrency))
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,47 @@
+import os
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy.orm import sessionmaker
+from database.local import LocalSession, sqlite_pragmas
 
-DATABASE_URL = (
+SERVER_DATABASE_URL = (
     "postgresql+asyncpg://neondb_owner:npg_icM2vRHn6qes@"
     "ep-noisy-king-ah8z3emv-pooler.c-3.us-east-1.aws.neon.tech/neondb"
 )
+# where a local site replicates to. It has no default: a site that was not
+# pointed at its central database must not push into whichever one that is.
+CENTRAL_DATABASE_URL = os.getenv("NEPTUNE_CENTRAL_DATABASE_URL")
 
-#DATABASE_URL = "sqlite+aiosqlite:///database.db"
-
+# NEPTUNE_LOCAL_DB=<path> serves the API from a SQLite file on site and
+# replicates to the central database in the background
+LOCAL_DB_PATH = os.getenv("NEPTUNE_LOCAL_DB")
+LOCAL_MODE = bool(LOCAL_DB_PATH)
 
-engine = create_async_engine(
-    DATABASE_URL,
-    echo=False
+DATABASE_URL = (
+    f"sqlite+aiosqlite:///{LOCAL_DB_PATH}" if LOCAL_MODE
+    else CENTRAL_DATABASE_URL or SERVER_DATABASE_URL
 )
+if LOCAL_MODE and not CENTRAL_DATABASE_URL:
+    print("NEPTUNE_CENTRAL_DATABASE_URL not set; replication is off")
+
+
+if LOCAL_MODE:
+    # sessions waiting on the writer lock keep their connection, so a capped
+    # pool could leave the lock holder with none to write on
+    engine = create_async_engine(DATABASE_URL, echo=False, max_overflow=-1)
+    event.listen(engine.sync_engine, "connect", sqlite_pragmas)
+else:
+    engine = create_async_engine(
+        DATABASE_URL,
+        echo=False
+    )
 
 async_session = sessionmaker(
     bind=engine,
-    class_=AsyncSession,
+    class_=LocalSession if LOCAL_MODE else AsyncSession,
     expire_on_commit=False
 )
 
 async def get_session():
     async with async_session() as session:
         yield session
-
-
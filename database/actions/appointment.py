@@ -1,25 +1,108 @@
-from database.models import Appointment, Patient, Billing, Service
+from database.models import Appointment, Patient, Service, ConsultantAvailability, Worker
 from config import async_session
-from sqlalchemy import select
-from datetime import datetime
+from sqlalchemy import select, delete, literal, null, union_all, Date, Integer, Time
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, time, timedelta
 from sqlalchemy.orm import selectinload
+from database.utils import current_date
+from database.events import emit
+from database.archive import with_archived
+from database.write_queue import write_queue
+from database.actions.billing import add_billing
+
+MAX_SLOT_RANGE_DAYS = 7
+MAX_CALENDAR_RANGE_DAYS = 31
+
+CALENDAR_COLUMNS = (
+    Appointment.appointment_id, Appointment.date_requested, Appointment.time_requested,
+    Appointment.appointment_desc, Appointment.consultant_id,
+    Worker.worker_name.label("consultant_name"), Appointment.patient_id,
+    Patient.patient_name, Patient.patient_phone, Service.service_name,
+)
+
+class SlotError(ValueError):
+    pass
+
+def slot_times(start_time: time, end_time: time, slot_minutes: int):
+    step = timedelta(minutes=slot_minutes)
+    current = datetime.combine(date.min, start_time)
+    end = datetime.combine(date.min, end_time)
+    while current + step <= end:
+        yield current.time()
+        current += step
+
+async def check_slot(session, consultant_id: str, day: date, at: time, appointment_id: str = None):
+    if not consultant_id or not day or not at:
+        return
+    result = await session.execute(
+        select(ConsultantAvailability).where(
+            (ConsultantAvailability.consultant_id == consultant_id) &
+            (ConsultantAvailability.weekday == day.weekday())
+        )
+    )
+    windows = result.scalars().all()
+    # consultants without published availability accept any time, as before
+    if windows and not any(at in set(slot_times(w.start_time, w.end_time, w.slot_minutes)) for w in windows):
+        raise SlotError("Consultant is not available at that time")
+    stmt = select(Appointment.appointment_id).where(
+        (Appointment.consultant_id == consultant_id) &
+        (Appointment.date_requested == day) &
+        (Appointment.time_requested == at)
+    )
+    if appointment_id:
+        stmt = stmt.where(Appointment.appointment_id != appointment_id)
+    if (await session.execute(stmt)).first():
+        raise SlotError("Slot already booked")
 
 async def add_appointment(hospital_id: str, appointment_detail: dict):
-    async with async_session() as session:
-        print("Appointment detail before entering DB: ", appointment_detail)
+    print("Appointment detail before entering DB: ", appointment_detail)
+
+    # date_requested is the partition key, so it is never left empty; an
+    # appointment without a date is taken as being for today
+    day = appointment_detail.get("date_scheduled", None) or current_date()
+
+    async def book(session):
+        await check_slot(
+            session,
+            appointment_detail.get("consultant_id", None),
+            day,
+            appointment_detail.get("time_scheduled", None),
+        )
         new_appointment = Appointment(
             hospital_id = hospital_id,
             patient_id = appointment_detail.get("patient_id", None),
             consultant_id = appointment_detail.get("consultant_id", None),
             service_id = appointment_detail.get("service_id", None),
             appointment_desc = appointment_detail.get("appointment_desc", None),
-            date_requested = appointment_detail.get("date_scheduled", None),
+            date_requested = day,
             time_requested = appointment_detail.get("time_scheduled", None)
         )
+        session.add(new_appointment)
+        if new_appointment.service_id:
+            service = await session.get(Service, new_appointment.service_id)
+            if not service or service.hospital_id != hospital_id:
+                raise SlotError("Service not found")
+            add_billing(
+                session, hospital_id, "Appointments", service.service_name, service.service_price,
+                patient_id=new_appointment.patient_id,
+            )
+        return new_appointment
+
+    try:
         try:
-            session.add(new_appointment)
-            await session.commit()
-            await session.flush()
+            new_appointment = await write_queue.submit(book)
+        except IntegrityError:
+            # lost a race for the slot to a concurrent booking
+            raise SlotError("Slot already booked")
+        emit(
+            hospital_id, "appointment.created", appointment_id=new_appointment.appointment_id,
+            consultant_id=new_appointment.consultant_id,
+            date_requested=new_appointment.date_requested,
+            time_requested=new_appointment.time_requested,
+        )
+        if new_appointment.service_id:
+            emit(hospital_id, "billing.created", source="Appointments", patient_id=new_appointment.patient_id)
+        async with async_session() as session:
             stmt = (
                 select(Appointment)
                 .where(Appointment.appointment_id == new_appointment.appointment_id)
@@ -28,25 +111,11 @@ async def add_appointment(hospital_id: str, appointment_detail: dict):
                 .options(selectinload(Appointment.consultant))
             )
             result = await session.execute(stmt)
-            mega_new_appointment = result.scalars().first()
-            serv_stmt = select(Service).where(
-                Service.service_id == new_appointment.service_id
-            )
-            serv_result = await session.execute(serv_stmt)
-            service = serv_result.scalars().first()
-            session.add(
-                Billing(
-                    hospital_id = hospital_id,
-                    patient_id = appointment_detail.get("patient_id", None),
-                    source = "Appointments",
-                    item = service.service_name,
-                    total = service.service_price,
-                )
-            )
-            await session.commit()
-            return mega_new_appointment
-        except Exception as e:
-            print("An error occurred: ", e)
+            return result.scalars().first()
+    except SlotError:
+        raise
+    except Exception as e:
+        print("An error occurred: ", e)
 
 async def fetch_appointments(hospital_id: str, sort_term: str, sort_dir: str):
     async with async_session.begin() as session:
@@ -81,6 +150,28 @@ async def fetch_appointments(hospital_id: str, sort_term: str, sort_dir: str):
             return None
         return appointments
 
+async def fetch_appointments_between(hospital_id: str, start: datetime, end: datetime):
+    async with async_session.begin() as session:
+        stmt = (
+            select(Appointment)
+            .where(
+                (Appointment.hospital_id == hospital_id) &
+                # the partition key, so only the months in range are read
+                (Appointment.date_requested >= start.date()) &
+                (Appointment.date_requested <= end.date())
+            )
+            .options(selectinload(Appointment.patient))
+            .options(selectinload(Appointment.service))
+            .options(selectinload(Appointment.consultant))
+            .order_by(Appointment.date_requested.desc(), Appointment.time_requested.desc())
+        )
+        result = await session.execute(stmt)
+        appointments = result.scalars().all()
+        appointments = await with_archived(appointments, "appointments", hospital_id, start, end, ("patient", "service", "consultant"))
+        if not appointments:
+            return None
+        return appointments
+
 async def search_appointments(hospital_id: str, search_term: str):
     async with async_session.begin() as session:
         stmt = (
@@ -125,13 +216,30 @@ async def edit_appointment(hospital_id: str, appointment_id: str, appointment_de
         if not appointment:
             return None
         appointment = await session.merge(appointment)
+        day = appointment_detail.get("date_scheduled", None) or appointment.date_requested
+        await check_slot(
+            session, appointment.consultant_id,
+            day,
+            appointment_detail.get("time_scheduled", None),
+            appointment_id,
+        )
         try:
             appointment.appointment_desc = appointment_detail.get("appointment_desc", None)
-            appointment.date_requested = appointment_detail.get("date_scheduled", None)
+            appointment.date_requested = day
             appointment.time_requested = appointment_detail.get("time_scheduled", None)
-            return appointment
+            await session.flush()
+        except IntegrityError:
+            raise SlotError("Slot already booked")
         except Exception as e:
             print("An error occurred: ", e)
+            return None
+    emit(
+        hospital_id, "appointment.updated", appointment_id=appointment_id,
+        consultant_id=appointment.consultant_id,
+        date_requested=appointment.date_requested,
+        time_requested=appointment.time_requested,
+    )
+    return appointment
         
 async def delete_appointment(hospital_id: str, appointment_id: str):
     async with async_session.begin() as session:
@@ -142,4 +250,134 @@ async def delete_appointment(hospital_id: str, appointment_id: str):
         try:
             await session.delete(appointment)
         except Exception as e:
-            print("An error occurred: ", e)
\ No newline at end of file
+            print("An error occurred: ", e)
+            return None
+    emit(hospital_id, "appointment.deleted", appointment_id=appointment_id)
+
+async def set_consultant_availability(hospital_id: str, consultant_id: str, windows: list):
+    async with async_session.begin() as session:
+        await session.execute(
+            delete(ConsultantAvailability).where(
+                (ConsultantAvailability.hospital_id == hospital_id) &
+                (ConsultantAvailability.consultant_id == consultant_id)
+            )
+        )
+        for window in windows:
+            session.add(ConsultantAvailability(
+                hospital_id = hospital_id,
+                consultant_id = consultant_id,
+                weekday = window.get("weekday"),
+                start_time = window.get("start_time"),
+                end_time = window.get("end_time"),
+                slot_minutes = window.get("slot_minutes", 30),
+            ))
+    return await fetch_consultant_availability(hospital_id, consultant_id)
+
+async def fetch_consultant_availability(hospital_id: str, consultant_id: str):
+    async with async_session() as session:
+        result = await session.execute(
+            select(ConsultantAvailability)
+            .where(
+                (ConsultantAvailability.hospital_id == hospital_id) &
+                (ConsultantAvailability.consultant_id == consultant_id)
+            )
+            .order_by(ConsultantAvailability.weekday, ConsultantAvailability.start_time)
+        )
+        return result.scalars().all()
+
+async def fetch_free_slots(hospital_id: str, start: date, end: date, consultant_id: str = None):
+    # Availability windows and bookings in the range arrive in one UNION ALL;
+    # the booked half walks the (consultant_id, date_requested, time_requested)
+    # slot index instead of loading the hospital's appointment history.
+    windows = select(
+        literal("open").label("kind"), ConsultantAvailability.consultant_id,
+        ConsultantAvailability.weekday, null().cast(Date).label("day"),
+        ConsultantAvailability.start_time, ConsultantAvailability.end_time,
+        ConsultantAvailability.slot_minutes,
+    ).where(ConsultantAvailability.hospital_id == hospital_id)
+    booked = select(
+        literal("booked"), Appointment.consultant_id,
+        null().cast(Integer), Appointment.date_requested,
+        Appointment.time_requested, null().cast(Time), null().cast(Integer),
+    ).where(
+        (Appointment.hospital_id == hospital_id) &
+        (Appointment.date_requested >= start) &
+        (Appointment.date_requested <= end)
+    )
+    if consultant_id:
+        windows = windows.where(ConsultantAvailability.consultant_id == consultant_id)
+        booked = booked.where(Appointment.consultant_id == consultant_id)
+    async with async_session() as session:
+        result = await session.execute(union_all(windows, booked))
+        rows = result.all()
+
+    open_windows, taken = {}, set()
+    for kind, consultant, weekday, day, start_time, end_time, slot_minutes in rows:
+        if kind == "open":
+            open_windows.setdefault(consultant, []).append((weekday, start_time, end_time, slot_minutes))
+        else:
+            taken.add((consultant, day, start_time))
+
+    now = datetime.now()
+    free = {}
+    for consultant, consultant_windows in open_windows.items():
+        days = free.setdefault(consultant, {})
+        day = start
+        while day <= end:
+            slots = [
+                at
+                for weekday, start_time, end_time, slot_minutes in consultant_windows
+                if weekday == day.weekday()
+                for at in slot_times(start_time, end_time, slot_minutes)
+                if (consultant, day, at) not in taken and datetime.combine(day, at) > now
+            ]
+            if slots:
+                days[day.isoformat()] = [at.strftime("%H:%M") for at in sorted(slots)]
+            day += timedelta(days=1)
+    return free
+
+async def fetch_appointment_calendar(hospital_id: str, start: date, end: date, consultant_id: str = None):
+    # display columns only, read through (hospital_id, date_requested, time_requested)
+    stmt = (
+        select(*CALENDAR_COLUMNS)
+        .outerjoin(Worker, Worker.worker_id == Appointment.consultant_id)
+        .outerjoin(Patient, Patient.patient_id == Appointment.patient_id)
+        .outerjoin(Service, Service.service_id == Appointment.service_id)
+        .where(
+            (Appointment.hospital_id == hospital_id) &
+            (Appointment.date_requested >= start) &
+            (Appointment.date_requested <= end)
+        )
+        .order_by(Appointment.date_requested, Appointment.time_requested)
+    )
+    if consultant_id:
+        stmt = stmt.where(Appointment.consultant_id == consultant_id)
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        rows = result.mappings().all()
+
+    days = {}
+    for row in rows:
+        consultants = days.setdefault(row["date_requested"].isoformat(), {})
+        consultant = consultants.setdefault(row["consultant_id"], {
+            "consultant_id": row["consultant_id"],
+            "consultant_name": row["consultant_name"],
+            "hours": {},
+        })
+        at = row["time_requested"]
+        hour = f"{at.hour:02d}:00" if at else "unscheduled"
+        consultant["hours"].setdefault(hour, []).append({
+            "appointment_id": row["appointment_id"],
+            "time_requested": at.strftime("%H:%M") if at else None,
+            "appointment_desc": row["appointment_desc"],
+            "patient_id": row["patient_id"],
+            "patient_name": row["patient_name"],
+            "patient_phone": row["patient_phone"],
+            "service_name": row["service_name"],
+        })
+    return {
+        "start_date": start.isoformat(),
+        "end_date": end.isoformat(),
+        "total": len(rows),
+        "days": {day: list(consultants.values()) for day, consultants in days.items()},
+    }
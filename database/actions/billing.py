@@ -1,60 +1,106 @@
 from database.models import Billing, Patient
+from database.actions.patients import PATIENT_COLUMNS
 from config import async_session
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+from sqlalchemy import select, func
 from datetime import datetime, date, time
+from database.archive import fetch_archived_rows
+from database.utils import day_after
 
-async def show_total_billings(hospital_id: str):
+BILLING_COLUMNS = (
+    Billing.billing_id, Billing.hospital_id, Billing.patient_id,
+    Billing.item, Billing.source, Billing.total,
+    func.date(Billing.created_at).label("created_at"),
+)
+PATIENT_FIELDS = tuple(column.key for column in PATIENT_COLUMNS)
+
+def add_billing(session, hospital_id: str, source: str, item: str, total, patient_id: str = None):
+    # the line joins the caller's transaction, so it commits or rolls back
+    # with the clinical row it bills for
+    billing = Billing(
+        hospital_id=hospital_id,
+        patient_id=patient_id,
+        source=source,
+        item=item,
+        total=total,
+    )
+    session.add(billing)
+    return billing
+
+def billing_rows_stmt():
+    return (
+        select(*BILLING_COLUMNS, *(column.label(f"patient__{column.key}") for column in PATIENT_COLUMNS))
+        .outerjoin(Patient, Billing.patient_id == Patient.patient_id)
+    )
+
+def nest_billing_rows(result):
+    rows = []
+    width = len(BILLING_COLUMNS)
+    billing_fields = tuple(result.keys())[:width]
+    for row in result:
+        billing = dict(zip(billing_fields, row[:width]))
+        billing["patient"] = dict(zip(PATIENT_FIELDS, row[width:])) if row[width] is not None else None
+        rows.append(billing)
+    return rows
+
+async def fetch_billing_rows(hospital_id: str):
     async with async_session() as session:
-        stmt = select(Billing).where(
-            Billing.hospital_id == hospital_id
-        ).options(selectinload(Billing.patient))
+        stmt = billing_rows_stmt().where(Billing.hospital_id == hospital_id)
         result = await session.execute(stmt)
-        billings = result.scalars().all()
-        return billings or []
+        return nest_billing_rows(result)
 
-async def show_total_patient_billings(hospital_id: str, patient_id: str):
+async def fetch_patient_billing_rows(hospital_id: str, patient_id: str, today_only: bool = False):
     async with async_session() as session:
-        stmt = select(Billing).where(
+        stmt = billing_rows_stmt().where(
             (Billing.hospital_id == hospital_id) &
             (Billing.patient_id == patient_id)
-        ).options(selectinload(Billing.patient))
+        )
+        if today_only:
+            stmt = stmt.where(
+                (Billing.created_at >= datetime.combine(date.today(), time.min)) &
+                (Billing.created_at <= datetime.combine(date.today(), time.max))
+            )
         result = await session.execute(stmt)
-        billings = result.scalars().all()
-        return billings or []
+        return nest_billing_rows(result)
 
-async def show_total_patient_billings_today(hospital_id: str, patient_id: str):
+async def search_billing_rows(hospital_id: str, search_term: str):
     async with async_session() as session:
-        today_start = datetime.combine(date.today(), time.min)
-        today_end = datetime.combine(date.today(), time.max)
-
-        stmt = (
-            select(Billing)
-            .where(
-                (Billing.hospital_id == hospital_id) &
-                (Billing.patient_id == patient_id) &
-                (Billing.created_at >= today_start) &
-                (Billing.created_at <= today_end)
-            )
-            .options(selectinload(Billing.patient))
+        stmt = billing_rows_stmt().where(
+            (Billing.hospital_id == hospital_id) &
+            (Patient.patient_name.ilike(f"%{search_term}%"))
         )
-
         result = await session.execute(stmt)
-        billings = result.scalars().all()
+        return nest_billing_rows(result)
 
-        return billings or []
-
-async def search_billings(hospital_id: str, search_term: str):
+async def fetch_billing_rows_between(hospital_id: str, start: datetime, end: datetime, patient_id: str = None):
     async with async_session() as session:
-        stmt = (
-            select(Billing)
-            .join(Patient)
-            .where(
-                (Billing.hospital_id == hospital_id) &
-                (Patient.patient_name.ilike(f"%{search_term}%"))
-            )
-            .options(selectinload(Billing.patient))
+        stmt = billing_rows_stmt().where(
+            (Billing.hospital_id == hospital_id) &
+            (Billing.created_at >= start) &
+            (Billing.created_at < day_after(end))
         )
+        if patient_id:
+            stmt = stmt.where(Billing.patient_id == patient_id)
         result = await session.execute(stmt)
-        billings = result.scalars().all()
-        return billings or []
+        billings = nest_billing_rows(result)
+
+        # older billings live in the Parquet archive; patients never leave
+        # the database, so join them back in here
+        live_ids = {billing["billing_id"] for billing in billings}
+        archived = [
+            row for row in await fetch_archived_rows(
+                "billings", hospital_id, start, end, patient_id,
+                columns=[column.key for column in BILLING_COLUMNS],
+            )
+            if row["billing_id"] not in live_ids
+        ]
+        patient_ids = {row["patient_id"] for row in archived} - {None}
+        patients = {}
+        if patient_ids:
+            result = await session.execute(select(*PATIENT_COLUMNS).where(Patient.patient_id.in_(patient_ids)))
+            patients = {row.patient_id: dict(row._mapping) for row in result}
+        for row in archived:
+            row["created_at"] = row["created_at"].date() if row["created_at"] else None
+            row["patient"] = patients.get(row["patient_id"])
+        billings.extend(archived)
+        billings.sort(key=lambda billing: str(billing["created_at"] or ""), reverse=True)
+        return billings
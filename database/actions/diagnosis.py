@@ -1,11 +1,33 @@
-from database.models import Diagnosis, Patient, Hospital, Billing
+from database.models import Diagnosis, Patient, Hospital
 from config import async_session
-from sqlalchemy import select
+from database.projections import project
+from sqlalchemy import select, func
 from sqlalchemy.orm import selectinload
-from database.utils import convert_to_date
+from database.utils import convert_to_date, day_after
+from database.archive import with_archived
+from database.write_queue import write_queue
+from database.actions.billing import add_billing
+from datetime import datetime
+
+DIAGNOSIS_COLUMNS = (
+    Diagnosis.diagnosis_id, Diagnosis.hospital_id, Diagnosis.patient_id,
+    Patient.patient_name, Diagnosis.diagnoser_id, Diagnosis.symptoms,
+    Diagnosis.findings, Diagnosis.suggested_diagnosis,
+    func.date(Diagnosis.date_added).label("date_added"),
+)
+DIAGNOSIS_SUMMARY = ("diagnosis_id", "patient_id", "patient_name", "suggested_diagnosis", "date_added")
+
+def diagnosis_rows_stmt(hospital_id: str, view: str, fields: str):
+    columns = project(DIAGNOSIS_COLUMNS, view, fields, DIAGNOSIS_SUMMARY, required=("diagnosis_id",))
+    return (
+        select(*columns)
+        .select_from(Diagnosis)
+        .outerjoin(Patient, Diagnosis.patient_id == Patient.patient_id)
+        .where(Diagnosis.hospital_id == hospital_id)
+    )
 
 async def add_diagnosis(hospital_id: str, diagnosis_detail: dict):
-    async with async_session() as session:
+    async def diagnose(session):
         new_diagnosis = Diagnosis(
             hospital_id=hospital_id,
             patient_id=diagnosis_detail.get("patient_id"),
@@ -14,37 +36,23 @@ async def add_diagnosis(hospital_id: str, diagnosis_detail: dict):
             findings=diagnosis_detail.get("findings"),
             suggested_diagnosis=diagnosis_detail.get("suggested_diagnosis"),
         )
-
         session.add(new_diagnosis)
-        await session.commit()
-        await session.flush()
+        hospital = await session.get(Hospital, hospital_id)
+        add_billing(
+            session, hospital_id, "Diagnosis", "Diagnosis with doctor", hospital.diagnosis_fee,
+            patient_id=new_diagnosis.patient_id,
+        )
+        return new_diagnosis
 
+    new_diagnosis = await write_queue.submit(diagnose)
+    async with async_session() as session:
         stmt = (
             select(Diagnosis)
             .options(selectinload(Diagnosis.patient))
             .where(Diagnosis.diagnosis_id == new_diagnosis.diagnosis_id)
         )
         result = await session.execute(stmt)
-        diagnosis_with_patient = result.scalars().first()
-        
-        hosp_stmt = select(Hospital).where(
-            Hospital.hospital_id == hospital_id
-        )
-        hosp_result = await session.execute(hosp_stmt)
-        hospital = hosp_result.scalars().first()
-        
-        session.add(
-            Billing(
-                hospital_id = hospital_id,
-                patient_id = diagnosis_detail.get("patient_id", None),
-                source = "Diagnosis",
-                item = "Diagnosis with doctor",
-                total = hospital.diagnosis_fee,
-            )
-        )
-        await session.commit()
-
-        return diagnosis_with_patient
+        return result.scalars().first()
 
 async def fetch_diagnosis(hospital_id: str, sort_term: str, sort_dir: str):
     async with async_session.begin() as session:
@@ -78,6 +86,43 @@ async def fetch_diagnosis(hospital_id: str, sort_term: str, sort_dir: str):
             return None
         return diagnoses
 
+async def fetch_diagnosis_between(hospital_id: str, start: datetime, end: datetime):
+    async with async_session.begin() as session:
+        stmt = (
+            select(Diagnosis)
+            .where(
+                (Diagnosis.hospital_id == hospital_id) &
+                (Diagnosis.date_added >= start) &
+                (Diagnosis.date_added < day_after(end))
+            )
+            .options(selectinload(Diagnosis.patient))
+            .order_by(Diagnosis.date_added.desc())
+        )
+        result = await session.execute(stmt)
+        diagnosis = result.scalars().all()
+        diagnosis = await with_archived(diagnosis, "diagnosis", hospital_id, start, end, ("patient",))
+        if not diagnosis:
+            return None
+        return diagnosis
+
+async def fetch_diagnosis_rows(hospital_id: str, sort_term: str, sort_dir: str, view: str = "summary", fields: str = None):
+    async with async_session() as session:
+        stmt = diagnosis_rows_stmt(hospital_id, view, fields)
+        if sort_term == "name":
+            stmt = stmt.order_by(Patient.patient_name.asc() if sort_dir == "asc" else Patient.patient_name.desc())
+        elif sort_term == "date":
+            stmt = stmt.order_by(Diagnosis.date_added.asc() if sort_dir == "asc" else Diagnosis.date_added.desc())
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+async def search_diagnosis_rows(hospital_id: str, search_term: str, view: str = "summary", fields: str = None):
+    async with async_session() as session:
+        stmt = diagnosis_rows_stmt(hospital_id, view, fields).where(
+            Patient.patient_name.ilike(f"%{search_term}%")
+        )
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
 async def search_diagnosis(hospital_id: str, search_term: str):
     async with async_session.begin() as session:
         stmt = (
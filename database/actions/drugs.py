@@ -1,7 +1,158 @@
-from database.models import Drug, Billing
+from database.models import Drug, DrugAlert, DrugLot, Hospital
 from config import async_session
-from sqlalchemy import select
-from datetime import datetime
+from database.projections import project
+from sqlalchemy import select, func, delete, insert, update, exists, or_
+from datetime import datetime, date, time, timedelta
+from database.ids import new_id
+from database.events import emit
+from database.write_queue import write_queue
+from database.actions.billing import add_billing
+
+DRUG_COLUMNS = (
+    Drug.drug_id, Drug.hospital_id, Drug.drug_name, Drug.drug_category,
+    Drug.drug_desc, Drug.drug_quantity, Drug.drug_price,
+    func.date(Drug.drug_expiry).label("drug_expiry"), Drug.reorder_level,
+    func.date(Drug.date_added).label("date_added"),
+)
+DRUG_SUMMARY = ("drug_id", "drug_name", "drug_category", "drug_quantity", "drug_price", "drug_expiry")
+
+def sort_drugs(stmt, sort_term: str, sort_dir: str):
+    if sort_term == "name":
+        if sort_dir == "asc":
+            stmt = stmt.order_by(Drug.drug_name.asc())
+        elif sort_dir == "desc":
+            stmt = stmt.order_by(Drug.drug_name.desc())
+
+    elif sort_term == "date":
+        if sort_dir == "asc":
+            stmt = stmt.order_by(Drug.date_added.asc())
+        elif sort_dir == "desc":
+            stmt = stmt.order_by(Drug.date_added.desc())
+    return stmt
+
+DEFAULT_REORDER_LEVEL = 10
+EXPIRY_WARNING_DAYS = 30
+ALERT_COLUMNS = (
+    DrugAlert.alert_id, DrugAlert.hospital_id, DrugAlert.drug_id, DrugAlert.alert_type,
+    DrugAlert.drug_name, DrugAlert.drug_quantity, DrugAlert.reorder_level,
+    func.date(DrugAlert.drug_expiry).label("drug_expiry"), DrugAlert.created_at,
+)
+
+def drug_filter_conditions(filter: str):
+    today = datetime.combine(date.today(), time())
+    tomorrow = today + timedelta(days=1)
+    filters = {
+        "total": [],
+        "new": [Drug.date_added >= today - timedelta(days=30)],
+        "expired": [Drug.drug_expiry < tomorrow],
+        "safe": [Drug.drug_expiry >= tomorrow],
+        "available": [Drug.drug_quantity > 0],
+        "depleted": [Drug.drug_quantity <= 0],
+        "sellable": [Drug.drug_quantity > 0, Drug.drug_expiry >= tomorrow],
+    }
+    if filter not in filters:
+        raise ValueError(f"filter must be one of: {', '.join(filters)}")
+    return filters[filter]
+
+class StockError(ValueError):
+    pass
+
+def sellable_lots(drug_id: str, today: datetime):
+    # served by the partial (drug_id, lot_expiry) index on lots still in stock
+    return (
+        select(DrugLot)
+        .where(
+            (DrugLot.drug_id == drug_id) &
+            (DrugLot.lot_quantity > 0) &
+            (DrugLot.lot_expiry >= today)
+        )
+        .order_by(DrugLot.lot_expiry.asc(), DrugLot.lot_id.asc())
+    )
+
+def sellable_quantity(drug_id, today: datetime):
+    # drug_id may be a column, which makes this a correlated subquery
+    return (
+        select(func.coalesce(func.sum(DrugLot.lot_quantity), 0))
+        .where(
+            (DrugLot.drug_id == drug_id) &
+            (DrugLot.lot_quantity > 0) &
+            (DrugLot.lot_expiry >= today)
+        )
+    )
+
+def next_expiry(drug_id, today: datetime):
+    # the lot first-expiry-first-out would sell next
+    return (
+        select(func.min(DrugLot.lot_expiry))
+        .where(
+            (DrugLot.drug_id == drug_id) &
+            (DrugLot.lot_quantity > 0) &
+            (DrugLot.lot_expiry >= today)
+        )
+    )
+
+async def refresh_drug_stock(session, drug: Drug):
+    # drug_quantity is what can still be sold: expired lots do not count, and
+    # drug_expiry follows the next lot to be sold
+    today = datetime.combine(date.today(), time())
+    drug.drug_quantity = await session.scalar(sellable_quantity(drug.drug_id, today))
+    drug.drug_expiry = await session.scalar(next_expiry(drug.drug_id, today)) or drug.drug_expiry
+
+async def expire_drug_stock(session, hospital_id: str):
+    # lots expire without any write touching their drug, so the scheduled
+    # scan takes them out of drug_quantity and moves drug_expiry on to the
+    # next lot; drugs without lots keep theirs
+    today = datetime.combine(date.today(), time())
+    sellable = sellable_quantity(Drug.drug_id, today).scalar_subquery()
+    expiry = func.coalesce(next_expiry(Drug.drug_id, today).scalar_subquery(), Drug.drug_expiry)
+    await session.execute(
+        update(Drug)
+        .where(
+            (Drug.hospital_id == hospital_id) &
+            exists().where(DrugLot.drug_id == Drug.drug_id) &
+            (Drug.drug_quantity.is_distinct_from(sellable) | Drug.drug_expiry.is_distinct_from(expiry))
+        )
+        .values(drug_quantity=sellable, drug_expiry=expiry)
+        .execution_options(synchronize_session=False)
+    )
+
+async def allocate_drug_stock(session, hospital_id: str, drug_id: str, drug_qty: int):
+    # First-expiry-first-out over unexpired lots, inside the caller's
+    # transaction. Lots are streamed in expiry order and reading stops as soon
+    # as the quantity is covered, so a sale only touches the lots it drains.
+    if drug_qty <= 0:
+        raise StockError("Quantity must be positive")
+    result = await session.execute(
+        select(Drug)
+        .where((Drug.hospital_id == hospital_id) & (Drug.drug_id == drug_id))
+        .with_for_update()
+    )
+    drug = result.scalars().first()
+    if not drug:
+        raise StockError("Drug not found")
+    if (drug.drug_quantity or 0) < drug_qty:
+        raise StockError("Insufficient stock")
+
+    today = datetime.combine(date.today(), time())
+    remaining = drug_qty
+    taken = []
+    lots = await session.stream_scalars(sellable_lots(drug_id, today).with_for_update())
+    async for lot in lots:
+        take = min(lot.lot_quantity, remaining)
+        lot.lot_quantity -= take
+        taken.append((lot, take))
+        remaining -= take
+        if not remaining:
+            break
+    await lots.close()
+
+    if remaining:
+        raise StockError("Drug expired" if len(taken) == 0 else "Insufficient unexpired stock")
+
+    await session.flush()
+    await refresh_drug_stock(session, drug)
+    return drug, taken
+
 async def add_drugs(hospital_id: str, drug_detail: dict):
     async with async_session.begin() as session:
         new_drug = Drug(
@@ -11,82 +162,89 @@ async def add_drugs(hospital_id: str, drug_detail: dict):
             drug_desc = drug_detail.get("drug_desc", None),
             drug_quantity = drug_detail.get("drug_quantity", 0),
             drug_price = drug_detail.get("drug_price", 0),
-            drug_expiry = drug_detail.get("drug_expiry", None)
+            drug_expiry = drug_detail.get("drug_expiry", None),
+            reorder_level = drug_detail.get("reorder_level", None) or DEFAULT_REORDER_LEVEL
         )
         try:
             session.add(new_drug)
+            if new_drug.drug_quantity and new_drug.drug_expiry:
+                await session.flush()
+                session.add(DrugLot(
+                    hospital_id = hospital_id,
+                    drug_id = new_drug.drug_id,
+                    lot_number = drug_detail.get("lot_number", None),
+                    lot_quantity = new_drug.drug_quantity,
+                    lot_expiry = new_drug.drug_expiry,
+                ))
+                await session.flush()
+                await refresh_drug_stock(session, new_drug)
             return new_drug
         except Exception as e:
             print("An error occurred: ", e)
 
-async def fetch_drugs(hospital_id: str, sort_term: str, sort_dir: str):
+async def restock_drug(hospital_id: str, drug_id: str, lot_detail: dict):
     async with async_session.begin() as session:
-        stmt = select(Drug).where(Drug.hospital_id == hospital_id)
-        if sort_term == "name":
-            if sort_dir == "asc":
-                stmt = stmt.order_by(Drug.drug_name.asc())
-            elif sort_dir == "desc":
-                stmt = stmt.order_by(Drug.drug_name.desc())
-                
-        elif sort_term == "date":
-            if sort_dir == "asc":
-                stmt = stmt.order_by(Drug.date_added.asc())
-            elif sort_dir == "desc":
-                stmt = stmt.order_by(Drug.date_added.desc())
-        result = await session.execute(stmt)
-        drugs = result.scalars().all()
-        if not drugs:
+        result = await session.execute(
+            select(Drug)
+            .where((Drug.hospital_id == hospital_id) & (Drug.drug_id == drug_id))
+            .with_for_update()
+        )
+        drug = result.scalars().first()
+        if not drug:
             return None
-        return drugs
+        lot = DrugLot(
+            hospital_id = hospital_id,
+            drug_id = drug_id,
+            lot_number = lot_detail.get("lot_number", None),
+            lot_quantity = lot_detail.get("lot_quantity", 0),
+            lot_expiry = lot_detail.get("lot_expiry", None),
+        )
+        session.add(lot)
+        await session.flush()
+        await refresh_drug_stock(session, drug)
+        return drug
 
-async def search_drugs(hospital_id: str, search_term: str):
-    async with async_session.begin() as session:
-        stmt = select(Drug).where(Drug.hospital_id == hospital_id).where(Drug.drug_name.ilike(f"%{search_term}%"))
+async def fetch_sellable_quantity(hospital_id: str, drug_id: str):
+    today = datetime.combine(date.today(), time())
+    async with async_session() as session:
+        return await session.scalar(
+            sellable_quantity(drug_id, today).where(DrugLot.hospital_id == hospital_id)
+        )
+
+def drug_columns(view: str = "detail", fields: str = None):
+    return project(DRUG_COLUMNS, view, fields, DRUG_SUMMARY, required=("drug_id",))
+
+async def fetch_drug_rows(hospital_id: str, sort_term: str, sort_dir: str, view: str = "detail", fields: str = None):
+    async with async_session() as session:
+        stmt = select(*drug_columns(view, fields)).where(Drug.hospital_id == hospital_id)
+        stmt = sort_drugs(stmt, sort_term, sort_dir)
         result = await session.execute(stmt)
-        drugs = result.scalars().all()
-        if not drugs:
-            return None
-        return drugs
+        return [dict(row) for row in result.mappings()]
 
-async def sale_drug(hospital_id: str, drug_id: str, drug_qty: int):
+async def search_drug_rows(hospital_id: str, search_term: str, view: str = "detail", fields: str = None):
     async with async_session() as session:
-        stmt = select(Drug).where(
-            (Drug.hospital_id == hospital_id) &
-            (Drug.drug_id == drug_id)
+        stmt = (
+            select(*drug_columns(view, fields))
+            .where(Drug.hospital_id == hospital_id)
+            .where(Drug.drug_name.ilike(f"%{search_term}%"))
         )
         result = await session.execute(stmt)
-        drug = result.scalars().first()
-
-        if not drug:
-            print("Drug not found")
-            return {"status": "error", "message": "Drug not found"}
-        if drug.drug_quantity < drug_qty:
-            print("Insufficient stock")
-            return {"status": "error", "message": "Insufficient stock"}
-        if drug.drug_expiry < datetime.now():
-            print("Drug expired")
-            return {"status": "error", "message": "Drug expired"}
-
-        try:
-            total_price = drug.drug_price * drug_qty
-            drug.drug_quantity -= drug_qty
-
-            billing = Billing(
-                hospital_id=hospital_id,
-                source="POS",
-                item=drug.drug_name,
-                total=total_price,
-            )
-            session.add(billing)
-            await session.commit()
+        return [dict(row) for row in result.mappings()]
 
-            print("Sale successful")
-            return {"status": "success"}
+async def sale_drug(hospital_id: str, drug_id: str, drug_qty: int):
+    async def sell(session):
+        drug, _ = await allocate_drug_stock(session, hospital_id, drug_id, drug_qty)
+        total_price = drug.drug_price * drug_qty
+        add_billing(session, hospital_id, "POS", drug.drug_name, total_price)
+        return total_price
 
-        except Exception as e:
-            await session.rollback()
-            print("Error during sale:", e)
-            return {"status": "error", "message": str(e)}
+    try:
+        total_price = await write_queue.submit(sell)
+    except StockError as e:
+        return {"status": "error", "message": str(e)}
+    emit(hospital_id, "drug.sold", drug_id=drug_id, drug_qty=drug_qty)
+    emit(hospital_id, "billing.created", source="POS", total=total_price)
+    return {"status": "success"}
 
 async def get_specific_drug(hospital_id: str, drug_id: str):
     async with async_session.begin() as session:
@@ -114,9 +272,8 @@ async def edit_drug(hospital_id: str, drug_id: str, drug_detail: dict):
             drug.drug_name = drug_detail.get("drug_name", None)
             drug.drug_category = drug_detail.get("drug_category", None)
             drug.drug_desc = drug_detail.get("drug_desc", None)
-            drug.drug_quantity = drug_detail.get("drug_quantity", 0)
             drug.drug_price = drug_detail.get("drug_price", 0)
-            drug.drug_expiry = drug_detail.get("drug_expiry", None)
+            drug.reorder_level = drug_detail.get("reorder_level", None) or DEFAULT_REORDER_LEVEL
             return drug
         except Exception as e:
             print("An error occurred: ", e)
@@ -131,4 +288,75 @@ async def delete_drug(hospital_id: str, drug_id: str):
             await session.delete(drug)
         except Exception as e:
             print("An error occurred: ", e)
-            
\ No newline at end of file
+            
+
+async def export_drugs(hospital_id: str, conditions: list):
+    async with async_session() as session:
+        stmt = (
+            select(
+                Drug.drug_name, Drug.drug_category, Drug.drug_quantity,
+                Drug.drug_price, Drug.drug_expiry, Drug.date_added,
+            )
+            .where(Drug.hospital_id == hospital_id, *conditions)
+            .order_by(Drug.date_added.desc())
+        )
+        result = await session.execute(stmt)
+        return result.all()
+
+async def scan_drug_alerts(hospital_id: str):
+    today = datetime.combine(date.today(), time())
+    expiry_cutoff = today + timedelta(days=EXPIRY_WARNING_DAYS + 1)
+    reorder_level = func.coalesce(Drug.reorder_level, DEFAULT_REORDER_LEVEL)
+    async with async_session.begin() as session:
+        await expire_drug_stock(session, hospital_id)
+        # both branches are range scans on (hospital_id, drug_expiry) and
+        # (hospital_id, drug_quantity); the OR is resolved per drug below
+        stmt = select(
+            Drug.drug_id, Drug.drug_name, Drug.drug_quantity,
+            reorder_level.label("reorder_level"), Drug.drug_expiry,
+        ).where(
+            (Drug.hospital_id == hospital_id) &
+            or_(Drug.drug_expiry < expiry_cutoff, Drug.drug_quantity <= reorder_level)
+        )
+        result = await session.execute(stmt)
+        alerts = []
+        for drug in result.mappings():
+            expiry = drug["drug_expiry"]
+            quantity = drug["drug_quantity"] or 0
+            alert_types = []
+            if expiry is not None and expiry < today + timedelta(days=1):
+                alert_types.append("expired")
+            elif expiry is not None and expiry < expiry_cutoff:
+                alert_types.append("expiring")
+            if quantity <= 0:
+                alert_types.append("depleted")
+            elif quantity <= drug["reorder_level"]:
+                alert_types.append("low_stock")
+            for alert_type in alert_types:
+                alerts.append(dict(drug, alert_id=new_id(), hospital_id=hospital_id, alert_type=alert_type))
+
+        # replace the tenant's alert set in the same transaction, so readers
+        # see either the previous scan or this one
+        await session.execute(delete(DrugAlert).where(DrugAlert.hospital_id == hospital_id))
+        if alerts:
+            await session.execute(insert(DrugAlert), alerts)
+        return len(alerts)
+
+async def scan_all_drug_alerts():
+    async with async_session() as session:
+        result = await session.execute(select(Hospital.hospital_id))
+        hospital_ids = result.scalars().all()
+    for hospital_id in hospital_ids:
+        try:
+            await scan_drug_alerts(hospital_id)
+        except Exception as e:
+            print("Drug alert scan failed: ", hospital_id, e)
+
+async def fetch_drug_alert_rows(hospital_id: str, alert_type: str = None):
+    async with async_session() as session:
+        stmt = select(*ALERT_COLUMNS).where(DrugAlert.hospital_id == hospital_id)
+        if alert_type:
+            stmt = stmt.where(DrugAlert.alert_type == alert_type)
+        stmt = stmt.order_by(DrugAlert.drug_expiry.asc(), DrugAlert.drug_quantity.asc())
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
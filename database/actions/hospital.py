@@ -3,7 +3,17 @@ from config import async_session
 from sqlalchemy import select
 import hashlib
 from datetime import datetime
-from database.utils import hash_pwd, is_verified_pwd
+from database.utils import hash_pwd, is_verified_pwd, verify_signin_pwd
+from database.cache import TTLCache
+
+# expiry dates only change through renew_hospital_plan, which refreshes the
+# entry itself; the TTL bounds how long another worker can lag behind it
+EXPIRY_TTL = 60
+expiry_cache = TTLCache(ttl=EXPIRY_TTL, stale_ttl=EXPIRY_TTL * 10)
+# lookups by an unverified hospital_id may be for ids that do not exist; they
+# get their own smaller cache, misses included, so a stream of made-up ids is
+# answered from memory and cannot push real tenants out of expiry_cache
+unverified_expiry_cache = TTLCache(ttl=EXPIRY_TTL, stale_ttl=EXPIRY_TTL * 10, max_entries=1_000)
 
 async def add_hospital(hospital_detail: dict):
     async with async_session.begin() as session:
@@ -73,15 +83,17 @@ async def renew_hospital_plan(hospital_id: str, activation_key: str):
 
             hospital.expiry_date = new_expiry
             await session.commit()
+            expiry_cache.set(hospital_id, new_expiry)
+            unverified_expiry_cache.invalidate(hospital_id)
 
             return {"message": "renewed"}
 
         except Exception as e:
             return {"message": f"Error validating activation key: {e}"}
 
-async def fetch_hospitals(sort_term: str, sort_dir: str):
+async def fetch_hospitals(hospital_id: str, sort_term: str, sort_dir: str):
     async with async_session() as session:
-        stmt = select(Hospital)
+        stmt = select(Hospital).where(Hospital.hospital_id == hospital_id)
         if sort_term == "name":
             if sort_dir == "asc":
                 stmt = stmt.order_by(Hospital.hospital_name.asc())
@@ -99,9 +111,9 @@ async def fetch_hospitals(sort_term: str, sort_dir: str):
             return None
         return hospitals
 
-async def search_hospitals(search_by: str, search_term: str):
+async def search_hospitals(hospital_id: str, search_by: str, search_term: str):
     async with async_session() as session:
-        stmt = select(Hospital)
+        stmt = select(Hospital).where(Hospital.hospital_id == hospital_id)
         if search_by == "name":
             stmt = stmt.where(Hospital.hospital_name.ilike(f"%{search_term}%"))
         elif search_by == "email":
@@ -114,6 +126,17 @@ async def search_hospitals(search_by: str, search_term: str):
             return None
         return hospitals
 
+async def load_hospital_expiry(hospital_id: str):
+    async with async_session() as session:
+        result = await session.execute(
+            select(Hospital.expiry_date).where(Hospital.hospital_id == hospital_id)
+        )
+        return result.scalars().first()
+
+async def fetch_hospital_expiry(hospital_id: str, verified: bool = True):
+    cache = expiry_cache if verified else unverified_expiry_cache
+    return await cache.get(hospital_id, lambda: load_hospital_expiry(hospital_id))
+
 async def get_specific_hospital(hospital_id: str):
     async with async_session() as session:
         stmt = select(Hospital).where(
@@ -132,9 +155,8 @@ async def signin(hospital_detail):
         )
         result = await session.execute(stmt)
         hospital = result.scalars().first()
-        if not hospital:
-            return None
-        if not is_verified_pwd(hospital_detail.get("hospital_password"), hospital.hospital_password):
+        hashed = hospital.hospital_password if hospital else None
+        if not await verify_signin_pwd(hospital_detail.get("hospital_password"), hashed):
             return None
         return hospital
 
@@ -177,5 +199,7 @@ async def delete_hospital(hospital_id: str):
         hospital = await session.merge(hospital)
         try:
             await session.delete(hospital)
+            expiry_cache.invalidate(hospital_id)
+            unverified_expiry_cache.invalidate(hospital_id)
         except Exception as e:
             print("An error occurred: ", e)
@@ -0,0 +1,159 @@
+from database.models import LaboratoryRequest, LaboratoryTest, LabQueueStats, Patient, Worker, OPEN_REQUEST_FILTER
+from config import async_session, engine
+from sqlalchemy import select, update, text, func, case, literal
+from sqlalchemy.dialects import postgresql, sqlite
+from datetime import datetime
+from database.events import emit
+
+OPEN_STATUSES = ("pending", "in_progress")
+STATUS_COUNTERS = {
+    "pending": "pending_count",
+    "in_progress": "in_progress_count",
+    "resulted": "resulted_count",
+}
+QUEUE_COLUMNS = (
+    LaboratoryRequest.request_id, LaboratoryRequest.request_status,
+    LaboratoryRequest.requested_at, LaboratoryRequest.started_at,
+    LaboratoryRequest.patient_id, Patient.patient_name,
+    LaboratoryRequest.test_id, LaboratoryTest.test_name,
+    LaboratoryRequest.doctor_id, Worker.worker_name.label("doctor_name"),
+)
+
+class QueueError(ValueError):
+    pass
+
+async def bump_queue_stats(session, hospital_id: str, turnaround: float = 0, **deltas):
+    # deltas are keyed by status, e.g. pending=-1, resulted=1. One upsert,
+    # so two first requests for a hospital cannot both try to insert its row.
+    counts = {STATUS_COUNTERS[status]: delta for status, delta in deltas.items() if delta}
+    if turnaround:
+        counts["turnaround_seconds"] = turnaround
+    if not counts:
+        return
+    now = datetime.now()
+    insert = postgresql.insert if engine.dialect.name == "postgresql" else sqlite.insert
+    await session.execute(
+        insert(LabQueueStats.__table__)
+        .values(hospital_id=hospital_id, updated_at=now, **counts)
+        .on_conflict_do_update(
+            index_elements=["hospital_id"],
+            set_={
+                **{name: getattr(LabQueueStats, name) + delta for name, delta in counts.items()},
+                "updated_at": now,
+            },
+        )
+    )
+
+def turnaround_expression(dialect: str):
+    if dialect == "postgresql":
+        return func.extract("epoch", LaboratoryRequest.resulted_at - LaboratoryRequest.requested_at)
+    return (func.julianday(LaboratoryRequest.resulted_at) - func.julianday(LaboratoryRequest.requested_at)) * 86400
+
+async def recount_queue_stats(conn, hospital_ids: list):
+    # Rebuilds the counters from the live requests. Replication writes
+    # requests without going through bump_queue_stats, so both sides recount
+    # the hospitals it touched instead of replicating the counters.
+    if not hospital_ids:
+        return
+    dialect = conn.dialect.name
+    insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    resulted = LaboratoryRequest.request_status == "resulted"
+    def count(status):
+        return func.coalesce(func.sum(case((LaboratoryRequest.request_status == status, 1), else_=0)), 0)
+    await conn.execute(
+        update(LabQueueStats)
+        .where(LabQueueStats.hospital_id.in_(hospital_ids))
+        .values(pending_count=0, in_progress_count=0, resulted_count=0, turnaround_seconds=0, updated_at=datetime.now())
+    )
+    stmt = insert(LabQueueStats).from_select(
+        ["hospital_id", "pending_count", "in_progress_count", "resulted_count", "turnaround_seconds", "updated_at"],
+        select(
+            LaboratoryRequest.hospital_id, count("pending"), count("in_progress"), count("resulted"),
+            func.coalesce(func.sum(case((resulted, turnaround_expression(dialect)), else_=0)), 0),
+            literal(datetime.now()),
+        )
+        .where(LaboratoryRequest.hospital_id.in_(hospital_ids))
+        .group_by(LaboratoryRequest.hospital_id)
+    )
+    await conn.execute(stmt.on_conflict_do_update(
+        index_elements=["hospital_id"],
+        set_={name: stmt.excluded[name] for name in (
+            "pending_count", "in_progress_count", "resulted_count", "turnaround_seconds", "updated_at",
+        )},
+    ))
+
+async def locked_request(session, hospital_id: str, request_id: str):
+    result = await session.execute(
+        select(LaboratoryRequest)
+        .where(
+            (LaboratoryRequest.hospital_id == hospital_id) &
+            (LaboratoryRequest.request_id == request_id)
+        )
+        .with_for_update()
+    )
+    request = result.scalars().first()
+    if not request:
+        raise QueueError("Lab request not found")
+    return request
+
+async def start_lab_request(hospital_id: str, request_id: str):
+    async with async_session.begin() as session:
+        request = await locked_request(session, hospital_id, request_id)
+        if request.request_status != "pending":
+            raise QueueError(f"Lab request is {request.request_status}")
+        request.request_status = "in_progress"
+        request.started_at = datetime.now()
+        await bump_queue_stats(session, hospital_id, pending=-1, in_progress=1)
+    emit(hospital_id, "lab_request.started", request_id=request_id)
+    return request
+
+async def complete_lab_request(session, hospital_id: str, request_id: str):
+    # called inside the transaction that stores the result
+    request = await locked_request(session, hospital_id, request_id)
+    if request.request_status not in OPEN_STATUSES:
+        raise QueueError(f"Lab request is {request.request_status}")
+    previous = request.request_status
+    request.request_status = "resulted"
+    request.resulted_at = datetime.now()
+    turnaround = (request.resulted_at - request.requested_at).total_seconds() if request.requested_at else 0
+    await bump_queue_stats(session, hospital_id, turnaround, **{previous: -1, "resulted": 1})
+    return request
+
+async def fetch_lab_queue(hospital_id: str, status: str = None, limit: int = 100, offset: int = 0):
+    if status and status not in OPEN_STATUSES:
+        raise QueueError(f"status must be one of: {', '.join(OPEN_STATUSES)}")
+    conditions = [LaboratoryRequest.hospital_id == hospital_id, text(OPEN_REQUEST_FILTER)]
+    if status:
+        conditions.append(LaboratoryRequest.request_status == status)
+    stmt = (
+        select(*QUEUE_COLUMNS)
+        .outerjoin(Patient, Patient.patient_id == LaboratoryRequest.patient_id)
+        .outerjoin(LaboratoryTest, LaboratoryTest.test_id == LaboratoryRequest.test_id)
+        .outerjoin(Worker, Worker.worker_id == LaboratoryRequest.doctor_id)
+        .where(*conditions)
+        .order_by(LaboratoryRequest.requested_at.asc())
+        .limit(limit)
+        .offset(offset)
+    )
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+async def fetch_lab_queue_stats(hospital_id: str):
+    async with async_session() as session:
+        stats = await session.get(LabQueueStats, hospital_id)
+    if not stats:
+        return {
+            "pending": 0, "in_progress": 0, "resulted": 0,
+            "queue_depth": 0, "avg_turnaround_minutes": None,
+        }
+    return {
+        "pending": stats.pending_count,
+        "in_progress": stats.in_progress_count,
+        "resulted": stats.resulted_count,
+        "queue_depth": stats.pending_count + stats.in_progress_count,
+        "avg_turnaround_minutes": (
+            round(stats.turnaround_seconds / stats.resulted_count / 60, 1)
+            if stats.resulted_count else None
+        ),
+    }
@@ -1,20 +1,42 @@
-from database.models import LaboratoryRequest, Patient, Billing, LaboratoryTest
+from database.models import LaboratoryRequest, Patient, LaboratoryTest
 from config import async_session
 from sqlalchemy import select
 from sqlalchemy.orm import selectinload
+from datetime import datetime
+from database.utils import day_after
+from database.actions.lab_queue import bump_queue_stats, QueueError, STATUS_COUNTERS
+from database.events import emit
+from database.archive import with_archived
+from database.write_queue import write_queue
+from database.actions.billing import add_billing
 
 async def add_lab_request(hospital_id: str, request_detail: dict):
-    async with async_session() as session:
+    async def request(session):
         new_request = LaboratoryRequest(
             hospital_id = hospital_id,
             patient_id = request_detail.get("patient_id", None),
             doctor_id = request_detail.get("doctor_id", None),
             test_id = request_detail.get("test_id", None),
         )
-        try:
-            session.add(new_request)
-            await session.commit()
-            await session.flush()
+        session.add(new_request)
+        await bump_queue_stats(session, hospital_id, pending=1)
+        if new_request.test_id:
+            test = await session.get(LaboratoryTest, new_request.test_id)
+            if not test or test.hospital_id != hospital_id:
+                raise QueueError("Lab test not found")
+            add_billing(
+                session, hospital_id, "Lab Requests", test.test_name, test.test_price,
+                patient_id=new_request.patient_id,
+            )
+        return new_request
+
+    try:
+        new_request = await write_queue.submit(request)
+        emit(
+            hospital_id, "lab_request.created", request_id=new_request.request_id,
+            patient_id=new_request.patient_id, test_id=new_request.test_id,
+        )
+        async with async_session() as session:
             stmt = (
                 select(LaboratoryRequest)
                 .where(LaboratoryRequest.request_id == new_request.request_id)
@@ -22,26 +44,11 @@ async def add_lab_request(hospital_id: str, request_detail: dict):
                 .options(selectinload(LaboratoryRequest.test))
             )
             result = await session.execute(stmt)
-            mega_new_request = result.scalars().first()
-            test_stmt = select(LaboratoryTest).where(
-                LaboratoryTest.test_id == request_detail.get("test_id", 0)
-            )
-            test_result = await session.execute(test_stmt)
-            test = test_result.scalars().first()
-            
-            session.add(
-                Billing(
-                    hospital_id = hospital_id,
-                    patient_id = request_detail.get("patient_id", None),
-                    source = "Lab Requests",
-                    item = test.test_name,
-                    total = test.test_price
-                )
-            )
-            
-            return mega_new_request
-        except Exception as e:
-            print("An error occurred: ", e)
+            return result.scalars().first()
+    except QueueError:
+        raise
+    except Exception as e:
+        print("An error occurred: ", e)
 
 async def fetch_lab_requests(hospital_id: str, sort_term: str, sort_dir: str):
     async with async_session.begin() as session:
@@ -76,6 +83,27 @@ async def fetch_lab_requests(hospital_id: str, sort_term: str, sort_dir: str):
             return None
         return lab_requests
 
+async def fetch_lab_requests_between(hospital_id: str, start: datetime, end: datetime):
+    async with async_session.begin() as session:
+        stmt = (
+            select(LaboratoryRequest)
+            .where(
+                (LaboratoryRequest.hospital_id == hospital_id) &
+                (LaboratoryRequest.date_added >= start) &
+                (LaboratoryRequest.date_added < day_after(end))
+            )
+            .options(selectinload(LaboratoryRequest.patient))
+            .options(selectinload(LaboratoryRequest.test))
+            .options(selectinload(LaboratoryRequest.doctor))
+            .order_by(LaboratoryRequest.date_added.desc())
+        )
+        result = await session.execute(stmt)
+        lab_requests = result.scalars().all()
+        lab_requests = await with_archived(lab_requests, "lab_requests", hospital_id, start, end, ("patient", "test", "doctor"))
+        if not lab_requests:
+            return None
+        return lab_requests
+
 async def search_lab_request(hospital_id: str, search_term: str):
     async with async_session.begin() as session:
         stmt = (
@@ -113,8 +141,14 @@ async def delete_lab_request(hospital_id: str, request_id: str):
             return None
         request = await session.merge(request)
         try:
+            turnaround = 0
+            if request.request_status == "resulted" and request.resulted_at and request.requested_at:
+                turnaround = (request.resulted_at - request.requested_at).total_seconds()
+            if request.request_status in STATUS_COUNTERS:
+                await bump_queue_stats(session, hospital_id, -turnaround, **{request.request_status: -1})
             await session.delete(request)
             await session.commit()
+            emit(hospital_id, "lab_request.deleted", request_id=request_id)
         except Exception as e:
             print("An error occurred: ", e)
             
\ No newline at end of file
@@ -1,8 +1,29 @@
 from database.models import LaboratoryResult, Patient
 from config import async_session
-from sqlalchemy import select
-from database.utils import convert_to_date
+from database.projections import project
+from sqlalchemy import select, func
+from database.utils import convert_to_date, day_after
+from datetime import datetime
 from sqlalchemy.orm import selectinload
+from database.actions.lab_queue import complete_lab_request, QueueError
+from database.events import emit
+from database.archive import with_archived
+
+LAB_RESULT_COLUMNS = (
+    LaboratoryResult.result_id, LaboratoryResult.hospital_id, LaboratoryResult.patient_id,
+    Patient.patient_name, LaboratoryResult.tech_id, LaboratoryResult.observations,
+    LaboratoryResult.conclusion, func.date(LaboratoryResult.date_added).label("date_added"),
+)
+LAB_RESULT_SUMMARY = ("result_id", "patient_id", "patient_name", "conclusion", "date_added")
+
+def lab_result_rows_stmt(hospital_id: str, view: str, fields: str):
+    columns = project(LAB_RESULT_COLUMNS, view, fields, LAB_RESULT_SUMMARY, required=("result_id",))
+    return (
+        select(*columns)
+        .select_from(LaboratoryResult)
+        .outerjoin(Patient, LaboratoryResult.patient_id == Patient.patient_id)
+        .where(LaboratoryResult.hospital_id == hospital_id)
+    )
 
 async def add_lab_result(hospital_id: str, result_detail: dict):
     async with async_session() as session:
@@ -12,10 +33,18 @@ async def add_lab_result(hospital_id: str, result_detail: dict):
             tech_id = result_detail.get("tech_id", None),
             observations = result_detail.get("observations", None),
             conclusion = result_detail.get("conclusion", None),
+            request_id = result_detail.get("request_id", None),
         )
         try:
             session.add(new_result)
+            if new_result.request_id:
+                request = await complete_lab_request(session, hospital_id, new_result.request_id)
+                new_result.patient_id = new_result.patient_id or request.patient_id
             await session.commit()
+            emit(
+                hospital_id, "lab_result.created", result_id=new_result.result_id,
+                request_id=new_result.request_id, patient_id=new_result.patient_id,
+            )
             await session.flush()
             stmt  = (
                 select(LaboratoryResult).where(LaboratoryResult.result_id == new_result.result_id)
@@ -24,6 +53,9 @@ async def add_lab_result(hospital_id: str, result_detail: dict):
             result = await session.execute(stmt)
             mega_new_result = result.scalars().first()
             return mega_new_result
+        except QueueError:
+            await session.rollback()
+            raise
         except Exception as e:
             print("An error occurred: ", e)
 
@@ -58,6 +90,44 @@ async def fetch_lab_results(hospital_id: str, sort_term: str, sort_dir: str):
             return None
         return lab_results
 
+async def fetch_lab_results_between(hospital_id: str, start: datetime, end: datetime):
+    async with async_session.begin() as session:
+        stmt = (
+            select(LaboratoryResult)
+            .where(
+                (LaboratoryResult.hospital_id == hospital_id) &
+                (LaboratoryResult.date_added >= start) &
+                (LaboratoryResult.date_added < day_after(end))
+            )
+            .options(selectinload(LaboratoryResult.patient))
+            .options(selectinload(LaboratoryResult.tech))
+            .order_by(LaboratoryResult.date_added.desc())
+        )
+        result = await session.execute(stmt)
+        lab_results = result.scalars().all()
+        lab_results = await with_archived(lab_results, "lab_results", hospital_id, start, end, ("patient", "tech"))
+        if not lab_results:
+            return None
+        return lab_results
+
+async def fetch_lab_result_rows(hospital_id: str, sort_term: str, sort_dir: str, view: str = "summary", fields: str = None):
+    async with async_session() as session:
+        stmt = lab_result_rows_stmt(hospital_id, view, fields)
+        if sort_term == "name":
+            stmt = stmt.order_by(Patient.patient_name.asc() if sort_dir == "asc" else Patient.patient_name.desc())
+        elif sort_term == "date":
+            stmt = stmt.order_by(LaboratoryResult.date_added.asc() if sort_dir == "asc" else LaboratoryResult.date_added.desc())
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
+async def search_lab_result_rows(hospital_id: str, search_term: str, view: str = "summary", fields: str = None):
+    async with async_session() as session:
+        stmt = lab_result_rows_stmt(hospital_id, view, fields).where(
+            Patient.patient_name.ilike(f"%{search_term}%")
+        )
+        result = await session.execute(stmt)
+        return [dict(row) for row in result.mappings()]
+
 async def search_lab_results(hospital_id: str, search_term: str):
     async with async_session.begin() as session:
         stmt = (
@@ -100,9 +170,11 @@ async def edit_lab_result(hospital_id: str, result_id: str, result_detail: dict)
         try:
             result.observations = result_detail.get("observations", None)
             result.conclusion = result_detail.get("conclusion", None)
-            return result
         except Exception as e:
             print("An error occurred: ", e)
+            return None
+    emit(hospital_id, "lab_result.updated", result_id=result_id)
+    return result
         
 async def delete_lab_result(hospital_id: str, result_id: str):
     async with async_session() as session:
@@ -114,6 +186,7 @@ async def delete_lab_result(hospital_id: str, result_id: str):
         try:
             await session.delete(result)
             await session.commit()
+            emit(hospital_id, "lab_result.deleted", result_id=result_id)
             return {"status": "success"}
         except Exception as e:
             await session.rollback()
@@ -1,67 +1,120 @@
 from database.models import Patient
 from config import async_session
-from sqlalchemy import select
+from database.projections import project
+from database.write_queue import write_queue
+from sqlalchemy import select, func
+from database.utils import normalize_gender, years_before
+from datetime import datetime, date, time, timedelta
+
+PATIENT_COLUMNS = (
+    Patient.patient_id, Patient.hospital_id, Patient.patient_name,
+    Patient.patient_gender, Patient.patient_dob, Patient.patient_email,
+    Patient.patient_phone, Patient.patient_id_number, Patient.patient_address,
+    Patient.patient_weight, Patient.patient_avg_pulse, Patient.patient_bp,
+    Patient.patient_chronic_condition, Patient.patient_allergy,
+    Patient.patient_blood_type, func.date(Patient.date_added).label("date_added"),
+)
+PATIENT_SUMMARY = ("patient_id", "patient_name", "patient_phone", "patient_gender", "date_added")
+
+def sort_patients(stmt, sort_term: str, sort_dir: str):
+    if sort_term == "name":
+        if sort_dir == "asc":
+            stmt = stmt.order_by(Patient.patient_name.asc())
+        elif sort_dir == "desc":
+            stmt = stmt.order_by(Patient.patient_name.desc())
+
+    elif sort_term == "date":
+        if sort_dir == "asc":
+            stmt = stmt.order_by(Patient.date_added.asc())
+        elif sort_dir == "desc":
+            stmt = stmt.order_by(Patient.date_added.desc())
+    return stmt
+
+def filter_patients(stmt, search_by: str, search_term: str):
+    if search_by == "name":
+        stmt = stmt.where(Patient.patient_name.ilike(f"%{search_term}%"))
+    elif search_by == "email":
+        stmt = stmt.where(Patient.patient_email.ilike(f"%{search_term}%"))
+    elif search_by == "phone":
+        stmt = stmt.where(Patient.patient_phone.ilike(f"%{search_term}%"))
+    if search_by == "id_number":
+        stmt = stmt.where(Patient.patient_id_number.ilike(f"%{search_term}%"))
+    return stmt
+
+# named cohorts shared by the exports and the dashboard counts
+PATIENT_COHORTS = {
+    "all": {},
+    "new": {"new_within_days": 30},
+    "adults": {"age_min": 18},
+    "children": {"age_max": 17},
+    "male": {"gender": "male"},
+    "female": {"gender": "female"},
+}
+
+def cohort_conditions(
+    age_min: int = None, age_max: int = None, gender: str = None,
+    new_within_days: int = None, blood_type: str = None, chronic_condition: str = None,
+):
+    # ages become date of birth bounds so (hospital_id, patient_dob) stays usable
+    today = date.today()
+    conditions = []
+    if age_min is not None:
+        conditions.append(Patient.patient_dob <= years_before(today, age_min))
+    if age_max is not None:
+        conditions.append(Patient.patient_dob > years_before(today, age_max + 1))
+    if gender:
+        conditions.append(Patient.patient_gender_key == normalize_gender(gender))
+    if new_within_days is not None:
+        since = datetime.combine(today - timedelta(days=new_within_days), time())
+        conditions.append(Patient.date_added >= since)
+    if blood_type:
+        conditions.append(Patient.patient_blood_type == blood_type.strip().upper())
+    if chronic_condition:
+        conditions.append(Patient.patient_chronic_condition.ilike(f"%{chronic_condition.strip()}%"))
+    return conditions
+
+def named_cohort(name: str):
+    if name not in PATIENT_COHORTS:
+        raise ValueError(f"cohort must be one of: {', '.join(PATIENT_COHORTS)}")
+    return cohort_conditions(**PATIENT_COHORTS[name])
+
+def new_patient(hospital_id: str, patient_detail: dict):
+    return Patient(
+        hospital_id = hospital_id,
+        patient_name = patient_detail.get("patient_name", None),
+        patient_email = patient_detail.get("patient_email", None),
+        patient_phone = patient_detail.get("patient_phone", None),
+        patient_id_number = patient_detail.get("patient_id_number", None),
+        patient_gender = patient_detail.get("patient_gender", None),
+        patient_address = patient_detail.get("patient_address", None),
+        patient_dob = patient_detail.get("patient_dob", None),
+        patient_weight = patient_detail.get("patient_weight", 0),
+        patient_chronic_condition = patient_detail.get("chronic_condition", None),
+        patient_allergy  = patient_detail.get("patient_allergy", None),
+        patient_avg_pulse = patient_detail.get("patient_avg_pulse", 0),
+        patient_bp = patient_detail.get("patient_bp", 0),
+        patient_blood_type = patient_detail.get("patient_blood_type", None)
+    )
 
 async def add_patients(hospital_id: str, patient_detail: dict):
-    async with async_session.begin() as session:
-        new_patient = Patient(
-            hospital_id = hospital_id,
-            patient_name = patient_detail.get("patient_name", None),
-            patient_email = patient_detail.get("patient_email", None),
-            patient_phone = patient_detail.get("patient_phone", None),
-            patient_id_number = patient_detail.get("patient_id_number", None),
-            patient_gender = patient_detail.get("patient_gender", None),
-            patient_address = patient_detail.get("patient_address", None),
-            patient_dob = patient_detail.get("patient_dob", None),
-            patient_weight = patient_detail.get("patient_weight", 0),
-            patient_chronic_condition = patient_detail.get("chronic_condition", None),
-            patient_allergy  = patient_detail.get("patient_allergy", None),
-            patient_avg_pulse = patient_detail.get("patient_avg_pulse", 0),
-            patient_bp = patient_detail.get("patient_bp", 0),
-            patient_blood_type = patient_detail.get("patient_blood_type", None)
-        )
-        try:
-            session.add(new_patient)
-            return new_patient
-        except Exception as e:
-            print("An error occurred: ", e)
+    return await write_queue.add(lambda: new_patient(hospital_id, patient_detail))
 
-async def fetch_patients(hospital_id: str, sort_term: str, sort_dir: str):
-    async with async_session.begin() as session:
-        stmt = select(Patient).where(Patient.hospital_id == hospital_id)
-        if sort_term == "name":
-            if sort_dir == "asc":
-                stmt = stmt.order_by(Patient.patient_name.asc())
-            elif sort_dir == "desc":
-                stmt = stmt.order_by(Patient.patient_name.desc())
-                
-        elif sort_term == "date":
-            if sort_dir == "asc":
-                stmt = stmt.order_by(Patient.date_added.asc())
-            elif sort_dir == "desc":
-                stmt = stmt.order_by(Patient.date_added.desc())
+def patient_columns(view: str = "detail", fields: str = None):
+    return project(PATIENT_COLUMNS, view, fields, PATIENT_SUMMARY, required=("patient_id",))
+
+async def fetch_patient_rows(hospital_id: str, sort_term: str, sort_dir: str, view: str = "detail", fields: str = None):
+    async with async_session() as session:
+        stmt = select(*patient_columns(view, fields)).where(Patient.hospital_id == hospital_id)
+        stmt = sort_patients(stmt, sort_term, sort_dir)
         result = await session.execute(stmt)
-        patients = result.scalars().all()
-        if not patients:
-            return None
-        return patients
+        return [dict(row) for row in result.mappings()]
 
-async def search_patients(hospital_id: str, search_by: str, search_term: str):
-    async with async_session.begin() as session:
-        stmt = select(Patient).where(Patient.hospital_id == hospital_id)
-        if search_by == "name":
-            stmt = stmt.where(Patient.patient_name.ilike(f"%{search_term}%"))
-        elif search_by == "email":
-            stmt = stmt.where(Patient.patient_email.ilike(f"%{search_term}%"))
-        elif search_by == "phone":
-            stmt = stmt.where(Patient.patient_phone.ilike(f"%{search_term}%"))
-        if search_by == "id_number":
-            stmt = stmt.where(Patient.patient_id_number.ilike(f"%{search_term}%"))
+async def search_patient_rows(hospital_id: str, search_by: str, search_term: str, view: str = "detail", fields: str = None):
+    async with async_session() as session:
+        stmt = select(*patient_columns(view, fields)).where(Patient.hospital_id == hospital_id)
+        stmt = filter_patients(stmt, search_by, search_term)
         result = await session.execute(stmt)
-        patients = result.scalars().all()
-        if not patients:
-            return None
-        return patients
+        return [dict(row) for row in result.mappings()]
 
 async def get_specific_patient(hospital_id: str, patient_id: str):
     async with async_session.begin() as session:
@@ -119,4 +172,51 @@ async def delete_patient(hospital_id: str, patient_id: str):
             await session.delete(patient)
         except Exception as e:
             print("An error occurred: ", e)
-            
\ No newline at end of file
+            
+
+async def fetch_patient_cohort(
+    hospital_id: str, conditions: list, sort_term: str = "date", sort_dir: str = "desc",
+    page: int = 1, page_size: int = 50, view: str = "detail", fields: str = None,
+):
+    async with async_session() as session:
+        total = await session.scalar(
+            select(func.count()).select_from(Patient)
+            .where(Patient.hospital_id == hospital_id, *conditions)
+        )
+        stmt = select(*patient_columns(view, fields)).where(Patient.hospital_id == hospital_id, *conditions)
+        stmt = sort_patients(stmt, sort_term, sort_dir).order_by(Patient.patient_id)
+        stmt = stmt.limit(page_size).offset((page - 1) * page_size)
+        result = await session.execute(stmt)
+        return {
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "results": [dict(row) for row in result.mappings()],
+        }
+
+async def export_patient_cohort(hospital_id: str, conditions: list):
+    async with async_session() as session:
+        stmt = (
+            select(
+                Patient.patient_name, Patient.patient_email, Patient.patient_phone,
+                Patient.patient_id_number, Patient.patient_gender,
+                Patient.patient_dob, Patient.date_added,
+            )
+            .where(Patient.hospital_id == hospital_id, *conditions)
+            .order_by(Patient.date_added.desc())
+        )
+        result = await session.execute(stmt)
+        return result.all()
+
+async def count_patient_cohorts(hospital_id: str, cohorts: dict = None):
+    cohorts = cohorts or PATIENT_COHORTS
+    # one pass over the tenant's patients, one filtered count per cohort
+    counts = [
+        func.count().filter(*conditions).label(name) if conditions else func.count().label(name)
+        for name, conditions in (
+            (name, cohort_conditions(**filters)) for name, filters in cohorts.items()
+        )
+    ]
+    async with async_session() as session:
+        result = await session.execute(select(*counts).where(Patient.hospital_id == hospital_id))
+        return dict(result.mappings().one())
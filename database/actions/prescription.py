@@ -1,58 +1,50 @@
 from database.models import Prescription, PrescriptionItem, Patient, Drug, Worker
 from config import async_session
 from sqlalchemy.orm import selectinload, joinedload
-from database.models import Drug, Billing
+from database.models import Drug
 from sqlalchemy import select
 from datetime import datetime
+from database.actions.drugs import allocate_drug_stock
+from database.events import emit
+from database.write_queue import write_queue
+from database.actions.billing import add_billing
 
 
 async def add_prescription(hospital_id: str, prescription_detail: dict):
-    async with async_session() as session:
-        try:
-            async with session.begin():
-                new_presc_obj = Prescription(
-                    hospital_id=hospital_id,
-                    patient_id=prescription_detail.get("patient_id"),
-                    prescriber_id=prescription_detail.get("prescriber_id"),
-                )
-                session.add(new_presc_obj)
-                await session.flush()
-                
-                stmt = select(Drug).where(
-                    Drug.drug_id == prescription_detail.get("drug_id")
-                )
-                res = await session.execute(stmt)
-                drug = res.scalars().first()
-                if not drug:
-                    return None
-                
-                if drug.drug_quantity < prescription_detail.get("drug_qty", 0):
-                    return None
-                if drug.drug_expiry < datetime.today():
-                    return None
-                new_presc_item = PrescriptionItem(
-                    prescription_id=new_presc_obj.prescription_id,
-                    drug_id=prescription_detail.get("drug_id"),
-                    drug_qty=prescription_detail.get("drug_qty", 0),
-                    notes=prescription_detail.get("notes"),
-                )
-                try:
-                    drug.drug_quantity -= prescription_detail.get("drug_qty", 0)
-                    drug_qty = prescription_detail.get("drug_qty", 0)
-                    total_price = drug.drug_price * drug_qty
-                    
-                    billing = Billing(
-                        hospital_id=hospital_id,
-                        patient_id = prescription_detail.get("patient_id", None),
-                        source="Prescriptions",
-                        item=drug.drug_name,
-                        total=total_price,
-                    )
-                    session.add(billing)
-                except Exception as e:
-                    print("An error occurred during updating drug")
-                session.add(new_presc_item)
+    drug_qty = prescription_detail.get("drug_qty", 0)
+
+    async def prescribe(session):
+        new_presc_obj = Prescription(
+            hospital_id=hospital_id,
+            patient_id=prescription_detail.get("patient_id"),
+            prescriber_id=prescription_detail.get("prescriber_id"),
+        )
+        session.add(new_presc_obj)
+        await session.flush()
+
+        # raises StockError, which rolls back the prescription as well
+        drug, _ = await allocate_drug_stock(
+            session, hospital_id, prescription_detail.get("drug_id"), drug_qty
+        )
+        session.add(PrescriptionItem(
+            prescription_id=new_presc_obj.prescription_id,
+            drug_id=prescription_detail.get("drug_id"),
+            drug_qty=drug_qty,
+            notes=prescription_detail.get("notes"),
+        ))
+        add_billing(
+            session, hospital_id, "Prescriptions", drug.drug_name, drug.drug_price * drug_qty,
+            patient_id=new_presc_obj.patient_id,
+        )
+        return new_presc_obj
 
+    try:
+        new_presc_obj = await write_queue.submit(prescribe)
+        emit(
+            hospital_id, "billing.created", source="Prescriptions",
+            patient_id=new_presc_obj.patient_id,
+        )
+        async with async_session() as session:
             stmt = (
                 select(Prescription)
                 .where(Prescription.prescription_id == new_presc_obj.prescription_id)
@@ -65,10 +57,9 @@ async def add_prescription(hospital_id: str, prescription_detail: dict):
             result = await session.execute(stmt)
             return result.scalars().first()
 
-        except Exception as e:
-            print("An error occurred:", e)
-            await session.rollback()
-            return None
+    except Exception as e:
+        print("An error occurred:", e)
+        return None
 
 
 async def fetch_prescriptions(hospital_id: str, sort_term: str, sort_dir: str):
@@ -138,7 +129,13 @@ async def get_specific_prescription(hospital_id: str, prescription_id: str):
 
 async def delete_prescription(hospital_id: str, prescription_id: str):
     async with async_session() as session:
-        prescription = await session.get(Prescription, prescription_id)
+        result = await session.execute(
+            select(Prescription).where(
+                (Prescription.hospital_id == hospital_id)
+                & (Prescription.prescription_id == prescription_id)
+            )
+        )
+        prescription = result.scalars().first()
         if not prescription:
             return None
         try:
@@ -146,3 +143,5 @@ async def delete_prescription(hospital_id: str, prescription_id: str):
             await session.commit()
         except Exception as e:
             print("An error occurred:", e)
+            return None
+        return prescription
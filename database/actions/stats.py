@@ -0,0 +1,57 @@
+from database.models import (
+    Hospital, Patient, Appointment, Drug, Billing, LabQueueStats
+)
+from config import async_session
+from database.cache import TTLCache
+from database.actions.drugs import drug_filter_conditions
+from sqlalchemy import select, func, exists
+from datetime import datetime, date, time, timedelta
+
+STATS_TTL = 30
+stats_cache = TTLCache(ttl=STATS_TTL, stale_ttl=STATS_TTL * 20)
+
+def count_where(model, *conditions):
+    return select(func.count()).select_from(model).where(*conditions).scalar_subquery()
+
+async def compute_hospital_stats(hospital_id: str):
+    today = date.today()
+    day_start = datetime.combine(today, time())
+    day_end = day_start + timedelta(days=1)
+    month_start = datetime.combine(today.replace(day=1), time())
+
+    # every tile is a scalar subquery of a single SELECT: one round trip
+    stmt = select(
+        exists().where(Hospital.hospital_id == hospital_id).label("hospital_exists"),
+        count_where(Patient, Patient.hospital_id == hospital_id).label("patients"),
+        count_where(
+            Patient, Patient.hospital_id == hospital_id, Patient.date_added >= month_start
+        ).label("new_patients_this_month"),
+        count_where(
+            Appointment, Appointment.hospital_id == hospital_id, Appointment.date_requested == today
+        ).label("appointments_today"),
+        func.coalesce(
+            select(LabQueueStats.pending_count + LabQueueStats.in_progress_count)
+            .where(LabQueueStats.hospital_id == hospital_id)
+            .scalar_subquery(), 0
+        ).label("pending_lab_requests"),
+        count_where(
+            Drug, Drug.hospital_id == hospital_id, *drug_filter_conditions("expired")
+        ).label("expired_drugs"),
+        select(func.coalesce(func.sum(Billing.total), 0))
+        .where(
+            (Billing.hospital_id == hospital_id) &
+            (Billing.created_at >= day_start) &
+            (Billing.created_at < day_end)
+        )
+        .scalar_subquery().label("revenue_today"),
+    )
+    async with async_session() as session:
+        result = await session.execute(stmt)
+        stats = dict(result.mappings().one())
+    if not stats.pop("hospital_exists"):
+        return None
+    stats["generated_at"] = datetime.now().isoformat(timespec="seconds")
+    return stats
+
+async def fetch_hospital_stats(hospital_id: str):
+    return await stats_cache.get(hospital_id, lambda: compute_hospital_stats(hospital_id))
@@ -0,0 +1,155 @@
+from database.models import (
+    Patient, Diagnosis, LaboratoryRequest, LaboratoryTest, LaboratoryResult,
+    Appointment, Service, Prescription, PrescriptionItem, Drug, Billing
+)
+from config import async_session
+from sqlalchemy import select, func, literal, null, type_coerce, union_all, Date, DateTime, Float, Integer, String, Text, Time
+
+TIMELINE_TYPES = (
+    "diagnosis", "lab_request", "lab_result", "appointment", "prescription", "billing"
+)
+
+def timeline_branch(record_type: str, record_id, occurred_at, summary=None, detail=None,
+                    status=None, amount=None, quantity=None, scheduled_date=None, scheduled_time=None,
+                    entry_id=None):
+    # every branch yields the same columns so they can be stacked with UNION ALL;
+    # entry_id is a unique tie-breaker for ordering and is not returned
+    return [
+        (entry_id if entry_id is not None else record_id).label("entry_id"),
+        literal(record_type, String).label("record_type"),
+        record_id.label("record_id"),
+        occurred_at.label("occurred_at"),
+        (summary if summary is not None else null().cast(String)).label("summary"),
+        (detail if detail is not None else null().cast(Text)).label("detail"),
+        (status if status is not None else null().cast(String)).label("status"),
+        (amount if amount is not None else null().cast(Float)).label("amount"),
+        (quantity if quantity is not None else null().cast(Integer)).label("quantity"),
+        (scheduled_date if scheduled_date is not None else null().cast(Date)).label("scheduled_date"),
+        (scheduled_time if scheduled_time is not None else null().cast(Time)).label("scheduled_time"),
+    ]
+
+def timeline_branches(hospital_id: str, patient_id: str):
+    # each branch is driven by its (hospital_id, patient_id, <time>) index
+    return {
+        "diagnosis": (
+            select(*timeline_branch(
+                "diagnosis", Diagnosis.diagnosis_id, Diagnosis.date_added,
+                summary=Diagnosis.suggested_diagnosis, detail=Diagnosis.findings,
+            ))
+            .where((Diagnosis.hospital_id == hospital_id) & (Diagnosis.patient_id == patient_id)),
+            (Diagnosis.date_added, Diagnosis.diagnosis_id),
+        ),
+        "lab_request": (
+            select(*timeline_branch(
+                "lab_request", LaboratoryRequest.request_id, LaboratoryRequest.requested_at,
+                summary=LaboratoryTest.test_name, status=LaboratoryRequest.request_status,
+                amount=LaboratoryTest.test_price,
+            ))
+            .select_from(LaboratoryRequest)
+            .outerjoin(LaboratoryTest, LaboratoryRequest.test_id == LaboratoryTest.test_id)
+            .where(
+                (LaboratoryRequest.hospital_id == hospital_id) &
+                (LaboratoryRequest.patient_id == patient_id)
+            ),
+            (LaboratoryRequest.requested_at, LaboratoryRequest.request_id),
+        ),
+        "lab_result": (
+            select(*timeline_branch(
+                "lab_result", LaboratoryResult.result_id, LaboratoryResult.date_added,
+                summary=LaboratoryResult.conclusion, detail=LaboratoryResult.observations,
+            ))
+            .where(
+                (LaboratoryResult.hospital_id == hospital_id) &
+                (LaboratoryResult.patient_id == patient_id)
+            ),
+            (LaboratoryResult.date_added, LaboratoryResult.result_id),
+        ),
+        # appointments sit on the day they are booked for, which is also the
+        # column they are partitioned and indexed by
+        "appointment": (
+            select(*timeline_branch(
+                "appointment", Appointment.appointment_id, type_coerce(Appointment.date_requested, DateTime),
+                summary=Service.service_name, detail=Appointment.appointment_desc,
+                amount=Service.service_price, scheduled_date=Appointment.date_requested,
+                scheduled_time=Appointment.time_requested,
+            ))
+            .select_from(Appointment)
+            .outerjoin(Service, Appointment.service_id == Service.service_id)
+            .where((Appointment.hospital_id == hospital_id) & (Appointment.patient_id == patient_id)),
+            (Appointment.date_requested, Appointment.appointment_id),
+        ),
+        "prescription": (
+            select(*timeline_branch(
+                "prescription", Prescription.prescription_id, Prescription.date_added,
+                summary=Drug.drug_name, detail=PrescriptionItem.notes,
+                quantity=PrescriptionItem.drug_qty,
+                entry_id=func.coalesce(PrescriptionItem.item_id, Prescription.prescription_id),
+            ))
+            .select_from(Prescription)
+            .outerjoin(PrescriptionItem, PrescriptionItem.prescription_id == Prescription.prescription_id)
+            .outerjoin(Drug, PrescriptionItem.drug_id == Drug.drug_id)
+            .where((Prescription.hospital_id == hospital_id) & (Prescription.patient_id == patient_id)),
+            (Prescription.date_added, func.coalesce(PrescriptionItem.item_id, Prescription.prescription_id)),
+        ),
+        "billing": (
+            select(*timeline_branch(
+                "billing", Billing.billing_id, Billing.created_at,
+                summary=Billing.item, detail=Billing.source.cast(Text), amount=Billing.total,
+            ))
+            .where((Billing.hospital_id == hospital_id) & (Billing.patient_id == patient_id)),
+            (Billing.created_at, Billing.billing_id),
+        ),
+    }
+
+def timeline_types(types: str = None):
+    if not types:
+        return TIMELINE_TYPES
+    wanted = tuple(dict.fromkeys(t.strip() for t in types.split(",") if t.strip()))
+    unknown = [t for t in wanted if t not in TIMELINE_TYPES]
+    if unknown:
+        raise ValueError(f"Unknown timeline types: {', '.join(unknown)}")
+    return wanted
+
+async def fetch_patient_timeline(hospital_id: str, patient_id: str, types: tuple = TIMELINE_TYPES,
+                                 page: int = 1, page_size: int = 50):
+    offset = (page - 1) * page_size
+    branches = timeline_branches(hospital_id, patient_id)
+    # no branch can contribute more than offset + page_size rows to the page,
+    # so each one is cut to that many newest rows before the merge
+    parts = []
+    for record_type in types:
+        stmt, (occurred_at, entry_id) = branches[record_type]
+        limited = stmt.order_by(occurred_at.desc(), entry_id).limit(offset + page_size).subquery()
+        parts.append(select(limited))
+    merged = union_all(*parts).subquery()
+    stmt = (
+        select(*(column for column in merged.c if column.name != "entry_id"))
+        .order_by(merged.c.occurred_at.desc(), merged.c.record_type, merged.c.entry_id)
+        .offset(offset)
+        .limit(page_size)
+    )
+
+    counts_stmt = select(
+        select(func.count()).select_from(Patient)
+        .where((Patient.hospital_id == hospital_id) & (Patient.patient_id == patient_id))
+        .scalar_subquery().label("patient_exists"),
+        *(
+            select(func.count()).select_from(branches[record_type][0].subquery())
+            .scalar_subquery().label(record_type)
+            for record_type in types
+        ),
+    )
+    async with async_session() as session:
+        counts = dict((await session.execute(counts_stmt)).mappings().one())
+        if not counts.pop("patient_exists"):
+            return None
+        result = await session.execute(stmt)
+        rows = [dict(row) for row in result.mappings()]
+    return {
+        "patient_id": patient_id,
+        "total": sum(counts.values()),
+        "counts": counts,
+        "page": page,
+        "page_size": page_size,
+        "results": rows,
+    }
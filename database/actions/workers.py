@@ -1,7 +1,7 @@
 from database.models import Worker
 from config import async_session
 from sqlalchemy import select
-from database.utils import hash_pwd, is_verified_pwd
+from database.utils import hash_pwd, is_verified_pwd, verify_signin_pwd
 
 async def add_worker(hospital_id: str, worker_detail: dict):
     async with async_session.begin() as session:
@@ -74,9 +74,8 @@ async def signin(hospital_id: str, worker_detail):
         )
         result = await session.execute(stmt)
         worker = result.scalars().first()
-        if not worker:
-            return None
-        if not is_verified_pwd(worker_detail.get("worker_password"), worker.worker_password):
+        hashed = worker.worker_password if worker else None
+        if not await verify_signin_pwd(worker_detail.get("worker_password"), hashed):
             return None
         return worker
 
@@ -0,0 +1,278 @@
+import argparse
+import asyncio
+import os
+from datetime import date, datetime, time
+from uuid import UUID
+from sqlalchemy import select, delete, exists, Boolean, Date, DateTime, Float, Integer, Time
+from sqlalchemy.orm.attributes import set_committed_value
+from config import async_session
+from database.ids import new_id
+from database.models import Hospital, Billing, Diagnosis, LaboratoryRequest, LaboratoryResult, Appointment
+from database.utils import day_after, years_before
+from database.actions.lab_queue import bump_queue_stats, STATUS_COUNTERS
+
+# Records older than the horizon move out of the database into one Parquet
+# directory per table and hospital, split by year:
+#   <ARCHIVE_DIR>/<table>/hospital_id=<id>/year=<yyyy>/<uuid>.parquet
+# Rows are sorted by patient inside each file so row group statistics let
+# patient lookups skip most of a file; the year directories do the same for
+# date ranges. Results go before requests, and a request is only archived
+# once no live result points at it: a result can be dated after the cutoff
+# even when its request is not, and then the request stays live with it.
+# pyarrow (which pulls in pandas) is imported only when an archive is
+# written or read, so it stays out of API start-up.
+ARCHIVE_DIR = os.getenv("NEPTUNE_ARCHIVE_DIR", "archive")
+ARCHIVE_AFTER_YEARS = int(os.getenv("NEPTUNE_ARCHIVE_AFTER_YEARS", "0"))
+ARCHIVE_BATCH = 5_000
+ARCHIVE_ROW_GROUP = 10_000
+# holds the newest cutoff any run has used: everything archived is older
+CUTOFF_FILE = os.path.join(ARCHIVE_DIR, ".cutoff")
+# each table is archived and read back by the same key its reports filter on
+ARCHIVED_TABLES = {
+    "lab_results": (LaboratoryResult, "date_added"),
+    "lab_requests": (LaboratoryRequest, "date_added"),
+    "diagnosis": (Diagnosis, "date_added"),
+    "appointments": (Appointment, "date_requested"),
+    "billings": (Billing, "created_at"),
+}
+
+def arrow_type(column):
+    import pyarrow as pa
+    kind = column.type
+    if isinstance(kind, Boolean):
+        return pa.bool_()
+    if isinstance(kind, Integer):
+        return pa.int64()
+    if isinstance(kind, Float):
+        return pa.float64()
+    if isinstance(kind, DateTime):
+        return pa.timestamp("us")
+    if isinstance(kind, Date):
+        return pa.date32()
+    if isinstance(kind, Time):
+        return pa.time64("us")
+    return pa.string()
+
+def archive_schema(table: str):
+    import pyarrow as pa
+    model, _ = ARCHIVED_TABLES[table]
+    return pa.schema([(column.name, arrow_type(column)) for column in model.__table__.columns])
+
+def hospital_archive_dir(table: str, hospital_id: str):
+    # ids reach here from query strings; only a well-formed id may become a path
+    UUID(str(hospital_id))
+    return os.path.join(ARCHIVE_DIR, table, f"hospital_id={hospital_id}")
+
+def write_archive_files(table: str, hospital_id: str, rows: list):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    _, key = ARCHIVED_TABLES[table]
+    schema = archive_schema(table)
+    by_year = {}
+    for row in rows:
+        by_year.setdefault(row[key].year, []).append(row)
+    paths = []
+    try:
+        for year, year_rows in by_year.items():
+            year_rows.sort(key=lambda row: (row["patient_id"] or "", row[key]))
+            folder = os.path.join(hospital_archive_dir(table, hospital_id), f"year={year}")
+            os.makedirs(folder, exist_ok=True)
+            name = f"{new_id()}.parquet"
+            path = os.path.join(folder, name)
+            # dot files are skipped by readers until the rename makes it whole
+            partial = os.path.join(folder, f".{name}")
+            pq.write_table(
+                pa.Table.from_pylist(year_rows, schema=schema), partial,
+                compression="zstd", row_group_size=ARCHIVE_ROW_GROUP,
+            )
+            os.replace(partial, path)
+            paths.append(path)
+    except Exception:
+        remove_files(paths)
+        raise
+    return paths
+
+def remove_files(paths: list):
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print("Could not remove archive file: ", path, e)
+
+def archived_before():
+    try:
+        with open(CUTOFF_FILE) as f:
+            return datetime.fromisoformat(f.read().strip())
+    except (OSError, ValueError):
+        return None
+
+def record_cutoff(cutoff: datetime):
+    # written before any row moves, so a reader never skips rows that are
+    # already in Parquet
+    previous = archived_before()
+    if previous and previous >= cutoff:
+        return
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    partial = f"{CUTOFF_FILE}.{new_id()}"
+    with open(partial, "w") as f:
+        f.write(cutoff.isoformat())
+    os.replace(partial, CUTOFF_FILE)
+
+def key_bound(table: str, moment: datetime):
+    # appointments are keyed by the day they are booked for
+    model, key = ARCHIVED_TABLES[table]
+    return moment.date() if isinstance(model.__table__.columns[key].type, Date) else moment
+
+def archive_reaches(start: datetime = None):
+    cutoff = archived_before()
+    if cutoff is None:
+        # nothing archived yet, or an archive written before the marker
+        return os.path.isdir(ARCHIVE_DIR)
+    return start is None or start < cutoff
+
+async def archive_table(table: str, hospital_id: str, cutoff: datetime):
+    # Each batch is written to its own file before its rows are deleted. If
+    # the delete fails the file is removed again; a crash in between leaves
+    # the rows in both places, which readers count once.
+    model, key = ARCHIVED_TABLES[table]
+    columns = model.__table__.columns
+    key_column = columns[key]
+    id_column = next(iter(model.__table__.primary_key.columns))
+    conditions = [columns["hospital_id"] == hospital_id, key_column < key_bound(table, cutoff)]
+    if table == "lab_requests":
+        conditions.append(~exists().where(LaboratoryResult.request_id == id_column))
+    moved = 0
+    while True:
+        async with async_session() as session:
+            result = await session.execute(
+                select(*columns)
+                .where(*conditions)
+                .order_by(key_column, id_column)
+                .limit(ARCHIVE_BATCH)
+            )
+            rows = [dict(row) for row in result.mappings()]
+        if not rows:
+            return moved
+        paths = await asyncio.to_thread(write_archive_files, table, hospital_id, rows)
+        try:
+            async with async_session.begin() as session:
+                await session.execute(
+                    delete(model.__table__).where(id_column.in_([row[id_column.name] for row in rows]))
+                    .execution_options(track_changes=False)
+                )
+                if table == "lab_requests":
+                    # the queue counters describe the live requests, so they
+                    # drop with the archived ones like on a delete
+                    await bump_queue_stats(session, hospital_id, -sum(
+                        (row["resulted_at"] - row["requested_at"]).total_seconds()
+                        for row in rows
+                        if row["request_status"] == "resulted" and row["resulted_at"] and row["requested_at"]
+                    ), **{
+                        status: -sum(1 for row in rows if row["request_status"] == status)
+                        for status in STATUS_COUNTERS
+                    })
+        except Exception:
+            remove_files(paths)
+            raise
+        moved += len(rows)
+        if len(rows) < ARCHIVE_BATCH:
+            return moved
+
+async def archive_hospital(hospital_id: str, cutoff: datetime):
+    moved = {}
+    for table in ARCHIVED_TABLES:
+        moved[table] = await archive_table(table, hospital_id, cutoff)
+    return moved
+
+async def archive_old_records(after_years: int = None):
+    after_years = after_years or ARCHIVE_AFTER_YEARS
+    if not after_years:
+        return {}
+    cutoff = datetime.combine(years_before(date.today(), after_years), time.min)
+    record_cutoff(cutoff)
+    async with async_session() as session:
+        result = await session.execute(select(Hospital.hospital_id))
+        hospital_ids = result.scalars().all()
+    moved = {}
+    for hospital_id in hospital_ids:
+        try:
+            counts = await archive_hospital(hospital_id, cutoff)
+        except Exception as e:
+            print("Archiving failed for hospital: ", hospital_id, e)
+            continue
+        if any(counts.values()):
+            moved[hospital_id] = counts
+    return moved
+
+def read_archive_rows(table: str, hospital_id: str, start: datetime = None, end: datetime = None, patient_id: str = None, columns: list = None):
+    try:
+        folder = hospital_archive_dir(table, hospital_id)
+    except ValueError:
+        return []
+    if not os.path.isdir(folder):
+        return []
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    _, key = ARCHIVED_TABLES[table]
+    dataset = ds.dataset(
+        folder, format="parquet", schema=archive_schema(table).append(pa.field("year", pa.int32())),
+        partitioning=ds.partitioning(pa.schema([("year", pa.int32())]), flavor="hive"),
+    )
+    # conditions on year prune whole directories; the rest are checked
+    # against row group statistics before any data is read
+    condition = ds.scalar(True)
+    if start:
+        condition &= (ds.field("year") >= start.year) & (ds.field(key) >= key_bound(table, start))
+    if end:
+        condition &= (ds.field("year") <= end.year) & (ds.field(key) < key_bound(table, day_after(end)))
+    if patient_id:
+        condition &= ds.field("patient_id") == patient_id
+    names = columns or archive_schema(table).names
+    return dataset.to_table(columns=names, filter=condition).to_pylist()
+
+async def fetch_archived_rows(table: str, hospital_id: str, start: datetime = None, end: datetime = None, patient_id: str = None, columns: list = None):
+    if not archive_reaches(start):
+        return []
+    return await asyncio.to_thread(read_archive_rows, table, hospital_id, start, end, patient_id, columns)
+
+async def fetch_archived_records(table: str, hospital_id: str, start: datetime, end: datetime, relations: tuple = ()):
+    # Archived rows as detached model instances with their many-to-one
+    # relations loaded from the live tables, so report builders can treat
+    # them like rows fresh from the database.
+    rows = await fetch_archived_rows(table, hospital_id, start, end)
+    if not rows:
+        return []
+    model, _ = ARCHIVED_TABLES[table]
+    records = [model(**row) for row in rows]
+    async with async_session() as session:
+        for name in relations:
+            relation = getattr(model, name).property
+            (local, remote), = relation.local_remote_pairs
+            ids = {getattr(record, local.key) for record in records} - {None}
+            related = {}
+            if ids:
+                result = await session.execute(select(relation.mapper.class_).where(remote.in_(ids)))
+                related = {getattr(item, remote.key): item for item in result.scalars()}
+            for record in records:
+                set_committed_value(record, name, related.get(getattr(record, local.key)))
+    return records
+
+async def with_archived(records, table: str, hospital_id: str, start: datetime, end: datetime, relations: tuple = ()):
+    # merge archived rows into a date range report, newest first like the
+    # live queries; a row caught mid-move is only counted once
+    archived = await fetch_archived_records(table, hospital_id, start, end, relations)
+    if not archived:
+        return records
+    model, key = ARCHIVED_TABLES[table]
+    id_name = next(iter(model.__table__.primary_key.columns)).name
+    live_ids = {getattr(record, id_name) for record in records or ()}
+    merged = list(records or ()) + [record for record in archived if getattr(record, id_name) not in live_ids]
+    merged.sort(key=lambda record: getattr(record, key) or key_bound(table, datetime.min), reverse=True)
+    return merged
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move old records into Parquet archives")
+    parser.add_argument("--after-years", type=int, default=ARCHIVE_AFTER_YEARS or None, required=not ARCHIVE_AFTER_YEARS)
+    args = parser.parse_args()
+    for hospital_id, counts in asyncio.run(archive_old_records(args.after_years)).items():
+        print(hospital_id, counts)
@@ -0,0 +1,62 @@
+import asyncio
+import time
+
+
+class TTLCache:
+    # Per-key cache for async loaders. A value younger than ttl is served as is;
+    # an older one (up to stale_ttl) is still served while a single background
+    # task reloads it, so callers only wait on a cold or long-expired key.
+    # Concurrent misses for the same key share one load.
+    def __init__(self, ttl: float, stale_ttl: float = None, max_entries: int = 10_000):
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl if stale_ttl is not None else ttl * 10
+        self.max_entries = max_entries
+        self.entries = {}
+        self.loading = {}
+
+    async def get(self, key, loader):
+        entry = self.entries.get(key)
+        if entry:
+            value, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                return value
+            if age < self.stale_ttl:
+                self.refresh(key, loader)
+                return value
+        return await self.load(key, loader)
+
+    def refresh(self, key, loader):
+        if key not in self.loading:
+            self.loading[key] = asyncio.ensure_future(self._load(key, loader))
+
+    async def load(self, key, loader):
+        task = self.loading.get(key)
+        if task is None:
+            task = self.loading[key] = asyncio.ensure_future(self._load(key, loader))
+        return await asyncio.shield(task)
+
+    async def _load(self, key, loader):
+        try:
+            value = await loader()
+            self.set(key, value)
+            return value
+        except Exception as e:
+            print("Cache refresh failed: ", key, e)
+            entry = self.entries.get(key)
+            if entry:
+                return entry[0]
+            raise
+        finally:
+            self.loading.pop(key, None)
+
+    def set(self, key, value):
+        if key not in self.entries and len(self.entries) >= self.max_entries:
+            self.entries.pop(next(iter(self.entries)))
+        self.entries[key] = (value, time.monotonic())
+
+    def invalidate(self, key=None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
@@ -0,0 +1,109 @@
+import asyncio
+import json
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+# "local" fans events out inside this process only. "postgres" publishes with
+# NOTIFY and delivers whatever arrives on LISTEN, so every worker attached to
+# the same database sees every event.
+EVENTS_BACKEND = os.getenv("NEPTUNE_EVENTS_BACKEND", "local")
+EVENTS_CHANNEL = "neptune_events"
+QUEUE_SIZE = 256
+REPLAY_SIZE = 200
+
+
+class EventHub:
+    def __init__(self, backend: str = EVENTS_BACKEND):
+        self.backend = backend
+        self.subscribers = {}
+        self.history = {}
+        self.next_id = 0
+        # sequence numbers restart with the process and differ between workers,
+        # so ids carry the boot epoch they were issued under
+        self.epoch = format(time.time_ns(), "x")
+        self.connection = None
+
+    @asynccontextmanager
+    async def subscribe(self, hospital_id: str):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        self.subscribers.setdefault(hospital_id, set()).add(queue)
+        try:
+            yield queue
+        finally:
+            queues = self.subscribers.get(hospital_id)
+            if queues is not None:
+                queues.discard(queue)
+                if not queues:
+                    self.subscribers.pop(hospital_id, None)
+
+    def position(self, last_event_id: str = None):
+        # an id from another boot or worker cannot be placed in this sequence;
+        # such a screen resumes from now instead of waiting for the counter to catch up
+        epoch, _, seq = (last_event_id or "").partition("-")
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self.next_id:
+            return self.next_id
+        return int(seq)
+
+    def replay(self, hospital_id: str, last_seq: int):
+        return [event for event in self.history.get(hospital_id, ()) if event["seq"] > last_seq]
+
+    def emit(self, hospital_id: str, event_type: str, **data):
+        # called by actions after their commit; never blocks the caller
+        event = {
+            "hospital_id": hospital_id,
+            "type": event_type,
+            "data": data,
+            "at": datetime.now().isoformat(timespec="seconds"),
+        }
+        if self.backend == "postgres" and self.connection is not None:
+            asyncio.ensure_future(self.notify(event))
+        else:
+            self.deliver(event)
+
+    def deliver(self, event: dict):
+        self.next_id += 1
+        event = dict(event, seq=self.next_id, id=f"{self.epoch}-{self.next_id}")
+        hospital_id = event["hospital_id"]
+        self.history.setdefault(hospital_id, deque(maxlen=REPLAY_SIZE)).append(event)
+        for queue in self.subscribers.get(hospital_id, ()):
+            if queue.full():
+                # a slow screen loses its oldest event rather than stalling the hub
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def notify(self, event: dict):
+        try:
+            await self.connection.execute(
+                "SELECT pg_notify($1, $2)", EVENTS_CHANNEL, json.dumps(event, default=str)
+            )
+        except Exception as e:
+            print("Event notify failed, delivering locally: ", e)
+            self.deliver(event)
+
+    def on_notification(self, connection, pid, channel, payload):
+        try:
+            self.deliver(json.loads(payload))
+        except ValueError as e:
+            print("Dropped malformed event: ", e)
+
+    async def start(self):
+        if self.backend != "postgres" or self.connection is not None:
+            return
+        import asyncpg
+        from config import DATABASE_URL
+
+        dsn = DATABASE_URL.replace("postgresql+asyncpg://", "postgresql://", 1)
+        self.connection = await asyncpg.connect(dsn)
+        await self.connection.add_listener(EVENTS_CHANNEL, self.on_notification)
+
+    async def stop(self):
+        if self.connection is not None:
+            await self.connection.close()
+            self.connection = None
+
+
+hub = EventHub()
+emit = hub.emit
@@ -0,0 +1,51 @@
+import os
+import time
+from uuid import UUID
+from sqlalchemy import String
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.types import TypeDecorator
+
+# Set once init_db's --native-uuid migration has converted a Postgres
+# database (or before the first create_all on a new one). Other databases
+# keep text keys either way.
+NATIVE_UUID = os.getenv("NEPTUNE_NATIVE_UUID", "") in ("1", "true", "yes")
+
+def uuid7(millis: int = None, random_bits: int = None):
+    # RFC 9562 version 7: 48-bit unix milliseconds, then random bits, so new
+    # keys sort after old ones and land at the right edge of the index
+    if millis is None:
+        millis = time.time_ns() // 1_000_000
+    if random_bits is None:
+        random_bits = int.from_bytes(os.urandom(10), "big")
+    value = millis << 80 | random_bits
+    value = value & ~(0xF << 76) | 0x7 << 76
+    value = value & ~(0x3 << 62) | 0x2 << 62
+    return UUID(int=value)
+
+def new_id():
+    return str(uuid7())
+
+
+class GUID(TypeDecorator):
+    # Primary and foreign keys. The API always sees the usual 36-character
+    # string; with NATIVE_UUID on Postgres it is stored as a 16-byte uuid.
+    impl = String
+    cache_ok = True
+
+    def native(self, dialect):
+        return NATIVE_UUID and dialect.name == "postgresql"
+
+    def load_dialect_impl(self, dialect):
+        if self.native(dialect):
+            return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+        return dialect.type_descriptor(String())
+
+    def process_bind_param(self, value, dialect):
+        if value is None or not self.native(dialect):
+            return value
+        try:
+            return str(UUID(str(value)))
+        except ValueError:
+            # binding it as NULL would quietly match nothing (or, in an
+            # insert, store a NULL key); let the caller see the bad id
+            raise ValueError(f"Malformed id: {value!r}")
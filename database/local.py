@@ -0,0 +1,135 @@
+import asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, AsyncSessionTransaction
+
+# Local (offline-first) mode runs the API on a SQLite file next to the
+# clinic and replicates to the central database in the background. SQLite
+# takes one writer at a time; instead of letting concurrent handlers spin
+# on "database is locked", writes queue on an asyncio lock in the app.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA cache_size=-64000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+)
+
+def sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+
+class WriterLock:
+    # Re-entrant per task, so an action that opens a second session inside
+    # its first one does not wait on itself.
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.owner = None
+        self.depth = 0
+
+    async def acquire(self):
+        task = asyncio.current_task()
+        if self.owner is task:
+            self.depth += 1
+            return
+        await self.lock.acquire()
+        self.owner = task
+        self.depth = 1
+
+    def release(self):
+        self.depth -= 1
+        if not self.depth:
+            self.owner = None
+            self.lock.release()
+
+
+writer_lock = WriterLock()
+
+def is_write(statement):
+    if statement is None:
+        return False
+    if getattr(statement, "is_dml", False):
+        return True
+    if getattr(statement, "is_text", False):
+        return statement.text.lstrip().split(None, 1)[0].upper() in ("INSERT", "UPDATE", "DELETE", "REPLACE")
+    return False
+
+
+class LocalTransaction(AsyncSessionTransaction):
+    async def commit(self):
+        await self.session.claim_writer()
+        await super().commit()
+
+    async def __aexit__(self, type_, value, traceback):
+        if type_ is None:
+            await self.session.claim_writer()
+        try:
+            await super().__aexit__(type_, value, traceback)
+        finally:
+            # sessionmaker.begin() skips closing the session when the commit
+            # raises, so the lock cannot wait for close()
+            self.session.release_writer()
+
+
+class LocalSession(AsyncSession):
+    # The sqlite driver only opens a transaction at the first INSERT, UPDATE
+    # or DELETE, so the lock is taken right before the first write (or flush
+    # of pending objects) and held until the transaction ends.
+    holds_writer = False
+
+    async def claim_writer(self, statement=None):
+        if self.holds_writer:
+            return
+        pending = self.sync_session.new or self.sync_session.dirty or self.sync_session.deleted
+        if pending or is_write(statement):
+            await writer_lock.acquire()
+            self.holds_writer = True
+
+    def release_writer(self):
+        if self.holds_writer:
+            self.holds_writer = False
+            writer_lock.release()
+
+    def begin(self):
+        return LocalTransaction(self)
+
+    async def execute(self, statement, *args, **kwargs):
+        await self.claim_writer(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def stream(self, statement, *args, **kwargs):
+        await self.claim_writer(statement)
+        return await super().stream(statement, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        await self.claim_writer()
+        return await super().get(*args, **kwargs)
+
+    async def merge(self, *args, **kwargs):
+        await self.claim_writer()
+        return await super().merge(*args, **kwargs)
+
+    async def flush(self, objects=None):
+        await self.claim_writer()
+        await super().flush(objects)
+
+    async def commit(self):
+        await self.claim_writer()
+        try:
+            await super().commit()
+        finally:
+            self.release_writer()
+
+    async def rollback(self):
+        try:
+            await super().rollback()
+        finally:
+            self.release_writer()
+
+    async def close(self):
+        try:
+            await super().close()
+        finally:
+            self.release_writer()
@@ -1,19 +1,19 @@
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from sqlalchemy import (
     Column, Integer, String,
     DateTime, Float, Text, 
-    ForeignKey, Time, Date, Boolean
+    ForeignKey, Time, Date, Boolean, Index, text
 )
-from datetime import timedelta
-from database.utils import current_date, expiry_date
-from uuid import uuid4
+from datetime import datetime, timedelta
+from database.utils import current_date, expiry_date, normalize_gender
+from database.ids import GUID, new_id
 
 Base = declarative_base()
 
 class Hospital(Base):
     __tablename__ = "hospitals"
-    hospital_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
+    hospital_id = Column(GUID, primary_key=True, default=new_id, index=True)
     hospital_name = Column(String, index=True)
     hospital_email = Column(String, index=True, unique=True)
     hospital_contact = Column(String, index=True)
@@ -39,11 +39,15 @@ class Hospital(Base):
     appointments = relationship("Appointment", back_populates="hospital", cascade="all, delete-orphan")
     prescriptions = relationship("Prescription", back_populates="hospital", cascade="all, delete-orphan")
     billings = relationship("Billing", back_populates="hospital", cascade="all, delete-orphan")
+    drug_alerts = relationship("DrugAlert", back_populates="hospital", cascade="all, delete-orphan")
+    drug_lots = relationship("DrugLot", back_populates="hospital", cascade="all, delete-orphan")
+    consultant_availability = relationship("ConsultantAvailability", back_populates="hospital", cascade="all, delete-orphan")
+    lab_queue_stats = relationship("LabQueueStats", back_populates="hospital", cascade="all, delete-orphan", uselist=False)
 
 class Worker(Base):
     __tablename__ = "workers"
-    worker_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
+    worker_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
     worker_name = Column(String, index=True)
     worker_email = Column(String, nullable=True, index=True)
     worker_phone = Column(String, index=True)
@@ -60,17 +64,24 @@ class Worker(Base):
     lab_requests = relationship("LaboratoryRequest", back_populates="doctor", cascade="all, delete-orphan")
     lab_results = relationship("LaboratoryResult", back_populates="tech", cascade="all, delete-orphan")
     appointments = relationship("Appointment", back_populates="consultant", cascade="all, delete-orphan")
+    availability = relationship("ConsultantAvailability", back_populates="consultant", cascade="all, delete-orphan")
     prescriptions = relationship("Prescription", back_populates="prescriber", cascade="all, delete-orphan")
 
 class Patient(Base):
     __tablename__ = "patients"
-    patient_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
+    __table_args__ = (
+        Index("ix_patients_hospital_dob", "hospital_id", "patient_dob"),
+        Index("ix_patients_hospital_gender_key", "hospital_id", "patient_gender_key"),
+        Index("ix_patients_hospital_date_added", "hospital_id", "date_added"),
+    )
+    patient_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
     patient_name = Column(String, nullable=True, index=True)
     patient_email = Column(String, nullable=True, index=True)
     patient_phone = Column(String, nullable=True, index=True)
     patient_id_number = Column(String, index=True, nullable=True)
     patient_gender = Column(String, nullable=True)
+    patient_gender_key = Column(String, nullable=True)
     patient_address = Column(String, nullable=True)
     patient_dob = Column(Date)
     patient_weight = Column(Float, nullable=True, default=0)
@@ -93,16 +104,26 @@ class Patient(Base):
     prescriptions = relationship("Prescription", back_populates="patient", cascade="all, delete-orphan")
     billings = relationship("Billing", back_populates="patient", cascade="all, delete-orphan")
 
+    @validates("patient_gender")
+    def set_gender_key(self, key, gender):
+        self.patient_gender_key = normalize_gender(gender)
+        return gender
+
 class Drug(Base):
     __tablename__ = "drugs"
-    drug_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
+    __table_args__ = (
+        Index("ix_drugs_hospital_expiry", "hospital_id", "drug_expiry"),
+        Index("ix_drugs_hospital_quantity", "hospital_id", "drug_quantity"),
+    )
+    drug_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
     drug_name = Column(String, index=True)
     drug_category = Column(String, index=True)
     drug_desc = Column(Text)
     drug_quantity = Column(Integer)
     drug_price = Column(Float)
     drug_expiry = Column(DateTime)
+    reorder_level = Column(Integer, nullable=True, default=10)
     date_added = Column(DateTime, default=current_date)
     updated_at = Column(DateTime, default=current_date, onupdate=current_date)
 
@@ -111,11 +132,58 @@ class Drug(Base):
 
     hospital = relationship("Hospital", back_populates="drugs")
     prescriptions = relationship("PrescriptionItem", back_populates="drug")
+    alerts = relationship("DrugAlert", back_populates="drug", cascade="all, delete-orphan")
+    lots = relationship("DrugLot", back_populates="drug", cascade="all, delete-orphan")
+
+class DrugLot(Base):
+    # drug_quantity on Drug is the materialized sum of lot_quantity here and
+    # drug_expiry the expiry of the next lot in line; both are maintained by
+    # the allocation and restock actions
+    __tablename__ = "drug_lots"
+    __table_args__ = (
+        Index(
+            "ix_drug_lots_drug_expiry_in_stock", "drug_id", "lot_expiry",
+            postgresql_where=text("lot_quantity > 0"),
+            sqlite_where=text("lot_quantity > 0"),
+        ),
+    )
+    lot_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"), nullable=False)
+    drug_id = Column(GUID, ForeignKey("drugs.drug_id", ondelete="CASCADE"), nullable=False)
+    lot_number = Column(String, nullable=True)
+    lot_quantity = Column(Integer, nullable=False, default=0)
+    lot_expiry = Column(DateTime, nullable=False)
+    date_added = Column(DateTime, default=current_date)
+    updated_at = Column(DateTime, default=current_date, onupdate=current_date)
+
+    is_synced = Column(Boolean, default=False)
+    is_deleted = Column(Boolean, default=False)
+
+    hospital = relationship("Hospital", back_populates="drug_lots")
+    drug = relationship("Drug", back_populates="lots")
+
+class DrugAlert(Base):
+    __tablename__ = "drug_alerts"
+    __table_args__ = (
+        Index("ix_drug_alerts_hospital_type", "hospital_id", "alert_type"),
+    )
+    alert_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"), nullable=False)
+    drug_id = Column(GUID, ForeignKey("drugs.drug_id", ondelete="CASCADE"), nullable=False)
+    alert_type = Column(String, nullable=False)
+    drug_name = Column(String)
+    drug_quantity = Column(Integer)
+    reorder_level = Column(Integer)
+    drug_expiry = Column(DateTime)
+    created_at = Column(DateTime, default=datetime.now)
+
+    hospital = relationship("Hospital", back_populates="drug_alerts")
+    drug = relationship("Drug", back_populates="alerts")
 
 class Service(Base):
     __tablename__ = "services"
-    service_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
+    service_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
     service_name = Column(String, nullable=False, index=True)
     service_price = Column(Float, nullable=False)
     service_desc = Column(Text, nullable=False)
@@ -130,10 +198,14 @@ class Service(Base):
 
 class Diagnosis(Base):
     __tablename__ = "diagnosis"
-    diagnosis_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    patient_id = Column(String, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
-    diagnoser_id = Column(String, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    __table_args__ = (
+        Index("ix_diagnosis_hospital_date_added", "hospital_id", "date_added"),
+        Index("ix_diagnosis_hospital_patient", "hospital_id", "patient_id", "date_added"),
+    )
+    diagnosis_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    patient_id = Column(GUID, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
+    diagnoser_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
 
     symptoms = Column(Text)
     findings = Column(Text)
@@ -150,8 +222,8 @@ class Diagnosis(Base):
 
 class LaboratoryTest(Base):
     __tablename__ = "lab_tests"
-    test_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
+    test_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
     test_name = Column(String, nullable=False, index=True)
     test_desc = Column(Text, nullable=False)
     test_price = Column(Float, nullable=False)
@@ -164,13 +236,31 @@ class LaboratoryTest(Base):
     hospital = relationship("Hospital", back_populates="tests")
     lab_requests = relationship("LaboratoryRequest", back_populates="test")
 
+# kept literal: planners only pick a partial index when the query repeats its
+# predicate verbatim, which bound parameters never do
+OPEN_REQUEST_FILTER = "request_status IN ('pending', 'in_progress')"
+
 class LaboratoryRequest(Base):
     __tablename__ = "lab_requests"
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    request_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    patient_id = Column(String, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
-    doctor_id = Column(String, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
-    test_id = Column(String, ForeignKey("lab_tests.test_id", ondelete="RESTRICT"))
+    __table_args__ = (
+        Index("ix_lab_requests_hospital_date_added", "hospital_id", "date_added"),
+        Index("ix_lab_requests_hospital_patient", "hospital_id", "patient_id", "requested_at"),
+        # the worklist only ever reads open requests; resulted ones stay out of the index
+        Index(
+            "ix_lab_requests_open_queue", "hospital_id", "requested_at",
+            postgresql_where=text(OPEN_REQUEST_FILTER),
+            sqlite_where=text(OPEN_REQUEST_FILTER),
+        ),
+    )
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    request_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    patient_id = Column(GUID, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
+    doctor_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    test_id = Column(GUID, ForeignKey("lab_tests.test_id", ondelete="RESTRICT"))
+    request_status = Column(String, default="pending")
+    requested_at = Column(DateTime, default=datetime.now)
+    started_at = Column(DateTime, nullable=True)
+    resulted_at = Column(DateTime, nullable=True)
     date_added = Column(DateTime, default=current_date)
     updated_at = Column(DateTime, default=current_date, onupdate=current_date)
 
@@ -181,13 +271,19 @@ class LaboratoryRequest(Base):
     doctor = relationship("Worker", back_populates="lab_requests")
     patient = relationship("Patient", back_populates="lab_requests")
     test = relationship("LaboratoryTest", back_populates="lab_requests")
+    results = relationship("LaboratoryResult", back_populates="request")
 
 class LaboratoryResult(Base):
     __tablename__ = "lab_results"
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    result_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    patient_id = Column(String, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
-    tech_id = Column(String, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    __table_args__ = (
+        Index("ix_lab_results_hospital_date_added", "hospital_id", "date_added"),
+        Index("ix_lab_results_hospital_patient", "hospital_id", "patient_id", "date_added"),
+    )
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    result_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    patient_id = Column(GUID, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
+    tech_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    request_id = Column(GUID, ForeignKey("lab_requests.request_id", ondelete="SET NULL"), nullable=True, index=True)
 
     observations = Column(Text)
     conclusion = Column(Text)
@@ -200,14 +296,38 @@ class LaboratoryResult(Base):
     hospital = relationship("Hospital", back_populates="lab_results")
     patient = relationship("Patient", back_populates="lab_results")
     tech = relationship("Worker", back_populates="lab_results")
+    request = relationship("LaboratoryRequest", back_populates="results")
+
+class LabQueueStats(Base):
+    # running counters per hospital, adjusted in the same transaction as each
+    # request state change so the queue metrics never need a scan
+    __tablename__ = "lab_queue_stats"
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"), primary_key=True)
+    pending_count = Column(Integer, nullable=False, default=0)
+    in_progress_count = Column(Integer, nullable=False, default=0)
+    resulted_count = Column(Integer, nullable=False, default=0)
+    turnaround_seconds = Column(Float, nullable=False, default=0)
+    updated_at = Column(DateTime, default=datetime.now, onupdate=datetime.now)
+
+    hospital = relationship("Hospital", back_populates="lab_queue_stats")
 
 class Appointment(Base):
     __tablename__ = "appointments"
-    appointment_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    patient_id = Column(String, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
-    consultant_id = Column(String, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
-    service_id = Column(String, ForeignKey("services.service_id", ondelete="RESTRICT"))
+    __table_args__ = (
+        Index("ix_appointments_hospital_date_added", "hospital_id", "date_added"),
+        Index("ix_appointments_hospital_patient_requested", "hospital_id", "patient_id", "date_requested"),
+        Index("ix_appointments_hospital_date_requested", "hospital_id", "date_requested", "time_requested"),
+        # one booking per consultant per slot; concurrent double bookings fail here
+        Index(
+            "ux_appointments_consultant_slot",
+            "consultant_id", "date_requested", "time_requested", unique=True
+        ),
+    )
+    appointment_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    patient_id = Column(GUID, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
+    consultant_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    service_id = Column(GUID, ForeignKey("services.service_id", ondelete="RESTRICT"))
 
     appointment_desc = Column(Text)
     date_requested = Column(Date)
@@ -223,12 +343,36 @@ class Appointment(Base):
     consultant = relationship("Worker", back_populates="appointments")
     service = relationship("Service", back_populates="appointments")
 
+class ConsultantAvailability(Base):
+    __tablename__ = "consultant_availability"
+    __table_args__ = (
+        Index("ix_consultant_availability_consultant_weekday", "consultant_id", "weekday"),
+    )
+    availability_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"), nullable=False)
+    consultant_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="CASCADE"), nullable=False)
+    weekday = Column(Integer, nullable=False)
+    start_time = Column(Time, nullable=False)
+    end_time = Column(Time, nullable=False)
+    slot_minutes = Column(Integer, nullable=False, default=30)
+    date_added = Column(DateTime, default=current_date)
+    updated_at = Column(DateTime, default=current_date, onupdate=current_date)
+
+    is_synced = Column(Boolean, default=False)
+    is_deleted = Column(Boolean, default=False)
+
+    hospital = relationship("Hospital", back_populates="consultant_availability")
+    consultant = relationship("Worker", back_populates="availability")
+
 class Prescription(Base):
     __tablename__ = "prescriptions"
-    prescription_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    patient_id = Column(String, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
-    prescriber_id = Column(String, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
+    __table_args__ = (
+        Index("ix_prescriptions_hospital_patient", "hospital_id", "patient_id", "date_added"),
+    )
+    prescription_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    patient_id = Column(GUID, ForeignKey("patients.patient_id", ondelete="RESTRICT"))
+    prescriber_id = Column(GUID, ForeignKey("workers.worker_id", ondelete="RESTRICT"))
     date_added = Column(DateTime, default=current_date)
     updated_at = Column(DateTime, default=current_date, onupdate=current_date)
 
@@ -242,9 +386,9 @@ class Prescription(Base):
 
 class PrescriptionItem(Base):
     __tablename__ = "prescription_items"
-    item_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    prescription_id = Column(String, ForeignKey("prescriptions.prescription_id", ondelete="RESTRICT"))
-    drug_id = Column(String, ForeignKey("drugs.drug_id", ondelete="RESTRICT"))
+    item_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    prescription_id = Column(GUID, ForeignKey("prescriptions.prescription_id", ondelete="RESTRICT"), index=True)
+    drug_id = Column(GUID, ForeignKey("drugs.drug_id", ondelete="RESTRICT"))
     drug_qty = Column(Integer)
     notes = Column(Text, nullable=True)
     updated_at = Column(DateTime, default=current_date, onupdate=current_date)
@@ -257,9 +401,13 @@ class PrescriptionItem(Base):
 
 class Billing(Base):
     __tablename__ = "billings"
-    billing_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"), nullable=False)
-    patient_id = Column(String, ForeignKey("patients.patient_id"), nullable=True)
+    __table_args__ = (
+        Index("ix_billings_hospital_created_at", "hospital_id", "created_at"),
+        Index("ix_billings_hospital_patient", "hospital_id", "patient_id", "created_at"),
+    )
+    billing_id = Column(GUID, primary_key=True, default=new_id, index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"), nullable=False)
+    patient_id = Column(GUID, ForeignKey("patients.patient_id"), nullable=True)
     source = Column(String, nullable=True)
     item = Column(String, nullable=True)
     total = Column(Float, default=0)
@@ -274,8 +422,8 @@ class Billing(Base):
 
 class Expiry(Base):
     __tablename__ = "expiry"
-    hospital_id = Column(String, ForeignKey("hospitals.hospital_id"))
-    expiry_id = Column(String, primary_key=True, default=lambda: str(uuid4()), index=True)
+    hospital_id = Column(GUID, ForeignKey("hospitals.hospital_id"))
+    expiry_id = Column(GUID, primary_key=True, default=new_id, index=True)
     expiry_date = Column(DateTime, default=expiry_date)
     updated_at = Column(DateTime, default=current_date, onupdate=current_date)
 
@@ -283,3 +431,26 @@ class Expiry(Base):
     is_deleted = Column(Boolean, default=False)
 
     hospital = relationship("Hospital", back_populates="expiry")
+
+class RateLimitBucket(Base):
+    # shared token buckets, only used when NEPTUNE_RATE_LIMIT_STORE=db so that
+    # several workers draw from the same per-tenant allowance
+    __tablename__ = "rate_limit_buckets"
+    bucket_key = Column(String, primary_key=True)
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False)
+
+class SyncTombstone(Base):
+    # rows deleted since the last replication; a hard delete leaves nothing
+    # behind for the other side to notice otherwise
+    __tablename__ = "sync_tombstones"
+    tombstone_id = Column(GUID, primary_key=True, default=new_id)
+    table_name = Column(String, nullable=False)
+    row_id = Column(String, nullable=False)
+    hospital_id = Column(GUID, nullable=True)
+    deleted_at = Column(DateTime, default=datetime.now, index=True)
+
+class SyncState(Base):
+    __tablename__ = "sync_state"
+    state_key = Column(String, primary_key=True)
+    state_value = Column(String)
@@ -0,0 +1,224 @@
+import argparse
+import asyncio
+from datetime import date
+from sqlalchemy import text, inspect
+from config import engine
+from database.models import Base
+
+# Monthly range partitioning for the append-mostly history tables (Postgres
+# only, opt-in through convert). Appointments are split on the day they are
+# booked for so the one-booking-per-slot unique index can include the key.
+PARTITION_KEYS = {
+    "billings": "created_at",
+    "appointments": "date_requested",
+    "diagnosis": "date_added",
+    "lab_requests": "date_added",
+    "lab_results": "date_added",
+}
+MONTHS_AHEAD = 3
+DETACH_LOCK_TIMEOUT = "2s"
+
+def month_start(day: date):
+    return date(day.year, day.month, 1)
+
+def add_months(day: date, months: int):
+    index = day.year * 12 + day.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+def partition_name(table: str, month: date):
+    return f"{table}_y{month.year}m{month.month:02d}"
+
+def is_partitioned(conn, table: str):
+    result = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE relname = :table AND relkind IN ('r', 'p')"),
+        {"table": table},
+    )
+    return result.scalar() == "p"
+
+def create_month_partition(conn, table: str, month: date):
+    conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, month)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+    ))
+
+def default_partition(table: str):
+    return f"{table}_default"
+
+def fill_from_default(conn, table: str, month: date):
+    # Rows booked past the newest month went to the default partition, and
+    # Postgres refuses a new partition whose range the default already holds.
+    # Take the default out, add the month, move its rows over, put it back.
+    key = PARTITION_KEYS[table]
+    default = default_partition(table)
+    in_month = f"{key} >= :start AND {key} < :end"
+    bounds = {"start": month, "end": add_months(month, 1)}
+    conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {default}"))
+    create_month_partition(conn, table, month)
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {default} WHERE {in_month}"), bounds)
+    conn.execute(text(f"DELETE FROM {default} WHERE {in_month}"), bounds)
+    conn.execute(text(f"ALTER TABLE {table} ATTACH PARTITION {default} DEFAULT"))
+
+def in_default(conn, table: str, month: date):
+    default = default_partition(table)
+    if not conn.execute(text("SELECT to_regclass(:name)"), {"name": default}).scalar():
+        return False
+    key = PARTITION_KEYS[table]
+    return conn.execute(
+        text(f"SELECT EXISTS (SELECT 1 FROM {default} WHERE {key} >= :start AND {key} < :end)"),
+        {"start": month, "end": add_months(month, 1)},
+    ).scalar()
+
+def ensure_partitions(conn, months_ahead: int = MONTHS_AHEAD, today: date = None):
+    if conn.dialect.name != "postgresql":
+        return []
+    first = month_start(today or date.today())
+    created = []
+    for table in PARTITION_KEYS:
+        if not is_partitioned(conn, table):
+            continue
+        added = []
+        try:
+            # a savepoint per table, so one failure leaves the others' new months in place
+            with conn.begin_nested():
+                for offset in range(months_ahead + 1):
+                    month = add_months(first, offset)
+                    name = partition_name(table, month)
+                    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar():
+                        continue
+                    if in_default(conn, table, month):
+                        fill_from_default(conn, table, month)
+                    else:
+                        create_month_partition(conn, table, month)
+                    added.append(name)
+        except Exception as e:
+            print(f"Could not add partitions to {table}, will retry later: ", e)
+            continue
+        created.extend(added)
+    return created
+
+def convert_table(conn, table: str, months_ahead: int = MONTHS_AHEAD):
+    # One-off rewrite of a plain table into a partitioned one. It copies every
+    # row under an exclusive lock, so run it in a maintenance window.
+    key = PARTITION_KEYS[table]
+    if is_partitioned(conn, table):
+        print(f"{table} is already partitioned")
+        return
+    model = Base.metadata.tables[table]
+    primary_key = [column.name for column in model.primary_key.columns]
+    inspector = inspect(conn)
+    outgoing = inspector.get_foreign_keys(table)
+    incoming = [
+        (other, fk) for other in inspector.get_table_names() if other != table
+        for fk in inspector.get_foreign_keys(other) if fk["referred_table"] == table
+    ]
+
+    # the key is part of the primary key, so it cannot stay NULL
+    filled = conn.execute(text(
+        f"UPDATE {table} SET {key} = COALESCE(updated_at, CURRENT_TIMESTAMP) WHERE {key} IS NULL"
+    )).rowcount
+    if filled:
+        print(f"{table}: set {key} from updated_at on {filled} rows where it was empty")
+
+    bounds = conn.execute(text(f"SELECT min({key}), max({key}) FROM {table}")).one()
+    staging = f"{table}_unpartitioned"
+    conn.execute(text(f"ALTER TABLE {table} RENAME TO {staging}"))
+    conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {staging} INCLUDING DEFAULTS) PARTITION BY RANGE ({key})"
+    ))
+    conn.execute(text(f"CREATE TABLE {default_partition(table)} PARTITION OF {table} DEFAULT"))
+    first = month_start(bounds[0] or date.today())
+    last = add_months(month_start(date.today()), months_ahead)
+    if bounds[1] and month_start(bounds[1]) > last:
+        last = month_start(bounds[1])
+    month = first
+    while month <= last:
+        create_month_partition(conn, table, month)
+        month = add_months(month, 1)
+    conn.execute(text(f"INSERT INTO {table} SELECT * FROM {staging}"))
+    conn.execute(text(f"DROP TABLE {staging} CASCADE"))
+
+    # a unique constraint on a partitioned table must include the key
+    conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY ({', '.join(primary_key + [key])})"))
+    for index in model.indexes:
+        index.create(conn)
+    for fk in outgoing:
+        add_foreign_key(conn, table, fk)
+    for other, fk in incoming:
+        # nothing can reference a partitioned table by its id alone; the ORM
+        # still clears these references itself on delete
+        print(f"Dropped foreign key {other}.{', '.join(fk['constrained_columns'])} -> {table}")
+
+def add_foreign_key(conn, table: str, fk: dict):
+    ondelete = fk.get("options", {}).get("ondelete")
+    conn.execute(text(
+        f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" '
+        f'FOREIGN KEY ({", ".join(fk["constrained_columns"])}) '
+        f'REFERENCES {fk["referred_table"]} ({", ".join(fk["referred_columns"])})'
+        + (f" ON DELETE {ondelete}" if ondelete else "")
+    ))
+
+def convert_tables(conn, tables=None):
+    if conn.dialect.name != "postgresql":
+        print("Table partitioning is only supported on Postgres")
+        return
+    for table in tables or PARTITION_KEYS:
+        convert_table(conn, table)
+
+def monthly_partitions(conn, table: str):
+    result = conn.execute(text(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class parent ON parent.oid = pg_inherits.inhparent "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE parent.relname = :table ORDER BY child.relname"
+    ), {"table": table})
+    return [name for name in result.scalars() if name != default_partition(table)]
+
+async def detach_partitions(before: date, tables=None):
+    # Detaching only edits the catalog, but it still needs a brief exclusive
+    # lock on the parent; a short lock_timeout makes it give up rather than
+    # queue behind long reads. Detached months stay as standalone tables for
+    # archiving or dropping.
+    detached = []
+    for table in tables or PARTITION_KEYS:
+        async with engine.begin() as conn:
+            if not await conn.run_sync(is_partitioned, table):
+                continue
+            names = await conn.run_sync(monthly_partitions, table)
+        for name in names:
+            if name >= partition_name(table, month_start(before)):
+                continue
+            try:
+                async with engine.begin() as conn:
+                    await conn.execute(text(f"SET LOCAL lock_timeout = '{DETACH_LOCK_TIMEOUT}'"))
+                    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                detached.append(name)
+            except Exception as e:
+                print(f"Could not detach {name}, will retry later: ", e)
+    return detached
+
+async def maintain_partitions():
+    if engine.dialect.name != "postgresql":
+        return
+    async with engine.begin() as conn:
+        created = await conn.run_sync(ensure_partitions)
+    if created:
+        print("Created partitions: ", ", ".join(created))
+
+async def convert_database(tables=None):
+    async with engine.begin() as conn:
+        await conn.run_sync(convert_tables, tables)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage monthly partitions of the history tables")
+    parser.add_argument("action", choices=["convert", "ensure", "detach"])
+    parser.add_argument("--tables", nargs="*", choices=sorted(PARTITION_KEYS))
+    parser.add_argument("--before", type=date.fromisoformat, help="detach months before this date")
+    args = parser.parse_args()
+    if args.action == "convert":
+        asyncio.run(convert_database(args.tables))
+    elif args.action == "ensure":
+        asyncio.run(maintain_partitions())
+    else:
+        if not args.before:
+            parser.error("detach needs --before")
+        print("Detached: ", asyncio.run(detach_partitions(args.before, args.tables)))
@@ -0,0 +1,17 @@
+VIEWS = ("summary", "detail")
+
+def project(columns, view: str = "detail", fields: str = None, summary=(), required=()):
+    by_key = {column.key: column for column in columns}
+    if fields:
+        keys = [field.strip() for field in fields.split(",") if field.strip()]
+        unknown = [key for key in keys if key not in by_key]
+        if unknown:
+            raise ValueError(f"unknown fields: {', '.join(unknown)}")
+    elif view == "summary":
+        keys = list(summary)
+    elif view == "detail":
+        keys = list(by_key)
+    else:
+        raise ValueError(f"view must be one of: {', '.join(VIEWS)}")
+    keys = [key for key in required if key not in keys] + keys
+    return [by_key[key] for key in keys]
@@ -0,0 +1,344 @@
+import os
+from datetime import datetime, timedelta
+from sqlalchemy import event, select, update, delete, bindparam, or_, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+from config import async_session, CENTRAL_DATABASE_URL, LOCAL_MODE
+from database.models import Base, Hospital, SyncTombstone, SyncState
+from database.local import writer_lock
+from database.actions.lab_queue import recount_queue_stats
+from database.actions.drugs import scan_drug_alerts
+
+# Rows carry is_synced: anything written locally is False until the
+# replicator has pushed it. Pulls never overwrite a row that is still
+# waiting to be pushed, so the clinic's latest edit wins until it has been
+# sent, and the last push wins on the central side.
+SYNC_SECONDS = int(os.getenv("NEPTUNE_SYNC_SECONDS", "60"))
+SYNC_BATCH = 500
+# updated_at only holds a day, so each pull re-reads a day of overlap
+PULL_OVERLAP = timedelta(days=1)
+SYNC_HOSPITALS = [hid for hid in os.getenv("NEPTUNE_SYNC_HOSPITALS", "").split(",") if hid]
+# a central database that local sites pull from sets NEPTUNE_SYNC_TRACKING
+# (after init_db has created sync_tombstones) so its deletes reach them too
+SYNC_TRACKING = LOCAL_MODE or os.getenv("NEPTUNE_SYNC_TRACKING", "") in ("1", "true", "yes")
+SYNCED_TABLES = [table for table in Base.metadata.sorted_tables if "is_synced" in table.c]
+# lab_queue_stats and drug_alerts are not replicated: both are derived from
+# replicated tables, and each side rebuilds them after rows arrive
+ALERT_SOURCES = {"drugs", "drug_lots"}
+SYNCED_BY_NAME = {table.name: table for table in SYNCED_TABLES}
+
+def primary_key(table):
+    return next(iter(table.primary_key.columns))
+
+def track_changes(session, flush_context, instances):
+    for obj in session.dirty:
+        state = inspect(obj)
+        if "is_synced" not in state.mapper.columns or not session.is_modified(obj, include_collections=False):
+            continue
+        if not state.attrs.is_synced.history.has_changes():
+            obj.is_synced = False
+    for obj in session.deleted:
+        state = inspect(obj)
+        if "is_synced" in state.mapper.columns:
+            session.add(SyncTombstone(
+                table_name=state.mapper.local_table.name,
+                row_id=str(state.identity[0]),
+                hospital_id=getattr(obj, "hospital_id", None),
+            ))
+
+def track_bulk_changes(orm_execute_state):
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    if not orm_execute_state.execution_options.get("track_changes", True):
+        return
+    statement = orm_execute_state.statement
+    table = statement.table
+    if table.name not in SYNCED_BY_NAME:
+        return
+    if orm_execute_state.is_update:
+        orm_execute_state.statement = statement.values(is_synced=False)
+        return
+    columns = [primary_key(table)] + ([table.c.hospital_id] if "hospital_id" in table.c else [])
+    doomed = orm_execute_state.session.execute(select(*columns).where(statement.whereclause))
+    orm_execute_state.session.add_all([
+        SyncTombstone(table_name=table.name, row_id=str(row[0]), hospital_id=row[1] if len(row) > 1 else None)
+        for row in doomed
+    ])
+
+if SYNC_TRACKING:
+    event.listen(Session, "before_flush", track_changes)
+    event.listen(Session, "do_orm_execute", track_bulk_changes)
+
+
+class Replicator:
+    def __init__(self):
+        self.central = None
+        self.key_columns = {}
+
+    def central_engine(self):
+        if not CENTRAL_DATABASE_URL:
+            raise RuntimeError("NEPTUNE_CENTRAL_DATABASE_URL is not set")
+        if self.central is None:
+            self.central = create_async_engine(CENTRAL_DATABASE_URL, pool_pre_ping=True)
+        return self.central
+
+    async def conflict_keys(self, conn, table):
+        # the primary key as the database has it: a partitioned table's also
+        # holds its partition column, and ON CONFLICT must name all of them
+        cache_key = (conn.dialect.name, table.name)
+        if cache_key not in self.key_columns:
+            constraint = await conn.run_sync(lambda sync_conn: inspect(sync_conn).get_pk_constraint(table.name))
+            self.key_columns[cache_key] = constraint["constrained_columns"] or [primary_key(table).name]
+        return self.key_columns[cache_key]
+
+    def upsert(self, dialect: str, table, keys: list, keep_unsynced: bool = False):
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        stmt = insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=keys,
+            set_={column.name: stmt.excluded[column.name] for column in table.c if column.name not in keys},
+            # a pulled row never replaces a local edit that is still unsent
+            where=table.c.is_synced.is_not(False) if keep_unsynced else None,
+        )
+
+    async def drop_moved_rows(self, conn, table, keys: list, rows: list):
+        # with the partition column in the key, a row whose date was edited
+        # would be inserted next to its old copy instead of replacing it
+        key = primary_key(table)
+        others = [table.c[name] for name in keys if name != key.name]
+        if not others:
+            return
+        await conn.execute(
+            delete(table).where(
+                (key == bindparam("moved_id", type_=key.type)) &
+                or_(*(column.is_distinct_from(bindparam(f"moved_{column.name}", type_=column.type)) for column in others))
+            ),
+            [{"moved_id": row[key.name], **{f"moved_{column.name}": row[column.name] for column in others}} for row in rows],
+        )
+
+    async def write_rows(self, conn, table, rows: list, keep_unsynced: bool = False):
+        # Upserts a batch and returns the rows that made it in. A row that
+        # collides on another unique index (an email, a booked slot) is
+        # skipped and logged, so it cannot hold up the rest of the batch.
+        keys = await self.conflict_keys(conn, table)
+        stmt = self.upsert(conn.dialect.name, table, keys, keep_unsynced)
+        rows = [{**row, "is_synced": True} for row in rows]
+        try:
+            async with conn.begin_nested():
+                await self.drop_moved_rows(conn, table, keys, rows)
+                await conn.execute(stmt, rows)
+            return rows
+        except IntegrityError:
+            pass
+        written = []
+        for row in rows:
+            try:
+                async with conn.begin_nested():
+                    await self.drop_moved_rows(conn, table, keys, [row])
+                    await conn.execute(stmt, [row])
+                written.append(row)
+            except IntegrityError as e:
+                print(f"Skipped {table.name} row {row[primary_key(table).name]}: ", e.orig)
+        return written
+
+    async def push_table(self, table, after=None):
+        # pages through unsynced rows by key, so rows skipped in one batch
+        # (left unsynced) do not come back ahead of the rest in the next;
+        # returns (rows read, rows written, last key read)
+        key = primary_key(table)
+        stmt = (
+            select(table)
+            .where(or_(table.c.is_synced.is_(False), table.c.is_synced.is_(None)))
+            .order_by(key)
+            .limit(SYNC_BATCH)
+        )
+        if after is not None:
+            stmt = stmt.where(key > after)
+        async with async_session() as session:
+            result = await session.execute(stmt)
+            rows = [dict(row) for row in result.mappings()]
+        if not rows:
+            return 0, 0, after
+        last = rows[-1][key.name]
+        async with self.central_engine().begin() as conn:
+            written = await self.write_rows(conn, table, rows)
+        if not written:
+            return len(rows), 0, last
+
+        # only mark rows that still hold what was pushed; one edited in the
+        # meantime stays unsynced and goes out with the next batch, as does
+        # one that was skipped
+        unchanged = [
+            column.is_not_distinct_from(bindparam(f"pushed_{column.name}", type_=column.type))
+            for column in table.c if column.name != "is_synced"
+        ]
+        async with async_session.begin() as session:
+            await session.execute(
+                update(table).where(*unchanged).values(is_synced=True)
+                .execution_options(track_changes=False),
+                [{f"pushed_{name}": value for name, value in row.items() if name != "is_synced"} for row in written],
+            )
+        return len(rows), len(written), last
+
+    async def push_deletes(self):
+        async with async_session() as session:
+            result = await session.execute(
+                select(SyncTombstone).order_by(SyncTombstone.deleted_at).limit(SYNC_BATCH)
+            )
+            tombstones = result.scalars().all()
+        if not tombstones:
+            return 0, set()
+        central = self.central_engine()
+        insert = postgresql.insert if central.dialect.name == "postgresql" else sqlite.insert
+        async with central.begin() as conn:
+            # children first, so a delete never trips a foreign key
+            for table in reversed(SYNCED_TABLES):
+                ids = [t.row_id for t in tombstones if t.table_name == table.name]
+                if ids:
+                    await conn.execute(delete(table).where(primary_key(table).in_(ids)))
+            await conn.execute(
+                insert(SyncTombstone.__table__).on_conflict_do_nothing(index_elements=["tombstone_id"]),
+                [
+                    {column.name: getattr(t, column.key) for column in SyncTombstone.__table__.c}
+                    for t in tombstones
+                ],
+            )
+        async with async_session.begin() as session:
+            await session.execute(
+                delete(SyncTombstone)
+                .where(SyncTombstone.tombstone_id.in_([t.tombstone_id for t in tombstones]))
+                .execution_options(track_changes=False)
+            )
+        return len(tombstones), {t.table_name for t in tombstones}
+
+    async def push(self):
+        pushed = 0
+        requests_pushed = False
+        for table in SYNCED_TABLES:
+            after = None
+            while True:
+                read, written, after = await self.push_table(table, after)
+                pushed += written
+                requests_pushed |= bool(written) and table.name == "lab_requests"
+                if read < SYNC_BATCH:
+                    break
+        while True:
+            count, tables = await self.push_deletes()
+            pushed += count
+            requests_pushed |= "lab_requests" in tables
+            if count < SYNC_BATCH:
+                break
+        if requests_pushed:
+            async with self.central_engine().begin() as conn:
+                await recount_queue_stats(conn, await self.local_hospitals())
+        return pushed
+
+    def hospital_scope(self, table, hospital_ids: list):
+        if "hospital_id" in table.c:
+            return table.c.hospital_id.in_(hospital_ids)
+        for fk in table.foreign_keys:
+            parent = fk.column.table
+            if "hospital_id" in parent.c:
+                return fk.parent.in_(select(fk.column).where(parent.c.hospital_id.in_(hospital_ids)))
+        raise ValueError(f"{table.name} cannot be scoped to a hospital")
+
+    async def load_state(self, key: str):
+        async with async_session() as session:
+            state = await session.get(SyncState, key)
+            return state.state_value if state else None
+
+    async def save_state(self, key: str, value: str):
+        async with async_session.begin() as session:
+            await session.merge(SyncState(state_key=key, state_value=value))
+
+    async def local_hospitals(self):
+        if SYNC_HOSPITALS:
+            return SYNC_HOSPITALS
+        async with async_session() as session:
+            return (await session.execute(select(Hospital.hospital_id))).scalars().all()
+
+    async def rebuild_derived(self, hospital_ids: list, changed: set):
+        if "lab_requests" in changed:
+            await writer_lock.acquire()
+            try:
+                async with async_session.begin() as session:
+                    await recount_queue_stats(await session.connection(), hospital_ids)
+            finally:
+                writer_lock.release()
+        if changed & ALERT_SOURCES:
+            for hospital_id in hospital_ids:
+                await scan_drug_alerts(hospital_id)
+
+    async def pull(self):
+        hospital_ids = await self.local_hospitals()
+        if not hospital_ids:
+            print("Nothing to pull; set NEPTUNE_SYNC_HOSPITALS to seed a new local database")
+            return 0
+
+        started = datetime.now()
+        last_pull = await self.load_state("pulled_at")
+        since = datetime.fromisoformat(last_pull) - PULL_OVERLAP if last_pull else None
+        pulled = 0
+        changed = set()
+        central = self.central_engine()
+        async with central.connect() as conn:
+            for table in SYNCED_TABLES:
+                stmt = select(table).where(self.hospital_scope(table, hospital_ids))
+                if since:
+                    stmt = stmt.where(table.c.updated_at >= since.date())
+                result = await conn.stream(stmt)
+                async for batch in result.mappings().partitions(SYNC_BATCH):
+                    rows = [dict(row) for row in batch]
+                    # the upserts run on the session's connection, which
+                    # LocalSession does not see, so take the writer lock here
+                    await writer_lock.acquire()
+                    try:
+                        async with async_session.begin() as session:
+                            await self.write_rows(await session.connection(), table, rows, keep_unsynced=True)
+                    finally:
+                        writer_lock.release()
+                    pulled += len(rows)
+                    changed.add(table.name)
+
+            stmt = select(SyncTombstone.__table__).where(
+                or_(SyncTombstone.hospital_id.in_(hospital_ids), SyncTombstone.hospital_id.is_(None))
+            )
+            if since:
+                stmt = stmt.where(SyncTombstone.deleted_at >= since)
+            tombstones = (await conn.execute(stmt)).all()
+
+        async with async_session.begin() as session:
+            for table in reversed(SYNCED_TABLES):
+                ids = [t.row_id for t in tombstones if t.table_name == table.name]
+                if ids:
+                    await session.execute(
+                        delete(table)
+                        .where(primary_key(table).in_(ids) & table.c.is_synced.is_not(False))
+                        .execution_options(track_changes=False)
+                    )
+                    changed.add(table.name)
+        await self.rebuild_derived(hospital_ids, changed)
+        await self.save_state("pulled_at", started.isoformat())
+        return pulled
+
+    async def sync(self):
+        if not LOCAL_MODE or not CENTRAL_DATABASE_URL:
+            return
+        try:
+            pushed = await self.push()
+            pulled = await self.pull()
+        except Exception as e:
+            print("Replication failed, will retry: ", e)
+            return
+        if pushed:
+            print(f"Replication pushed {pushed} rows, pulled {pulled}")
+
+    async def stop(self):
+        if self.central is not None:
+            await self.central.dispose()
+            self.central = None
+
+
+replicator = Replicator()
@@ -0,0 +1,39 @@
+import asyncio
+
+
+class Scheduler:
+    # Runs registered coroutines on fixed intervals inside the app's event loop.
+    # Each job runs once at start-up and then every `seconds`; a failing run is
+    # logged and retried on the next tick instead of stopping the job.
+    def __init__(self):
+        self.jobs = []
+        self.tasks = []
+
+    def every(self, seconds: float, job, name: str = None):
+        self.jobs.append((seconds, job, name or job.__name__))
+        return job
+
+    async def run(self, seconds, job, name):
+        while True:
+            try:
+                await job()
+            except Exception as e:
+                print("Scheduled job failed: ", name, e)
+            await asyncio.sleep(seconds)
+
+    def start(self):
+        if self.tasks:
+            return
+        self.tasks = [
+            asyncio.ensure_future(self.run(seconds, job, name))
+            for seconds, job, name in self.jobs
+        ]
+
+    async def stop(self):
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        self.tasks = []
+
+
+scheduler = Scheduler()
@@ -0,0 +1,369 @@
+import argparse
+import asyncio
+import random
+import time as clock
+from datetime import datetime, date, time, timedelta
+
+from sqlalchemy import insert
+
+from config import engine
+from database.models import (
+    Base, Hospital, Worker, Patient, Drug, DrugLot, Service,
+    Diagnosis, LaboratoryTest, LaboratoryRequest, LaboratoryResult,
+    Appointment, Prescription, PrescriptionItem, Billing, LabQueueStats
+)
+from database.ids import uuid7
+from database.utils import hash_pwd, normalize_gender
+
+FIRST_NAMES = [
+    "Brian", "Mercy", "Kevin", "Faith", "Dennis", "Grace", "Collins", "Joy",
+    "Victor", "Esther", "Samuel", "Mary", "Daniel", "Ann", "Peter", "Jane",
+    "John", "Caroline", "James", "Sharon", "Joseph", "Ruth", "David", "Lucy",
+    "Stephen", "Purity", "Felix", "Winnie", "Emmanuel", "Naomi", "Moses", "Ivy",
+]
+LAST_NAMES = [
+    "Otieno", "Wanjiku", "Kamau", "Achieng", "Mwangi", "Njoroge", "Ochieng",
+    "Kiprono", "Wambui", "Mutua", "Kariuki", "Onyango", "Chebet", "Kimani",
+    "Omondi", "Njeri", "Mohamed", "Wafula", "Barasa", "Korir", "Nyambura",
+    "Maina", "Odhiambo", "Akinyi", "Cheruiyot", "Muthoni", "Ndungu", "Were",
+]
+PHONE_PREFIXES = [("07", 0.72), ("01", 0.23), ("+2547", 0.05)]
+GENDERS = [("Male", 0.48), ("Female", 0.5), ("male", 0.01), ("female", 0.01)]
+BLOOD_TYPES = [
+    ("O+", 0.45), ("A+", 0.25), ("B+", 0.2), ("AB+", 0.04),
+    ("O-", 0.03), ("A-", 0.02), ("B-", 0.007), ("AB-", 0.003),
+]
+CHRONIC_CONDITIONS = [
+    ("Null", 0.78), ("Hypertension", 0.09), ("Diabetes", 0.06),
+    ("Asthma", 0.04), ("HIV", 0.03),
+]
+DRUG_CATEGORIES = [
+    "Antibiotic", "Analgesic", "Antimalarial", "Antihypertensive",
+    "Antidiabetic", "Antihistamine", "Supplement", "Antiretroviral",
+]
+DRUG_NAMES = [
+    "Amoxicillin", "Paracetamol", "Ibuprofen", "Artemether", "Metformin",
+    "Amlodipine", "Cetirizine", "Ciprofloxacin", "Doxycycline", "Omeprazole",
+    "Losartan", "Salbutamol", "Ferrous Sulphate", "Folic Acid", "Zinc",
+    "Tenofovir", "Metronidazole", "Diclofenac", "Prednisolone", "Insulin",
+]
+SERVICES = [
+    ("General Consultation", 500), ("Specialist Consultation", 1500),
+    ("Antenatal Visit", 800), ("Dental Checkup", 1200),
+    ("Physiotherapy", 2000), ("Eye Examination", 1000),
+]
+LAB_TESTS = [
+    ("Full Haemogram", 800), ("Malaria BS", 300), ("Urinalysis", 400),
+    ("Blood Sugar", 250), ("Lipid Profile", 1800), ("HIV Test", 0),
+    ("Widal Test", 500), ("Liver Function", 2200),
+]
+# history is laid out backwards from this day, so a seed gives the same rows
+# whenever it is run; pass --anchor to build data around another day
+ANCHOR_DATE = date(2026, 1, 1)
+UNIX_EPOCH = datetime(1970, 1, 1)
+WORKER_ROLES = [("Doctor", 0.35), ("Nurse", 0.35), ("Lab Tech", 0.15), ("Pharmacist", 0.1), ("Receptionist", 0.05)]
+
+class Generator:
+    def __init__(self, seed: int, years: int, today: date = ANCHOR_DATE):
+        self.rng = random.Random(seed)
+        self.years = years
+        self.today = today
+        self.start = self.today - timedelta(days=365 * years)
+        self.first_weights = self._zipf(len(FIRST_NAMES))
+        self.last_weights = self._zipf(len(LAST_NAMES))
+        # (consultant, day, time) slots already booked; appointments are unique per slot
+        self.booked = set()
+
+    def _zipf(self, n: int, s: float = 1.1):
+        return [1 / (rank ** s) for rank in range(1, n + 1)]
+
+    def _pick(self, weighted):
+        values, weights = zip(*weighted)
+        return self.rng.choices(values, weights)[0]
+
+    def uid(self, at: datetime = None):
+        # time-ordered like new_id(), stamped with the row's own date, so the
+        # keys sort the way production keys would have; only the tail is
+        # random, so anything that must be unique is built from that
+        at = at or datetime.combine(self.start, time.min)
+        return str(uuid7((at - UNIX_EPOCH) // timedelta(milliseconds=1), self.rng.getrandbits(80)))
+
+    def name(self):
+        first = self.rng.choices(FIRST_NAMES, self.first_weights)[0]
+        last = self.rng.choices(LAST_NAMES, self.last_weights)[0]
+        return f"{first} {last}"
+
+    def phone(self):
+        prefix = self._pick(PHONE_PREFIXES)
+        return f"{prefix}{self.rng.randrange(10 ** 8):08d}"
+
+    def moment(self, after: datetime = None):
+        # volume grows over time, so bias history towards recent dates;
+        # timestamps are stored at midnight like database.utils.current_date
+        lower = after or datetime.combine(self.start, time.min)
+        span = (datetime.combine(self.today, time.min) - lower).days
+        offset = int(span * (self.rng.random() ** 0.7))
+        return lower + timedelta(days=offset)
+
+    def dob(self):
+        age = min(max(self.rng.gauss(32, 20), 0), 95)
+        return self.today - timedelta(days=int(age * 365.25) + self.rng.randrange(365))
+
+    def hospital_sizes(self, hospitals: int, patients: int):
+        weights = [self.rng.paretovariate(1.16) for _ in range(hospitals)]
+        total = sum(weights)
+        return [max(1, int(patients * w / total)) for w in weights]
+
+    def tenant(self, index: int, patient_count: int, password: str):
+        hospital_id = self.uid()
+        opened = datetime.combine(self.start, time.min)
+        rows = {table: [] for table in TABLE_ORDER}
+        self.queue = dict(pending=0, in_progress=0, resulted=0, turnaround=0.0)
+        rows["hospitals"].append(dict(
+            hospital_id=hospital_id,
+            hospital_name=f"Synthetic Hospital {index + 1}",
+            hospital_email=f"hospital{index + 1}@synthetic.neptunehms.com",
+            hospital_contact=self.phone(),
+            hospital_password=password,
+            diagnosis_fee=self.rng.choice([300, 500, 800, 1000]),
+            expiry_date=datetime.combine(self.today, time.min) + timedelta(days=365),
+            date_added=opened,
+            updated_at=opened,
+        ))
+
+        workers = {role: [] for role, _ in WORKER_ROLES}
+        for _ in range(max(5, patient_count // 400)):
+            worker_id = self.uid()
+            role = self._pick(WORKER_ROLES)
+            workers[role].append(worker_id)
+            rows["workers"].append(dict(
+                worker_id=worker_id, hospital_id=hospital_id, worker_name=self.name(),
+                worker_email=f"{worker_id[-12:]}@synthetic.neptunehms.com", worker_phone=self.phone(),
+                worker_password=password, worker_role=role,
+                date_added=opened, updated_at=opened,
+            ))
+        doctors = workers["Doctor"] or [rows["workers"][0]["worker_id"]]
+        techs = workers["Lab Tech"] or doctors
+
+        services = []
+        for service_name, price in SERVICES:
+            service = dict(
+                service_id=self.uid(), hospital_id=hospital_id, service_name=service_name,
+                service_price=price, service_desc=f"{service_name} service",
+                date_added=opened, updated_at=opened,
+            )
+            services.append(service)
+            rows["services"].append(service)
+
+        tests = []
+        for test_name, price in LAB_TESTS:
+            test = dict(
+                test_id=self.uid(), hospital_id=hospital_id, test_name=test_name,
+                test_price=price, test_desc=f"{test_name} test",
+                date_added=opened, updated_at=opened,
+            )
+            tests.append(test)
+            rows["lab_tests"].append(test)
+
+        drugs = []
+        for _ in range(max(20, patient_count // 200)):
+            added = self.moment()
+            # most stock is valid, a long tail is already expired or expiring soon
+            expiry = datetime.combine(self.today, time.min) + timedelta(days=int(self.rng.gauss(240, 260)))
+            drug = dict(
+                drug_id=self.uid(added), hospital_id=hospital_id,
+                drug_name=f"{self.rng.choice(DRUG_NAMES)} {self.rng.choice([100, 250, 500])}mg",
+                drug_category=self.rng.choice(DRUG_CATEGORIES),
+                drug_desc="Synthetic catalog entry",
+                drug_quantity=int(self.rng.expovariate(1 / 300)),
+                drug_price=round(self.rng.lognormvariate(4, 0.8), 2),
+                drug_expiry=expiry, date_added=added, updated_at=added,
+            )
+            drugs.append(drug)
+            rows["drugs"].append(drug)
+            if drug["drug_quantity"] > 0:
+                rows["drug_lots"].append(dict(
+                    lot_id=self.uid(added), hospital_id=hospital_id, drug_id=drug["drug_id"],
+                    lot_number=f"LOT-{self.rng.randrange(10_000, 99_999)}",
+                    lot_quantity=drug["drug_quantity"], lot_expiry=expiry,
+                    date_added=added, updated_at=added,
+                ))
+
+        for _ in range(patient_count):
+            registered = self.moment()
+            patient_id = self.uid(registered)
+            gender = self._pick(GENDERS)
+            rows["patients"].append(dict(
+                patient_id=patient_id, hospital_id=hospital_id, patient_name=self.name(),
+                patient_email=f"{patient_id[-12:]}@synthetic.neptunehms.com" if self.rng.random() < 0.4 else None,
+                patient_phone=self.phone(),
+                patient_id_number=str(self.rng.randrange(10_000_000, 40_000_000)),
+                patient_gender=gender, patient_gender_key=normalize_gender(gender),
+                patient_address="Nairobi",
+                patient_dob=self.dob(), patient_weight=round(self.rng.gauss(65, 15), 1),
+                patient_avg_pulse=round(self.rng.gauss(75, 8)), patient_bp=round(self.rng.gauss(120, 12)),
+                patient_chronic_condition=self._pick(CHRONIC_CONDITIONS), patient_allergy="Null",
+                patient_blood_type=self._pick(BLOOD_TYPES),
+                date_added=registered, updated_at=registered,
+            ))
+            self.history(rows, hospital_id, patient_id, registered, rows["hospitals"][0]["diagnosis_fee"],
+                         doctors, techs, services, tests, drugs)
+        rows["lab_queue_stats"].append(dict(
+            hospital_id=hospital_id,
+            pending_count=self.queue["pending"],
+            in_progress_count=self.queue["in_progress"],
+            resulted_count=self.queue["resulted"],
+            turnaround_seconds=self.queue["turnaround"],
+        ))
+        return rows
+
+    def history(self, rows, hospital_id, patient_id, registered, diagnosis_fee,
+                doctors, techs, services, tests, drugs):
+        rng = self.rng
+        billings = rows["billings"]
+
+        def bill(source, item, total, when):
+            billings.append(dict(
+                billing_id=self.uid(when), hospital_id=hospital_id, patient_id=patient_id,
+                source=source, item=item, total=total, created_at=when, updated_at=when,
+            ))
+
+        for _ in range(int(rng.expovariate(1 / 1.5))):
+            when = self.moment(registered)
+            service = rng.choice(services)
+            for _ in range(5):
+                slot = (
+                    rng.choice(doctors), when.date() + timedelta(days=rng.randrange(14)),
+                    time(rng.randrange(8, 17), rng.choice([0, 15, 30, 45])),
+                )
+                if slot not in self.booked:
+                    break
+            else:
+                continue
+            self.booked.add(slot)
+            consultant_id, day, at = slot
+            rows["appointments"].append(dict(
+                appointment_id=self.uid(when), hospital_id=hospital_id, patient_id=patient_id,
+                consultant_id=consultant_id, service_id=service["service_id"],
+                appointment_desc="Follow up visit", date_requested=day,
+                time_requested=at, date_added=when, updated_at=when,
+            ))
+            bill("Appointments", service["service_name"], service["service_price"], when)
+
+        for _ in range(int(rng.expovariate(1 / 1.2))):
+            when = self.moment(registered)
+            rows["diagnosis"].append(dict(
+                diagnosis_id=self.uid(when), hospital_id=hospital_id, patient_id=patient_id,
+                diagnoser_id=rng.choice(doctors), symptoms="Fever, headache and fatigue",
+                findings="Elevated temperature", suggested_diagnosis=rng.choice(["Malaria", "URTI", "Typhoid", "Gastritis"]),
+                date_added=when, updated_at=when,
+            ))
+            bill("Diagnosis", "Diagnosis with doctor", diagnosis_fee, when)
+
+            if rng.random() < 0.6:
+                test = rng.choice(tests)
+                requested_at = when + timedelta(hours=rng.uniform(8, 17))
+                request_id = self.uid(requested_at)
+                request = dict(
+                    request_id=request_id, hospital_id=hospital_id, patient_id=patient_id,
+                    doctor_id=rng.choice(doctors), test_id=test["test_id"],
+                    request_status="resulted", requested_at=requested_at,
+                    started_at=None, resulted_at=None,
+                    date_added=when, updated_at=when,
+                )
+                rows["lab_requests"].append(request)
+                bill("Lab Requests", test["test_name"], test["test_price"], when)
+                # requests from the last couple of days may still be on the bench
+                if when.date() >= self.today - timedelta(days=2) and rng.random() < 0.5:
+                    request["request_status"] = rng.choice(["pending", "in_progress"])
+                    if request["request_status"] == "in_progress":
+                        request["started_at"] = requested_at + timedelta(minutes=rng.randrange(5, 90))
+                    self.queue[request["request_status"]] += 1
+                else:
+                    resulted_at = requested_at + timedelta(hours=rng.expovariate(1 / 6))
+                    request.update(started_at=requested_at, resulted_at=resulted_at)
+                    self.queue["resulted"] += 1
+                    self.queue["turnaround"] += (resulted_at - requested_at).total_seconds()
+                    resulted = min(datetime.combine(resulted_at.date(), time.min), datetime.combine(self.today, time.min))
+                    rows["lab_results"].append(dict(
+                        result_id=self.uid(resulted), hospital_id=hospital_id, patient_id=patient_id,
+                        request_id=request_id, tech_id=rng.choice(techs),
+                        observations="Within reference ranges",
+                        conclusion=rng.choice(["Negative", "Positive"]),
+                        date_added=resulted, updated_at=resulted,
+                    ))
+
+            if rng.random() < 0.7:
+                drug = rng.choice(drugs)
+                qty = rng.randrange(1, 30)
+                prescription_id = self.uid(when)
+                rows["prescriptions"].append(dict(
+                    prescription_id=prescription_id, hospital_id=hospital_id, patient_id=patient_id,
+                    prescriber_id=rng.choice(doctors), date_added=when, updated_at=when,
+                ))
+                rows["prescription_items"].append(dict(
+                    item_id=self.uid(when), prescription_id=prescription_id, drug_id=drug["drug_id"],
+                    drug_qty=qty, notes="Take after meals", updated_at=when,
+                ))
+                bill("Prescriptions", drug["drug_name"], round(drug["drug_price"] * qty, 2), when)
+
+        for _ in range(int(rng.expovariate(1 / 0.5))):
+            drug = rng.choice(drugs)
+            qty = rng.randrange(1, 10)
+            bill("POS", drug["drug_name"], round(drug["drug_price"] * qty, 2), self.moment(registered))
+
+TABLE_ORDER = {
+    "hospitals": Hospital, "workers": Worker, "services": Service,
+    "lab_tests": LaboratoryTest, "drugs": Drug, "drug_lots": DrugLot, "patients": Patient,
+    "appointments": Appointment, "diagnosis": Diagnosis,
+    "lab_requests": LaboratoryRequest, "lab_results": LaboratoryResult,
+    "lab_queue_stats": LabQueueStats,
+    "prescriptions": Prescription, "prescription_items": PrescriptionItem,
+    "billings": Billing,
+}
+
+async def bulk_insert(conn, model, rows, chunk_size: int):
+    for start in range(0, len(rows), chunk_size):
+        await conn.execute(insert(model), rows[start:start + chunk_size])
+
+async def generate(hospitals: int = 5, patients: int = 10_000, years: int = 3,
+                   seed: int = 42, chunk_size: int = 5_000, create: bool = True,
+                   anchor: date = ANCHOR_DATE):
+    gen = Generator(seed, years, anchor)
+    password = hash_pwd("synthetic")
+    counts = {table: 0 for table in TABLE_ORDER}
+
+    if create:
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+    for index, size in enumerate(gen.hospital_sizes(hospitals, patients)):
+        rows = gen.tenant(index, size, password)
+        async with engine.begin() as conn:
+            for table, model in TABLE_ORDER.items():
+                await bulk_insert(conn, model, rows[table], chunk_size)
+                counts[table] += len(rows[table])
+    return counts
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic multi-tenant data")
+    parser.add_argument("--hospitals", type=int, default=5)
+    parser.add_argument("--patients", type=int, default=10_000)
+    parser.add_argument("--years", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--chunk-size", type=int, default=5_000)
+    parser.add_argument("--anchor", type=date.fromisoformat, default=ANCHOR_DATE,
+                        help="last day of the generated history (YYYY-MM-DD)")
+    args = parser.parse_args()
+
+    started = clock.perf_counter()
+    counts = asyncio.run(generate(
+        args.hospitals, args.patients, args.years, args.seed, args.chunk_size, anchor=args.anchor,
+    ))
+    elapsed = clock.perf_counter() - started
+    for table, count in counts.items():
+        print(f"{table:<20}{count:>12,}")
+    print(f"{'total':<20}{sum(counts.values()):>12,} rows in {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
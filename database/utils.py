@@ -1,4 +1,6 @@
+import asyncio
 from datetime import datetime, date, timedelta
+from functools import lru_cache
 from passlib.context import CryptContext
 
 pwd_context = CryptContext(schemes=['bcrypt'], deprecated = "auto")
@@ -10,6 +12,22 @@ def hash_pwd(password):
 def is_verified_pwd(hashed_pwd, inputted_pwd):
     return pwd_context.verify(hashed_pwd, inputted_pwd)
 
+@lru_cache(maxsize=None)
+def dummy_pwd_hash():
+    return hash_pwd("neptune-unknown-account")
+
+def check_pwd(password, hashed):
+    # an unknown account is checked against a dummy hash so it takes as long
+    # as a wrong password and does not reveal which emails exist
+    if not hashed:
+        pwd_context.verify(password or "", dummy_pwd_hash())
+        return False
+    return pwd_context.verify(password or "", hashed)
+
+async def verify_signin_pwd(password, hashed):
+    # bcrypt is deliberately slow; keep it off the event loop
+    return await asyncio.to_thread(check_pwd, password, hashed)
+
 def current_date():
     today = datetime.today().date()
     return today
@@ -18,6 +36,22 @@ def convert_to_date(date_str: str):
     to_date = datetime.strptime(date_str, "%Y-%m-%d").date()
     return to_date
 
+def day_after(day: datetime):
+    return day + timedelta(days=1)
+
+def normalize_gender(gender: str):
+    if not gender:
+        return None
+    key = gender.strip().lower()
+    return {"m": "male", "f": "female"}.get(key, key)
+
+def years_before(day: date, years: int):
+    try:
+        return day.replace(year=day.year - years)
+    except ValueError:
+        # 29 February in a non-leap target year
+        return day.replace(year=day.year - years, day=28)
+
 def date_to_str(date_obj: datetime):
     to_str = datetime.strftime(date_obj, "%Y-%m-%d")
     return to_str
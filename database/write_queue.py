@@ -0,0 +1,105 @@
+import asyncio
+from config import async_session, LOCAL_MODE
+
+# On SQLite every commit is a write lock round and an fsync, so one request
+# per commit caps throughput. In local mode small writes are handed to a
+# single writer task instead: it takes whatever has queued up while the
+# previous batch was committing and commits it as one transaction. Each
+# caller still gets its own result or exception. Elsewhere (Postgres) the
+# operation simply runs in a transaction of its own.
+MAX_BATCH = 200
+
+
+class WriteQueue:
+    def __init__(self, coalesce: bool = LOCAL_MODE):
+        self.coalesce = coalesce
+        self.queue = None
+        self.worker = None
+
+    async def submit(self, op):
+        # op(session) -> result; it may run more than once (again whenever
+        # its batch is rolled back), so it must build its objects itself
+        if not self.coalesce:
+            async with async_session.begin() as session:
+                return await op(session)
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((op, future))
+        return await future
+
+    async def add(self, make_row):
+        async def op(session):
+            row = make_row()
+            session.add(row)
+            return row
+        return await self.submit(op)
+
+    def start(self):
+        if self.worker is None or self.worker.done():
+            self.queue = asyncio.Queue()
+            self.worker = asyncio.ensure_future(self.run())
+
+    async def run(self):
+        while True:
+            item = await self.queue.get()
+            if item is None:
+                return
+            batch = [item]
+            while len(batch) < MAX_BATCH and not self.queue.empty():
+                item = self.queue.get_nowait()
+                if item is None:
+                    await self.commit_batch(batch)
+                    return
+                batch.append(item)
+            await self.commit_batch(batch)
+
+    async def commit_batch(self, batch):
+        batch = [(op, future) for op, future in batch if not future.done()]
+        while batch:
+            results, error = [], None
+            try:
+                async with async_session.begin() as session:
+                    for op, _ in batch:
+                        try:
+                            results.append(await op(session))
+                        except Exception as e:
+                            error = e
+                            raise
+            except Exception as e:
+                if error is not None:
+                    # the operation itself raised: it fails alone, the ones
+                    # before it commit together and the rest carry on
+                    failed = len(results)
+                    self.settle(batch[failed][1], error=error)
+                    await self.commit_batch(batch[:failed])
+                    batch = batch[failed + 1:]
+                    continue
+                if len(batch) == 1:
+                    self.settle(batch[0][1], error=e)
+                    return
+                # the commit failed; find the culprit by retrying each on its own
+                for item in batch:
+                    await self.commit_batch([item])
+                return
+            for (_, future), result in zip(batch, results):
+                self.settle(future, result)
+            return
+
+    def settle(self, future, result=None, error=None):
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    async def stop(self):
+        # commits whatever is already queued before the worker exits
+        if self.worker is None:
+            return
+        await self.queue.put(None)
+        await asyncio.gather(self.worker, return_exceptions=True)
+        self.worker = None
+
+
+write_queue = WriteQueue()
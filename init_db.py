@@ -1,10 +1,193 @@
 from database.models import Base
+from database.ids import GUID, new_id
 from config import engine
+import argparse
 import asyncio
-from sqlalchemy import text
+from sqlalchemy import text, inspect
+from sqlalchemy.dialects import postgresql
+
+UUID_PATTERN = "^[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}$"
+
+def create_missing_columns(conn):
+    # create_all() never alters existing tables; add nullable columns that
+    # were introduced on a model after its table was first created
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in existing:
+                continue
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+
+def backfill_columns(conn):
+    conn.execute(text(
+        "UPDATE patients SET patient_gender_key = CASE lower(trim(patient_gender)) "
+        "WHEN 'm' THEN 'male' WHEN 'f' THEN 'female' ELSE lower(trim(patient_gender)) END "
+        "WHERE patient_gender_key IS NULL AND patient_gender IS NOT NULL"
+    ))
+    # requests that predate the worklist: treat the ones whose patient already
+    # has a later result as resulted, the rest as still pending
+    conn.execute(text(
+        "UPDATE lab_requests SET requested_at = date_added WHERE requested_at IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE lab_requests SET request_status = CASE WHEN EXISTS ("
+        "SELECT 1 FROM lab_results WHERE lab_results.hospital_id = lab_requests.hospital_id "
+        "AND lab_results.patient_id = lab_requests.patient_id "
+        "AND lab_results.date_added >= lab_requests.date_added"
+        ") THEN 'resulted' ELSE 'pending' END WHERE request_status IS NULL"
+    ))
+    # and date them by that first result, so the seeded turnaround is real
+    conn.execute(text(
+        "UPDATE lab_requests SET resulted_at = ("
+        "SELECT MIN(lab_results.date_added) FROM lab_results "
+        "WHERE lab_results.hospital_id = lab_requests.hospital_id "
+        "AND lab_results.patient_id = lab_requests.patient_id "
+        "AND lab_results.date_added >= lab_requests.date_added"
+        ") WHERE request_status = 'resulted' AND resulted_at IS NULL"
+    ))
+    if conn.dialect.name == "postgresql":
+        turnaround = "EXTRACT(EPOCH FROM resulted_at - requested_at)"
+    else:
+        turnaround = "(julianday(resulted_at) - julianday(requested_at)) * 86400"
+    conn.execute(text(
+        "INSERT INTO lab_queue_stats (hospital_id, pending_count, in_progress_count, "
+        "resulted_count, turnaround_seconds) "
+        "SELECT hospital_id, "
+        "SUM(CASE WHEN request_status = 'pending' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN request_status = 'in_progress' THEN 1 ELSE 0 END), "
+        "SUM(CASE WHEN request_status = 'resulted' THEN 1 ELSE 0 END), "
+        f"COALESCE(SUM(CASE WHEN request_status = 'resulted' THEN {turnaround} END), 0) "
+        "FROM lab_requests WHERE hospital_id IS NOT NULL AND hospital_id NOT IN "
+        "(SELECT hospital_id FROM lab_queue_stats) GROUP BY hospital_id"
+    ))
+    # drugs that predate lot tracking get one opening lot holding their stock
+    drugs = conn.execute(text(
+        "SELECT hospital_id, drug_id, drug_quantity, drug_expiry, date_added FROM drugs "
+        "WHERE drug_quantity > 0 AND drug_expiry IS NOT NULL AND NOT EXISTS "
+        "(SELECT 1 FROM drug_lots WHERE drug_lots.drug_id = drugs.drug_id)"
+    )).mappings().all()
+    if drugs:
+        conn.execute(text(
+            "INSERT INTO drug_lots (lot_id, hospital_id, drug_id, lot_number, lot_quantity, "
+            "lot_expiry, date_added, updated_at, is_synced, is_deleted) "
+            "VALUES (:lot_id, :hospital_id, :drug_id, 'opening-stock', :drug_quantity, "
+            ":drug_expiry, :date_added, :date_added, false, false)"
+        ), [dict(drug, lot_id=new_id()) for drug in drugs])
+
+# indexes a model has replaced with a differently named one
+REPLACED_INDEXES = {
+    "appointments": ["ix_appointments_hospital_patient"],
+}
+
+def drop_replaced_indexes(conn):
+    inspector = inspect(conn)
+    for table, names in REPLACED_INDEXES.items():
+        if not inspector.has_table(table):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table)}
+        for name in names:
+            if name in existing:
+                conn.execute(text(f"DROP INDEX {name}"))
+
+def duplicate_rows(conn, index, limit: int = 20):
+    columns = ", ".join(column.name for column in index.columns)
+    return conn.execute(text(
+        f"SELECT {columns}, count(*) AS copies FROM {index.table.name} "
+        f"GROUP BY {columns} HAVING count(*) > 1 ORDER BY copies DESC LIMIT {limit}"
+    )).all()
+
+def create_missing_indexes(conn):
+    # create_all() skips tables that already exist, so indexes added to a model
+    # later are never built on a live database; add them here
+    inspector = inspect(conn)
+    failed = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {index["name"] for index in inspector.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name in existing:
+                continue
+            try:
+                # a savepoint keeps one failing index from aborting the others
+                with conn.begin_nested():
+                    index.create(conn)
+            except Exception as e:
+                failed.append(index.name)
+                print(f"Could not create index {index.name}: ", e)
+                if index.unique:
+                    # the app relies on unique indexes (e.g. against double
+                    # bookings), so show what has to be resolved first
+                    for row in duplicate_rows(conn, index):
+                        print(f"  duplicate in {table.name}: {tuple(row)}")
+    if failed:
+        raise RuntimeError(f"Missing indexes: {', '.join(failed)}; resolve the rows above and rerun init_db")
+
+def convert_keys_to_uuid(conn):
+    # Postgres only: retypes every GUID key column from varchar to native uuid.
+    # Foreign keys are dropped around the change and recreated unchanged.
+    if conn.dialect.name != "postgresql":
+        print("Native uuid keys are only supported on Postgres")
+        return
+    inspector = inspect(conn)
+    pending = []
+    for table in Base.metadata.sorted_tables:
+        if not inspector.has_table(table.name):
+            continue
+        existing = {column["name"]: column["type"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if not isinstance(column.type, GUID) or column.name not in existing:
+                continue
+            if not isinstance(existing[column.name], postgresql.UUID):
+                pending.append((table.name, column.name))
+    if not pending:
+        print("Key columns already use uuid")
+        return
+
+    for table, column in pending:
+        invalid = conn.execute(
+            text(f"SELECT count(*) FROM {table} WHERE {column} IS NOT NULL AND {column} !~ :pattern"),
+            {"pattern": UUID_PATTERN},
+        ).scalar()
+        if invalid:
+            raise ValueError(f"{table}.{column} has {invalid} values that are not uuids")
+
+    retyped = {table for table, _ in pending}
+    foreign_keys = [
+        (table.name, fk)
+        for table in Base.metadata.sorted_tables if inspector.has_table(table.name)
+        for fk in inspector.get_foreign_keys(table.name)
+        if table.name in retyped or fk["referred_table"] in retyped
+    ]
+    for table, fk in foreign_keys:
+        conn.execute(text(f'ALTER TABLE {table} DROP CONSTRAINT "{fk["name"]}"'))
+    for table, column in pending:
+        conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN {column} TYPE uuid USING {column}::uuid"))
+    for table, fk in foreign_keys:
+        ondelete = fk.get("options", {}).get("ondelete")
+        conn.execute(text(
+            f'ALTER TABLE {table} ADD CONSTRAINT "{fk["name"]}" '
+            f'FOREIGN KEY ({", ".join(fk["constrained_columns"])}) '
+            f'REFERENCES {fk["referred_table"]} ({", ".join(fk["referred_columns"])})'
+            + (f" ON DELETE {ondelete}" if ondelete else "")
+        ))
+    print(f"Converted {len(pending)} key columns to uuid; set NEPTUNE_NATIVE_UUID=1 before restarting")
+
+async def convert_database_keys():
+    async with engine.begin() as conn:
+        await conn.run_sync(convert_keys_to_uuid)
+
 async def create_database():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(create_missing_columns)
+        await conn.run_sync(backfill_columns)
+        await conn.run_sync(create_missing_indexes)
+        await conn.run_sync(drop_replaced_indexes)
 
 async def reset_database():
     async with engine.begin() as conn:
@@ -16,4 +199,10 @@ async def reset_database():
     await engine.dispose()
     
 if __name__ == "__main__":
-    asyncio.run(create_database())
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Create or upgrade the database schema")
+    parser.add_argument(
+        "--native-uuid", action="store_true",
+        help="convert string key columns to native uuid (Postgres)"
+    )
+    args = parser.parse_args()
+    asyncio.run(convert_database_keys() if args.native_uuid else create_database())
\ No newline at end of file
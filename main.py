@@ -1,4 +1,7 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, Request
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import DBAPIError, StatementError
 from api.endpoints.patients import router as patients_router
 from api.endpoints.workers import router as workers_router
 from api.endpoints.drugs import router as drugs_router
@@ -11,8 +14,47 @@ from api.endpoints.appointments import router as appointments_router
 from api.endpoints.prescription import router as prescription_router
 from api.endpoints.hospitals import router as hospitals_router
 from api.endpoints.billing import router as billings_router
+from api.endpoints.events import router as events_router
+from database.scheduler import scheduler
+from database.events import hub
+from api.auth import tenant_scope
+from api.middleware import TenantGate
+from api.ratelimit import RateLimiter
+from database.actions.drugs import scan_all_drug_alerts
+from database.partitions import maintain_partitions
+from database.archive import archive_old_records
+from database.replication import replicator, SYNC_SECONDS
+from database.write_queue import write_queue
 
-app = FastAPI()
+DRUG_ALERT_SCAN_SECONDS = 15 * 60
+PARTITION_CHECK_SECONDS = 24 * 3600
+ARCHIVE_CHECK_SECONDS = 7 * 24 * 3600
+
+scheduler.every(DRUG_ALERT_SCAN_SECONDS, scan_all_drug_alerts)
+scheduler.every(PARTITION_CHECK_SECONDS, maintain_partitions)
+scheduler.every(ARCHIVE_CHECK_SECONDS, archive_old_records)
+scheduler.every(SYNC_SECONDS, replicator.sync, name="replicate")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    scheduler.start()
+    await hub.start()
+    yield
+    await hub.stop()
+    await scheduler.stop()
+    await write_queue.stop()
+    await replicator.stop()
+
+app = FastAPI(lifespan=lifespan, dependencies=[Depends(tenant_scope)])
+app.add_middleware(TenantGate)
+app.add_middleware(RateLimiter)
+
+@app.exception_handler(StatementError)
+async def malformed_id(request: Request, exc: StatementError):
+    # GUID refuses to bind an id that is not a uuid; that is a bad request
+    if isinstance(exc.orig, ValueError) and not isinstance(exc, DBAPIError):
+        return JSONResponse({"detail": str(exc.orig)}, status_code=400)
+    raise exc
 
 app.include_router(hospitals_router, prefix="/hospitals", tags=["hospitals"])
 app.include_router(billings_router, prefix="/billings", tags=["billings"])
@@ -26,4 +68,5 @@ app.include_router(services_router, prefix="/services", tags=["services"])
 app.include_router(lab_tests_router, prefix="/lab_tests", tags=["lab_tests"])
 app.include_router(lab_results_router, prefix="/lab_results", tags=["lab_results"])
 app.include_router(lab_requests_router, prefix="/lab_requests", tags=["lab_requests"])
+app.include_router(events_router, prefix="/events", tags=["events"])
 
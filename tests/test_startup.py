@@ -0,0 +1,11 @@
+import os
+
+from benchmarks.bench_startup import LAZY_MODULES, import_profile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# the import time itself depends on the machine; benchmarks/bench_startup.py
+# measures it against a budget
+def test_export_dependencies_load_lazily():
+    loaded = sorted({name.split(".")[0] for name, _, _ in import_profile("main", cwd=ROOT)} & set(LAZY_MODULES))
+    assert not loaded, f"imported at start-up: {', '.join(loaded)}"